@@ -1,15 +1,74 @@
-import os
 from ctypes import windll
+import os
+import time
 import webbrowser
 import threading
 
 import customtkinter as ctk
+import numpy as np
 from tkinter import Menu
+from tkinter import BooleanVar
+from tkinter import StringVar
 from tkinter import ttk
-from PIL import Image
 
+import album_art
+import assets
+import dsp
 import file_operations
+import metrics
 import music_controls
+import play_order
+import song_library
+import song_search
+import stem_separation
+import waveform
+
+SEARCH_DELAY = 150  # Milliseconds without typing before the songs list is filtered
+INDEX_CHUNK = 5000  # Songs added to the search index between two passes of the Tk event loop
+PROGRESS_INTERVAL = 100  # Milliseconds between updates of the seek bar and the song label
+CROSSFADE_SECONDS = (0, 2, 5, 10)  # Choices of the crossfade menu, 0 is gapless
+AUDIO_INIT_DELAY = 500  # Milliseconds after the start before the audio device is opened, so the window shows first
+
+STARTED = time.perf_counter()  # Start of the imports of the window, for the startup time in the metrics log
+if os.environ.get(metrics.PROFILE_VARIABLE):
+    metrics.metrics.start_profiler()  # Profiles the startup too
+
+
+def get_cover_image(song_name, size, placeholder):
+    """
+    Returns the cover art of a song as an image for a label, read through the thumbnail cache.
+
+    Args:
+        song_name (str | None): The song name.
+        size (int): One of `album_art.THUMBNAIL_SIZES`.
+        placeholder (ctk.CTkImage): The image shown for songs without cover art.
+
+    Returns:
+        ctk.CTkImage: The cover art or the placeholder.
+    """
+    if song_name is None:
+        return placeholder
+    thumbnail = album_art.thumbnail_cache.get(os.path.join("..", "Audio", song_name), size)
+    if thumbnail is None:
+        return placeholder
+    return ctk.CTkImage(light_image=thumbnail, dark_image=thumbnail, size=(size, size))
+
+
+def format_time(seconds):
+    """
+    Formats a duration as "m:ss", or "h:mm:ss" from an hour on.
+
+    Args:
+        seconds (float | None): The duration in seconds.
+
+    Returns:
+        str: The formatted duration, empty if the duration is unknown.
+    """
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
 
 
 class ThemeManager:
@@ -139,14 +198,10 @@ class TitleBarLeft(ctk.CTkFrame):
         super().__init__(master=master, corner_radius=0)
 
         self.grid_columnconfigure(0, weight=1)
-        self.logo_button_image = ctk.CTkImage(
-            dark_image=Image.open("Images/Logo/DarkLogo.png"),
-            light_image=Image.open("Images/Logo/WhiteLogo.png"),
-            size=(30, 28)
-        )
-        self.hover_logo_button_image = {
-            "Light": ctk.CTkImage(Image.open("Images/Logo/WhiteLogoHover.png"), size=(30, 28)),
-            "Dark": ctk.CTkImage(Image.open("Images/Logo/DarkLogoHover.png"), size=(30, 28))
+        self.logo_button_image = assets.get_icon("Logo/WhiteLogo.png", "Logo/DarkLogo.png", size=(30, 28))
+        self.hover_logo_button_image = {  # Loaded on the first hover
+            "Light": lambda: assets.get_icon("Logo/WhiteLogoHover.png", size=(30, 28)),
+            "Dark": lambda: assets.get_icon("Logo/DarkLogoHover.png", size=(30, 28))
         }
 
         self.__creating_objects()
@@ -184,6 +239,10 @@ class TitleBarLeft(ctk.CTkFrame):
 
         self.logo_menu.add_command(label="Open Files", command=file_operations.move_files)
         self.logo_menu.add_command(label="Open Folder", command=file_operations.move_folder)
+        self.logo_menu.add_command(label="Rescan Folders", command=file_operations.rescan_folders)
+        self.logo_menu.add_command(label="Separate Stems",
+                                   command=lambda: stem_separation.separate_songs(
+                                       self.master.frame_right.songs_list.songs_list))
         self.logo_menu.add_separator()
 
         self.appearance_menu = Menu(self, tearoff=0)
@@ -191,11 +250,72 @@ class TitleBarLeft(ctk.CTkFrame):
         self.appearance_menu.add_radiobutton(label="Dark", command=ThemeManager.set_dark_theme)
         self.logo_menu.add_cascade(label="Theme", menu=self.appearance_menu)
 
-        self.logo_menu.add_command(label="Clear Downloads", command=file_operations.delete_all_songs)
+        # Format of the songs imported from now on
+        self.storage_format = StringVar(master=self, value=file_operations.get_storage_format())
+        self.storage_menu = Menu(self, tearoff=0)
+        self.storage_menu.add_radiobutton(label="WAV", value="wav", variable=self.storage_format,
+                                          command=lambda: file_operations.set_storage_format("wav"))
+        self.storage_menu.add_radiobutton(label="FLAC (lossless, about half the size)", value="flac",
+                                          variable=self.storage_format,
+                                          command=lambda: file_operations.set_storage_format("flac"))
+        self.logo_menu.add_cascade(label="Storage Format", menu=self.storage_menu)
+
+        library = file_operations.get_library()
+        self.equalizer_preset = StringVar(master=self, value=library.get_setting("equalizer", "Flat"))
+        music_controls.set_equalizer(self.equalizer_preset.get())
+        self.equalizer_menu = Menu(self, tearoff=0)
+        for preset in dsp.EQ_PRESETS:
+            self.equalizer_menu.add_radiobutton(label=preset, value=preset, variable=self.equalizer_preset,
+                                                command=self.set_equalizer)
+        self.logo_menu.add_cascade(label="Equalizer", menu=self.equalizer_menu)
+
+        # Overlap of a song with the next one in seconds, saved as text like the other settings
+        self.crossfade = StringVar(master=self, value=library.get_setting("crossfade", "0"))
+        music_controls.player.set_crossfade(float(self.crossfade.get()))
+        self.crossfade_menu = Menu(self, tearoff=0)
+        for seconds in CROSSFADE_SECONDS:
+            self.crossfade_menu.add_radiobutton(label=f"{seconds} s" if seconds else "Off (gapless)",
+                                                value=str(seconds), variable=self.crossfade,
+                                                command=self.set_crossfade)
+        self.logo_menu.add_cascade(label="Crossfade", menu=self.crossfade_menu)
+
+        # Plays every song at the same loudness, from the loudness measured when it was imported
+        self.normalize = BooleanVar(master=self, value=library.get_setting("normalize", "1") == "1")
+        music_controls.player.set_normalize(self.normalize.get())
+        self.logo_menu.add_checkbutton(label="Normalize Loudness", variable=self.normalize,
+                                       command=self.set_normalize)
+
+        self.logo_menu.add_command(label="Clear Downloads", command=self.delete_all_songs)
+        self.logo_menu.add_separator()
+
+        # Samples the UI thread until it is unchecked, then writes the profile next to the metrics log
+        self.profiling = BooleanVar(master=self, value=metrics.metrics.sampler is not None)
+        self.logo_menu.add_checkbutton(label="Profiling", variable=self.profiling,
+                                       command=metrics.metrics.toggle_profiler)
         self.logo_menu.add_separator()
 
         self.logo_menu.add_command(label="Exit", command=quit)
 
+    def delete_all_songs(self):
+        """Stops playback, so no song file is open, and deletes all songs."""
+        music_controls.player.unload()
+        file_operations.delete_all_songs()
+
+    def set_equalizer(self):
+        """Applies and saves the equalizer preset chosen in the menu."""
+        music_controls.set_equalizer(self.equalizer_preset.get())
+        file_operations.get_library().set_setting("equalizer", self.equalizer_preset.get())
+
+    def set_crossfade(self):
+        """Applies and saves the crossfade chosen in the menu."""
+        music_controls.player.set_crossfade(float(self.crossfade.get()))
+        file_operations.get_library().set_setting("crossfade", self.crossfade.get())
+
+    def set_normalize(self):
+        """Applies and saves the loudness normalization toggled in the menu."""
+        music_controls.player.set_normalize(self.normalize.get())
+        file_operations.get_library().set_setting("normalize", "1" if self.normalize.get() else "0")
+
     def __events(self):
         """
         Bind events to methods for moving the window and updating the logo button image on hover.
@@ -204,7 +324,7 @@ class TitleBarLeft(ctk.CTkFrame):
         self.bind("<B1-Motion>", self.move_window)
 
         self.logo_button.bind("<Enter>", lambda event: self.logo_button.configure(
-            image=self.hover_logo_button_image.get(ctk.get_appearance_mode())))
+            image=self.hover_logo_button_image[ctk.get_appearance_mode()]()))
         self.logo_button.bind("<Leave>", lambda event: self.logo_button.configure(image=self.logo_button_image))
 
     """Functional Public Methods"""
@@ -242,15 +362,29 @@ class LeftFrame(ctk.CTkFrame):
     def __init__(self, master):
         super().__init__(master=master, corner_radius=0)
 
-        self.vinyl_disk_image = ctk.CTkImage(dark_image=Image.open("Images/Buttons/VinylDiskLight.png"),
-                                             light_image=Image.open("Images/Buttons/VinylDiskDark.png"),
-                                             size=(225, 225))
+        self.vinyl_disk_image = assets.get_button_icon("VinylDisk", size=(225, 225))
 
         self.album_cover_label = ctk.CTkLabel(master=self, image=self.vinyl_disk_image, text="")
         self.album_cover_label.grid(row=1, column=0, padx=(10, 0), pady=(20, 10), sticky="news")
 
+    def show_cover(self, song_name):
+        """
+        Shows the cover art of a song, or the vinyl disk if the song has none.
+
+        Args:
+            song_name (str | None): The song name.
+        """
+        self.album_cover_label.configure(image=get_cover_image(song_name, 225, self.vinyl_disk_image))
+
 
 class CenterFrame(ctk.CTkFrame):
+    """
+    A frame with a mute button and a gain slider for each stem of the song (bass, drums, vocals and other).
+
+    Args:
+        master (ctk.CTk): The parent widget to which this frame belongs.
+    """
+
     def __init__(self, master):
         super().__init__(master=master, corner_radius=0, fg_color="transparent")
 
@@ -262,7 +396,7 @@ class CenterFrame(ctk.CTkFrame):
                                          height=30,
                                          fg_color="Red",
                                          text="Bass",
-                                         command=None,
+                                         command=lambda: self.toggle_stem("bass", self.bass_button),
                                          hover=True,
                                          )
         self.drum_button = ctk.CTkButton(master=self,
@@ -270,7 +404,7 @@ class CenterFrame(ctk.CTkFrame):
                                          height=30,
                                          fg_color="Red",
                                          text="Drum",
-                                         command=None,
+                                         command=lambda: self.toggle_stem("drums", self.drum_button),
                                          hover=True,
                                          )
         self.vocals_button = ctk.CTkButton(master=self,
@@ -278,7 +412,7 @@ class CenterFrame(ctk.CTkFrame):
                                            height=30,
                                            fg_color="Red",
                                            text="Vocals",
-                                           command=None,
+                                           command=lambda: self.toggle_stem("vocals", self.vocals_button),
                                            hover=True,
                                            )
         self.other_button = ctk.CTkButton(master=self,
@@ -286,7 +420,7 @@ class CenterFrame(ctk.CTkFrame):
                                           height=30,
                                           fg_color="Red",
                                           text="Other",
-                                          command=None,
+                                          command=lambda: self.toggle_stem("other", self.other_button),
                                           hover=True,
                                           )
 
@@ -322,6 +456,13 @@ class CenterFrame(ctk.CTkFrame):
                                           number_of_steps=25,
                                           progress_color=("Red", "Red")
                                           )
+        self.bass_slider.configure(command=lambda value: music_controls.set_stem_gain("bass", value / 100))
+        self.drum_slider.configure(command=lambda value: music_controls.set_stem_gain("drums", value / 100))
+        self.vocals_slider.configure(command=lambda value: music_controls.set_stem_gain("vocals", value / 100))
+        self.other_slider.configure(command=lambda value: music_controls.set_stem_gain("other", value / 100))
+        for slider in (self.bass_slider, self.drum_slider, self.vocals_slider, self.other_slider):
+            slider.set(100)  # Full gain, the song plays as it is
+
         self.bass_button.grid(row=0, column=0, pady=(20, 0), padx=(7, 0))
         self.drum_button.grid(row=1, column=0, pady=(35, 0), padx=(7, 0))
         self.vocals_button.grid(row=2, column=0, pady=(35, 0), padx=(7, 0))
@@ -332,6 +473,34 @@ class CenterFrame(ctk.CTkFrame):
         self.vocals_slider.grid(row=2, column=1, pady=(35, 0))
         self.other_slider.grid(row=3, column=1, pady=(35, 0))
 
+        self.separation_label = ctk.CTkLabel(master=self, height=20, text="")
+
+    @staticmethod
+    def toggle_stem(stem, button):
+        """
+        Mutes or unmutes a stem and greys out its button while it is muted.
+
+        Args:
+            stem (str): The stem name, one of `stem_mixer.STEMS`.
+            button (ctk.CTkButton): The button of the stem.
+        """
+        muted = music_controls.toggle_stem_mute(stem)
+        button.configure(fg_color="Gray" if muted else "Red")
+
+    def show_separation_progress(self, done, total):
+        """
+        Shows how many of the queued songs have been separated into stems.
+
+        Args:
+            done (int): The number of songs that have been processed.
+            total (int): The number of queued songs.
+        """
+        self.separation_label.configure(text=f"Separating stems {done}/{total}")
+        self.separation_label.grid(row=4, column=0, columnspan=2, pady=(35, 0))
+
+    def hide_separation_progress(self):
+        self.separation_label.grid_remove()
+
 
 class RightFrame(ctk.CTkFrame):
     """
@@ -351,10 +520,12 @@ class RightFrame(ctk.CTkFrame):
 
     def __creating_objects(self):
         """
-        Creates and configures widgets for the RightFrame, including search label,
+        Creates and configures widgets for the RightFrame, including search box,
         add button, delete button, and the add menu.
         """
-        self.search_label = ctk.CTkLabel(self, width=30, height=30, anchor="w", text="Search")
+        self.search_entry = ctk.CTkEntry(self, width=30, height=30, placeholder_text="Search")
+        self.search_entry.bind("<KeyRelease>", self.on_search_typed)
+        self.search_job = None
         self.add_button = ctk.CTkButton(master=self,
                                         width=30,
                                         height=30,
@@ -377,15 +548,76 @@ class RightFrame(ctk.CTkFrame):
 
         self.add_menu.add_command(label="Open Files", command=file_operations.move_files)
         self.add_menu.add_command(label="Open Folder", command=file_operations.move_folder)
+        self.add_menu.add_command(label="Rescan Folders", command=file_operations.rescan_folders)
 
-        self.search_label.grid(row=2, column=0, sticky="news", padx=(10, 0))
+        self.search_entry.grid(row=2, column=0, sticky="news", padx=(10, 0))
         self.add_button.grid(row=2, column=1, sticky="news")
         self.delete_button.grid(row=2, column=2, sticky="news")
 
+        self.import_label = ctk.CTkLabel(self, height=20, anchor="w", text="")
+        self.import_progress_bar = ctk.CTkProgressBar(master=self,
+                                                      height=10,
+                                                      progress_color=("Red", "Red")
+                                                      )
+        self.import_cancel_button = ctk.CTkButton(master=self,
+                                                  width=30,
+                                                  height=20,
+                                                  fg_color="Red",
+                                                  text="Cancel",
+                                                  command=file_operations.cancel_import,
+                                                  hover=False,
+                                                  )
+
+    def on_search_typed(self, event):
+        """
+        Filters the songs list shortly after the user stops typing, so a search runs once per pause and not once
+        per keystroke.
+
+        Args:
+            event (tkinter.Event): The key release event.
+        """
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY, self.search)
+
+    def search(self):
+        self.search_job = None
+        self.songs_list.filter(self.search_entry.get())
+
+    def show_import_progress(self, done, total):
+        """
+        Shows the progress of the running import under the songs list.
+
+        Args:
+            done (int): The number of files that have been processed.
+            total (int): The number of files in the import batch.
+        """
+        self.import_label.configure(text=f"Importing {done}/{total}")
+        self.import_progress_bar.set(done / total if total else 0)
+
+        self.import_label.grid(row=3, column=0, sticky="news", padx=(10, 0), pady=(5, 5))
+        self.import_progress_bar.grid(row=3, column=1, sticky="ew", padx=(5, 5))
+        self.import_cancel_button.grid(row=3, column=2, sticky="news", pady=(5, 5))
+
+    def hide_import_progress(self):
+        """
+        Hides the import progress widgets once the import is finished.
+        """
+        self.import_label.grid_remove()
+        self.import_progress_bar.grid_remove()
+        self.import_cancel_button.grid_remove()
+
     class CreatingTreeview(ctk.CTkFrame):
         """
         A frame containing a tree view to display a list of songs.
 
+        The tree view is virtualized: it only holds the rows that fit into it, and scrolling fills those rows with
+        other songs of `shown_songs`. Refreshing the list therefore takes the same time for a hundred songs and
+        for a hundred thousand. `shown_songs` is `songs_list` filtered by the search query, which is looked up in
+        a `SearchIndex` kept up to date with the list. The index is built `INDEX_CHUNK` songs at a time between
+        the events of the window, so a large library is shown at once, and the songs it does not hold yet are
+        searched one by one. The shown songs are the play queue, which is replaced only when they change.
+
         Args:
             master (ctk.CTk): The parent widget to which this frame belongs.
         """
@@ -394,8 +626,18 @@ class RightFrame(ctk.CTkFrame):
             super().__init__(master=master, fg_color="transparent")
             self.grid(row=1, column=0, columnspan=3, sticky="news")
             self.songs_list = []
-
-            self.song_treeview = ttk.Treeview(self, columns=("name", "length"), show="headings")
+            self.durations = {}  # Song name -> duration in seconds, stored in the library at import
+            self.shown_songs = []  # The songs that match the search query
+            self.search_query = ""
+            self.search_index = song_search.SearchIndex()
+            self.indexed = 0  # The songs at the start of `songs_list` that are in `search_index`
+            self.index_job = None  # The `after` job of `index_songs`
+            self.last_song_id = 0  # Library id of the last song in `songs_list`
+            self.first_row = 0  # Index in `shown_songs` of the song in the top row
+            self.selected_index = None  # Index in `shown_songs` of the selected song
+            self.rows = []  # Item ids of the rows of the tree view
+
+            self.song_treeview = ttk.Treeview(self, columns=("name", "length"), show="headings", selectmode="browse")
             self.song_treeview.grid(padx=(10, 0), pady=10, row=1, column=0, sticky="nse")
             self.song_treeview.heading("name", text="Name")
             self.song_treeview.heading("length", text="Length")
@@ -404,17 +646,20 @@ class RightFrame(ctk.CTkFrame):
 
             self.scrollbar = ctk.CTkScrollbar(self,
                                               orientation="vertical",
-                                              command=self.song_treeview.yview,
+                                              command=self.on_scrollbar,
                                               button_color="#bdbdbd",
                                               button_hover_color="#adadad"
                                               )
-            self.song_treeview.configure(yscrollcommand=self.scrollbar.set)
             self.scrollbar.grid(row=1, column=1, sticky="ns")
 
             # TODO: Delete
             self.update_songs_list()
 
             self.song_treeview.bind("<Double-1>", self.on_item_click)
+            self.song_treeview.bind("<<TreeviewSelect>>", self.on_select)
+            self.song_treeview.bind("<MouseWheel>", lambda event: self.scroll_to(self.first_row - event.delta // 40))
+            self.song_treeview.bind("<Button-4>", lambda event: self.scroll_to(self.first_row - 3))
+            self.song_treeview.bind("<Button-5>", lambda event: self.scroll_to(self.first_row + 3))
 
         def on_item_click(self, event):
             """
@@ -425,31 +670,141 @@ class RightFrame(ctk.CTkFrame):
             """
             selected_item = self.song_treeview.focus()
             song_name = self.song_treeview.item(selected_item, "values")[0]
-            music_controls.get_song_name(song_name)
+            music_controls.player.load(song_name)
 
-        def update_songs_list(self):
+        def on_select(self, event):
             """
-            Updates the list of songs displayed in the Treeview widget.
+            Remembers which song is selected, so the selection follows the song while the rows are reused.
+            """
+            selection = self.song_treeview.selection()
+            if selection and selection[0] in self.rows:
+                self.selected_index = self.first_row + self.rows.index(selection[0])
 
-            - Clears the current list of songs from the Treeview.
-            - Reads the song names from the file "../Audio/song_list.txt" if it exists.
-            - Inserts each song name into the Treeview with alternating row tags for visual distinction.
-            - Logs a message indicating that the Treeview has been updated.
+        def on_scrollbar(self, *args):
+            """
+            Scrolls the list from the scrollbar, which calls this method like `yview` of a tree view.
+
+            Args:
+                *args: ("moveto", fraction) or ("scroll", number, "units" | "pages").
+            """
+            if args[0] == "moveto":
+                self.scroll_to(round(float(args[1]) * len(self.shown_songs)))
+            elif args[0] == "scroll":
+                step = len(self.rows) if args[2] == "pages" else 1
+                self.scroll_to(self.first_row + int(args[1]) * step)
+
+        def get_visible_rows(self):
+            return int(self.song_treeview.cget("height"))
+
+        def scroll_to(self, first_row):
+            """
+            Shows the songs starting from `first_row` in the top row.
+
+            Args:
+                first_row (int): The index of the song in `shown_songs`.
+            """
+            first_row = max(0, min(first_row, len(self.shown_songs) - self.get_visible_rows()))
+            if first_row != self.first_row:
+                self.first_row = first_row
+                self.render()
+
+        def render(self):
+            """
+            Fills the rows of the tree view with the songs from `first_row`, adding or removing rows when the number
+            of songs in view has changed, and updates the scrollbar.
 
             Notes:
-                - The song names are read from each line of the text file.
-                - Rows are tagged as "even" or "odd" based on their index to alternate row colors.
+                - Rows are tagged as "even" or "odd" based on the index of their song, so the colors do not depend
+                  on the scroll position.
             """
-            self.songs_list = []
-            self.song_treeview.delete(*self.song_treeview.get_children())
+            self.first_row = max(0, min(self.first_row, len(self.shown_songs) - self.get_visible_rows()))
+            songs = self.shown_songs[self.first_row:self.first_row + self.get_visible_rows()]
+
+            while len(self.rows) > len(songs):
+                self.song_treeview.delete(self.rows.pop())
+            while len(self.rows) < len(songs):
+                self.rows.append(self.song_treeview.insert("", "end"))
+
+            for offset, (row, song_name) in enumerate(zip(self.rows, songs)):
+                index = self.first_row + offset
+                tag = "even" if index % 2 == 0 else "odd"
+                self.song_treeview.item(row, values=(song_name, format_time(self.durations.get(song_name))),
+                                        tags=(tag,))
+
+            selected_offset = (self.selected_index - self.first_row) if self.selected_index is not None else -1
+            if 0 <= selected_offset < len(self.rows):
+                self.song_treeview.selection_set(self.rows[selected_offset])
+                self.song_treeview.focus(self.rows[selected_offset])
+            else:
+                self.song_treeview.selection_remove(self.song_treeview.selection())
+
+            if self.shown_songs:
+                self.scrollbar.set(self.first_row / len(self.shown_songs),
+                                   (self.first_row + len(songs)) / len(self.shown_songs))
+            else:
+                self.scrollbar.set(0, 1)
+
+        def filter(self, query, list_changed=False):
+            """
+            Shows only the songs whose name contains `query` and makes them the play queue if they changed.
 
-            if os.path.isfile("../Audio/song_list.txt"):
-                with open("../Audio/song_list.txt", "r") as song_list:
-                    for index, song_name in enumerate(song_list):
-                        song_name = song_name.strip()
-                        tag = "even" if index % 2 == 0 else "odd"
-                        self.song_treeview.insert("", "end", values=(song_name,), tags=(tag,))
-                print("Treeview updated")
+            Args:
+                query (str): The search query, an empty query shows all songs.
+                list_changed (bool, optional): Whether `songs_list` changed since the last filter.
+            """
+            changed = list_changed or query != self.search_query
+            if query != self.search_query:
+                self.search_query = query
+                self.first_row = 0
+                self.selected_index = None
+            if query.strip():
+                text = song_search.normalize(query)
+                indices = self.search_index.search(query)
+                indices += [index for index in range(self.indexed, len(self.songs_list))
+                            if text in song_search.normalize(self.songs_list[index])]
+                self.shown_songs = [self.songs_list[index] for index in indices]
+            else:
+                self.shown_songs = self.songs_list
+            self.render()
+            if changed:
+                music_controls.player.set_queue(self.shown_songs)
+
+        def index_songs(self):
+            """
+            Adds the next `INDEX_CHUNK` songs to the search index and reschedules itself until it holds them all.
+            """
+            end = min(self.indexed + INDEX_CHUNK, len(self.songs_list))
+            self.search_index.add(self.songs_list[self.indexed:end])
+            self.indexed = end
+            if self.indexed < len(self.songs_list):
+                self.index_job = self.after(1, self.index_songs)
+            else:
+                self.index_job = None
+
+        def update_songs_list(self):
+            """
+            Updates the list of songs displayed in the Treeview widget.
+
+            - Reads the songs that were imported since the last update from the song library and appends them. Their
+              lengths come from the library too, so no audio file is opened.
+            - Reloads the whole list only if songs have been removed from the library.
+            - Adds the new songs to the search index in the background and applies the search query again.
+            - Refills the rows in view.
+            - Logs the time the update took to the metrics log.
+            - Makes the shown songs the play queue that next/previous go through, if songs were added or removed.
+            """
+            with metrics.span("songs_list.refresh") as refresh:
+                self.last_song_id, new_names, reloaded = song_library.update_song_list(
+                    file_operations.get_library(), self.songs_list, self.durations, self.last_song_id)
+                if reloaded:
+                    self.search_index = song_search.SearchIndex()
+                    self.indexed = 0
+                    self.selected_index = None
+                if self.indexed < len(self.songs_list) and self.index_job is None:
+                    self.index_job = self.after(1, self.index_songs)
+
+                self.filter(self.search_query, list_changed=bool(new_names) or reloaded)
+                refresh["songs"] = len(self.songs_list)
 
 
 class BottomFrame(ctk.CTkFrame):
@@ -465,61 +820,23 @@ class BottomFrame(ctk.CTkFrame):
 
         self.grid_columnconfigure((0, 1, 2), weight=0)  # Columns 0, 1, and 2 have no expansion
         self.grid_columnconfigure((3, 4), weight=1)  # Columns 3 and 4 expand
-        self.grid_columnconfigure((5, 6, 7), weight=0)  # Columns 5, 6, and 7 have no expansion
+        self.grid_columnconfigure((5, 6, 7, 8), weight=0)  # Columns 5 to 8 have no expansion
 
-        self.album_cover_image = ctk.CTkImage(
-            dark_image=Image.open("Images/Buttons/VinylDiskLight.png"),
-            light_image=Image.open("Images/Buttons/VinylDiskDark.png"),
-            size=(40, 40)
-        )
-        self.images = {
-            "next": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/NextLight.png"),
-                light_image=Image.open("Images/Buttons/NextDark.png"),
-                size=(40, 40)
-            ),
-            "pause": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/PauseLight.png"),
-                light_image=Image.open("Images/Buttons/PauseDark.png"),
-                size=(40, 40)
-            ),
-            "play": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/PlayLight.png"),
-                light_image=Image.open("Images/Buttons/PlayDark.png"),
-                size=(40, 40)
-            ),
-            "previous": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/PreviousLight.png"),
-                light_image=Image.open("Images/Buttons/PreviousDark.png"),
-                size=(40, 40)
-            ),
-            "repeat": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/RepeatLight.png"),
-                light_image=Image.open("Images/Buttons/RepeatDark.png"),
-                size=(40, 40)
-            ),
-            "repeat_selected": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/RepeatLightSelected.png"),
-                light_image=Image.open("Images/Buttons/RepeatDarkSelected.png"),
-                size=(40, 40)
-            ),
-            "shuffle": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/ShuffleLight.png"),
-                light_image=Image.open("Images/Buttons/ShuffleDark.png"),
-                size=(40, 40)
-            ),
-            "volume": ctk.CTkImage(
-                dark_image=Image.open("Images/Buttons/VolumeLight.png"),
-                light_image=Image.open("Images/Buttons/VolumeDark.png"),
-                size=(40, 40)
-            )
-        }
+        self.album_cover_image = assets.get_button_icon("VinylDisk")  # The same image as LeftFrame, smaller
 
-        self.is_playing = False
-        self.paused = False
-        self.music_thread = None
+        self.shown_song_name = None  # The song the label and the seek bar show
+
+        library = file_operations.get_library()
+        self.repeat_mode = library.get_setting("repeat", "off")
+        if self.repeat_mode not in play_order.REPEAT_MODES:
+            self.repeat_mode = "off"
+        self.shuffle = library.get_setting("shuffle", "0") == "1"
+        music_controls.player.set_repeat(self.repeat_mode)
+        music_controls.player.set_shuffle(self.shuffle)
 
         self.__creating_objects()
+        self.after(PROGRESS_INTERVAL, self.update_now_playing)
+        music_controls.player.attach(self, self.on_player_state)
 
     def __creating_objects(self):
         """
@@ -539,29 +856,48 @@ class BottomFrame(ctk.CTkFrame):
             anchor="e"
         )
 
-        self.previous_button = self.__create_button(self.images.get("previous"))
-        self.play_pause_button = self.__create_button(self.images.get("play"))
-        self.next_button = self.__create_button(self.images.get("next"))
-        self.volume_button = self.__create_button(self.images.get("volume"))
-        self.repeat_button = self.__create_button(self.images.get("repeat"))
-        self.shuffle_button = self.__create_button(self.images.get("shuffle"))
-
-        self.previous_button.configure(command=...)
-        self.play_pause_button.configure(command=self.toggle_play_pause)
-        self.next_button.configure(command=...)
-        self.volume_button.configure(command=...)
-        self.repeat_button.configure(command=...)
-        self.shuffle_button.configure(command=...)
+        self.previous_button = self.__create_button(assets.get_button_icon("Previous"))
+        self.play_pause_button = self.__create_button(assets.get_button_icon("Play"))
+        self.next_button = self.__create_button(assets.get_button_icon("Next"))
+        self.volume_button = self.__create_button(assets.get_button_icon("Volume"))
+        self.repeat_button = self.__create_button(assets.get_button_icon("Repeat"))
+        self.shuffle_button = self.__create_button(assets.get_button_icon("Shuffle"))
+        self.volume_slider = ctk.CTkSlider(master=self,
+                                           width=100,
+                                           height=15,
+                                           from_=0,
+                                           to=100,
+                                           progress_color=("Red", "Red"),
+                                           command=music_controls.set_volume
+                                           )
+        self.volume_slider.set(float(file_operations.get_library().get_setting("volume", 100)))
+        music_controls.set_volume(self.volume_slider.get())
+        self.volume_slider.bind("<ButtonRelease-1>", lambda event: file_operations.get_library().set_setting(
+            "volume", self.volume_slider.get()))  # Saved once the slider is let go, not on every step
+
+        self.previous_button.configure(command=music_controls.player.previous)
+        self.play_pause_button.configure(command=music_controls.player.toggle)
+        self.next_button.configure(command=music_controls.player.next)
+        self.volume_button.configure(command=self.toggle_mute)
+        self.repeat_button.configure(command=self.cycle_repeat)
+        self.shuffle_button.configure(command=self.toggle_shuffle)
+        self.show_play_order()
 
         self.album_cover_label.grid(row=0, column=3, padx=(0, 5), pady=(0, 0), sticky="nes")
         self.label.grid(row=0, column=4, padx=(5, 0), pady=(0, 0), sticky="nws")
 
+        self.seek_bar = self.SeekBar(master=self)
+        self.time_label = ctk.CTkLabel(master=self, height=20, text="")
+        self.seek_bar.grid(row=1, column=0, columnspan=8, padx=(10, 5), pady=(0, 5), sticky="ew")
+        self.time_label.grid(row=1, column=8, padx=(0, 10), pady=(0, 5), sticky="ew")
+
         self.previous_button.grid(row=0, column=0, pady=(10, 10), sticky="news")
         self.play_pause_button.grid(row=0, column=1, pady=(10, 10), sticky="news")
         self.next_button.grid(row=0, column=2, pady=(10, 10), sticky="news")
         self.volume_button.grid(row=0, column=5, pady=(10, 10), sticky="news")
-        self.repeat_button.grid(row=0, column=6, pady=(10, 10), sticky="news")
-        self.shuffle_button.grid(row=0, column=7, pady=(10, 10), sticky="news")
+        self.volume_slider.grid(row=0, column=6, padx=(0, 10), pady=(10, 10), sticky="ew")
+        self.repeat_button.grid(row=0, column=7, pady=(10, 10), sticky="news")
+        self.shuffle_button.grid(row=0, column=8, pady=(10, 10), sticky="news")
 
     def __create_button(self, image):
         """
@@ -585,21 +921,202 @@ class BottomFrame(ctk.CTkFrame):
         )
         return button
 
-    def toggle_play_pause(self):
+    def toggle_mute(self):
+        """
+        Mutes or unmutes playback and greys out the volume slider while it is muted.
+        """
+        muted = music_controls.toggle_mute()
+        self.volume_slider.configure(progress_color="Gray" if muted else "Red")
+
+    def cycle_repeat(self):
+        """
+        Moves on to the next repeat mode of `play_order.REPEAT_MODES` and saves it.
+        """
+        modes = play_order.REPEAT_MODES
+        self.repeat_mode = modes[(modes.index(self.repeat_mode) + 1) % len(modes)]
+        music_controls.player.set_repeat(self.repeat_mode)
+        file_operations.get_library().set_setting("repeat", self.repeat_mode)
+        self.show_play_order()
+
+    def toggle_shuffle(self):
         """
-        Toggle between play and pause states. Changes the button image and command accordingly.
+        Turns shuffle on or off and saves it.
         """
-        if self.is_playing:
-            # Stop playback
-            self.play_pause_button.configure(image=self.images["play"])
-            self.is_playing = False
-            music_controls.play_pause_music()
+        self.shuffle = not self.shuffle
+        music_controls.player.set_shuffle(self.shuffle)
+        file_operations.get_library().set_setting("shuffle", "1" if self.shuffle else "0")
+        self.show_play_order()
+
+    def show_play_order(self):
+        """
+        Shows the repeat mode and shuffle on their buttons. Repeating shows the selected repeat image, with a "1"
+        when only the current song is repeated. There is no selected shuffle image, so shuffle is shown by the
+        background of its button.
+        """
+        if self.repeat_mode == "off":
+            self.repeat_button.configure(image=assets.get_button_icon("Repeat"), text="")
         else:
-            # Start playback
-            self.play_pause_button.configure(image=self.images["pause"])
-            self.is_playing = True
-            music_controls.play_pause_music()
+            self.repeat_button.configure(image=assets.get_icon("Buttons/RepeatDarkSelected.png",
+                                                               "Buttons/RepeatLightSelected.png"),
+                                         text="1" if self.repeat_mode == "one" else "", compound="center")
+        self.shuffle_button.configure(fg_color=("gray75", "gray30") if self.shuffle else "transparent")
+
+    def on_player_state(self, status, song_name):
+        """
+        Called on the Tk thread whenever the player changes its status or its song. The play button shows the
+        status of the player, so it cannot drift from it.
+
+        Shows the title and artist of a new song, read from the library, with its waveform and cover art. Songs
+        without tags show their name.
+
+        Args:
+            status (str): The status of the player, see `music_controls.TRANSITIONS`.
+            song_name (str | None): The loaded song.
+        """
+        self.play_pause_button.configure(image=assets.get_button_icon("Pause" if status == "playing" else "Play"))
+        if song_name != self.shown_song_name:
+            self.shown_song_name = song_name
+            song = file_operations.get_library().get_song(song_name) if song_name is not None else None
+            if song is None:
+                self.label.configure(text="Song name\nArtist nickname" if song_name is None else song_name)
+            else:
+                self.label.configure(text=f"{song['title'] or song_name}\n{song['artist'] or ''}".rstrip())
+            self.seek_bar.set_song(song_name)
+            self.album_cover_label.configure(image=get_cover_image(song_name, 40, self.album_cover_image))
+            self.master.frame_left.show_cover(song_name)
+
+    def update_now_playing(self):
+        """
+        Moves the seek bar and the time to the playing position and reschedules itself.
+        """
+        player = music_controls.player
+        position, duration = player.get_position(), player.get_duration()
+        self.seek_bar.set_position(position / duration if duration else 0.0)
+        time_text = f"{format_time(position)} / {format_time(duration)}" if self.shown_song_name is not None else ""
+        if self.time_label.cget("text") != time_text:
+            self.time_label.configure(text=time_text)
+        self.after(PROGRESS_INTERVAL, self.update_now_playing)
+
+    class SeekBar(ctk.CTkCanvas):
+        """
+        A seek bar that shows the waveform overview of the loaded song, with the played part highlighted.
+
+        The overview is read from the peak file written at import, so drawing it does not depend on the length of
+        the song. Songs imported before have their peak file built on a background thread the first time they are
+        loaded, and show a plain bar until then. Clicking or dragging seeks.
+
+        Args:
+            master (ctk.CTkFrame): The parent widget to which this seek bar belongs.
+        """
+
+        HEIGHT = 36
+        COLORS = {  # Background, waveform and played part for every appearance mode
+            "Dark": ("#242424", "#555555", "#d0d0d0"),
+            "Light": ("#ebebeb", "#b0b0b0", "#333333")
+        }
 
+        def __init__(self, master):
+            super().__init__(master=master, height=self.HEIGHT, highlightthickness=0)
+            self.song_name = None
+            self.peaks = None
+            self.built_peaks = None  # (song name, peaks) handed over by the thread that builds a peak file
+            self.tops = self.bottoms = None  # Coordinates of the waveform outline per pixel column
+            self.fraction = 0.0
+            self.played_width = -1
+            self.appearance_mode = None
+
+            self.bind("<Configure>", lambda event: self.draw())
+            self.bind("<Button-1>", self.on_click)
+            self.bind("<B1-Motion>", self.on_click)
+
+        def set_song(self, song_name):
+            """
+            Shows the overview of another song, building its peak file in the background if it has none.
+
+            Args:
+                song_name (str | None): The name of the loaded song.
+            """
+            self.song_name = song_name
+            self.peaks = None
+            if song_name is not None:
+                song_path = music_controls.get_song_path(song_name)
+                try:
+                    self.peaks = waveform.load(song_path)
+                except (OSError, ValueError) as e:
+                    print(f"Error: The peak file of {song_name} could not be read. {e}")
+                if self.peaks is None:
+                    threading.Thread(target=self.build_peaks, args=(song_name, song_path), daemon=True).start()
+            self.draw()
+
+        def build_peaks(self, song_name, song_path):
+            try:
+                self.built_peaks = (song_name, waveform.build(song_path))
+            except Exception as e:
+                print(f"Error: The waveform of {song_name} could not be built. {e}")
+
+        def draw(self):
+            """
+            Draws the overview for the current width. Only the visible columns of the peaks are reduced.
+            """
+            self.appearance_mode = ctk.get_appearance_mode()
+            background, wave_color, played_color = self.COLORS[self.appearance_mode]
+            width, middle = max(self.winfo_width(), 1), self.HEIGHT / 2
+            self.delete("all")
+            self.configure(bg=background)
+
+            if self.peaks is not None:
+                mins, maxs = self.peaks.get_columns(width)
+                self.tops = np.minimum(middle - maxs * middle, middle - 0.5)  # Silence is still one pixel high
+                self.bottoms = np.maximum(middle - mins * middle, middle + 0.5)
+            else:
+                self.tops = np.full(width, middle - 2.0)
+                self.bottoms = np.full(width, middle + 2.0)
+            self.create_polygon(*self.get_outline(width), fill=wave_color, outline="")
+            self.create_polygon(0, 0, 0, 0, 0, 0, fill=played_color, outline="", tags="played")
+            self.played_width = -1
+            self.set_position(self.fraction)
+
+        def get_outline(self, width):
+            """
+            Returns the polygon coordinates of the first `width` columns of the waveform.
+            """
+            xs = np.arange(width, dtype=np.float32)
+            top = np.column_stack((xs, self.tops[:width]))
+            bottom = np.column_stack((xs, self.bottoms[:width]))[::-1]
+            return np.concatenate((top, bottom)).ravel().tolist()
+
+        def set_position(self, fraction):
+            """
+            Highlights the played part of the song. The canvas is only touched when it grows by a pixel.
+
+            Args:
+                fraction (float): The played part of the song, from 0 to 1.
+            """
+            if self.built_peaks is not None:
+                song_name, peaks = self.built_peaks
+                self.built_peaks = None
+                if song_name == self.song_name:
+                    self.peaks = peaks
+                    self.draw()
+            if ctk.get_appearance_mode() != self.appearance_mode:
+                self.draw()
+
+            self.fraction = min(max(fraction, 0.0), 1.0)
+            played_width = round(self.fraction * len(self.tops))
+            if played_width != self.played_width:
+                self.played_width = played_width
+                self.coords("played", *(self.get_outline(played_width) if played_width >= 2 else (0, 0, 0, 0, 0, 0)))
+
+        def on_click(self, event):
+            """
+            Seeks to the clicked position.
+
+            Args:
+                event (tkinter.Event): The event containing the mouse position.
+            """
+            fraction = min(max(event.x / max(self.winfo_width(), 1), 0.0), 1.0)
+            music_controls.player.seek(fraction * music_controls.player.get_duration())
+            self.set_position(fraction)
 
 
 class MPS(ctk.CTk):
@@ -629,6 +1146,11 @@ class MPS(ctk.CTk):
         self.frame_right = RightFrame(master=self)
         self.frame_right.grid(row=1, column=2, padx=(3, 0), pady=(0, 0), sticky="news")
         file_operations.get_right_frame(self.frame_right)
+        stem_separation.get_center_frame(self.frame_center)
+        stem_separation.resume()
+        self.after(AUDIO_INIT_DELAY, music_controls.player.start)
+        self.after(0, lambda: metrics.record("app.startup", time.perf_counter() - STARTED))  # Once the window shows
+        metrics.metrics.watch_ui(self)
 
         self.title_bar_left = TitleBarLeft(master=self)
         self.title_bar_left.grid(row=0, column=0, padx=(0, 0), pady=(0, 0), sticky="news")
@@ -640,4 +1162,8 @@ class MPS(ctk.CTk):
 if __name__ == "__main__":
     app = MPS()
     ThemeManager.set_dark_theme() if ctk.get_appearance_mode() == "Dark" else ThemeManager.set_light_theme()
-    app.mainloop()
+    try:
+        app.mainloop()
+    finally:
+        music_controls.player.close()
+        metrics.metrics.close()  # Writes the last summary, and the profile if profiling is on
@@ -0,0 +1,124 @@
+import os
+import io
+import threading
+import subprocess
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+import audio_conversion
+
+THUMBNAIL_SIZES = (225, 40)  # Cover sizes of LeftFrame and BottomFrame
+CACHE_LIMIT = 32 * 1024 * 1024  # Bytes of decoded thumbnails kept in memory
+
+
+def get_thumbnail_path(song_folder, size):
+    """
+    Returns the path of a cover thumbnail of a song.
+
+    Args:
+        song_folder (str): The folder of the song.
+        size (int): One of `THUMBNAIL_SIZES`.
+
+    Returns:
+        str: The path `<song folder>/cover_<size>.jpg`.
+    """
+    return os.path.join(song_folder, f"cover_{size}.jpg")
+
+
+def extract(file_path, song_folder):
+    """
+    Saves the embedded cover art of an audio file as thumbnails of every size in `THUMBNAIL_SIZES`.
+
+    ffmpeg decodes the cover and scales it down to the largest thumbnail, so a large JPEG is never decoded at
+    full size in Python. This function runs inside a worker process of the import pool.
+
+    Args:
+        file_path (str): The path to the source audio file.
+        song_folder (str): The folder of the song.
+
+    Returns:
+        bool: True if the file has cover art.
+    """
+    largest = max(THUMBNAIL_SIZES)
+    result = subprocess.run([audio_conversion.FFMPEG_PATH,
+                             "-v", "error",
+                             "-i", file_path,
+                             "-map", "0:v:0",
+                             "-frames:v", "1",
+                             "-vf", f"scale={largest}:{largest}:force_original_aspect_ratio=increase",
+                             "-c:v", "bmp",
+                             "-f", "image2pipe",
+                             "-"],
+                            capture_output=True,
+                            creationflags=audio_conversion.CREATION_FLAGS)
+    if result.returncode != 0 or not result.stdout:  # No video stream, i.e. no cover art
+        return False
+
+    with Image.open(io.BytesIO(result.stdout)) as cover:
+        cover = cover.convert("RGB")
+    for size in sorted(THUMBNAIL_SIZES, reverse=True):
+        cover = ImageOps.fit(cover, (size, size), Image.LANCZOS)  # Cropped to a square around the center
+        cover.save(get_thumbnail_path(song_folder, size), quality=90)
+    return True
+
+
+class ThumbnailCache:
+    """
+    A least-recently-used cache of decoded cover thumbnails, limited by the memory the decoded images take.
+
+    Args:
+        limit (int, optional): The maximum number of bytes of decoded images.
+    """
+
+    def __init__(self, limit=CACHE_LIMIT):
+        self.limit = limit
+        self.images = OrderedDict()  # (song folder, size) -> image or None if the song has no cover
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, song_folder, size):
+        """
+        Returns a cover thumbnail, decoding it only if it is not in the cache.
+
+        Args:
+            song_folder (str): The folder of the song.
+            size (int): One of `THUMBNAIL_SIZES`.
+
+        Returns:
+            PIL.Image.Image | None: The thumbnail, or None if the song has no cover art.
+        """
+        key = (song_folder, size)
+        with self.lock:
+            if key in self.images:
+                self.images.move_to_end(key)
+                return self.images[key]
+
+        try:
+            with Image.open(get_thumbnail_path(song_folder, size)) as image:
+                image.load()
+        except FileNotFoundError:
+            image = None
+
+        with self.lock:
+            if key not in self.images:
+                self.images[key] = image
+                self.size += get_image_size(image)
+                while self.size > self.limit and len(self.images) > 1:
+                    _, evicted = self.images.popitem(last=False)
+                    self.size -= get_image_size(evicted)
+        return image
+
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+            self.size = 0
+
+
+def get_image_size(image):
+    if image is None:
+        return 0
+    return image.width * image.height * len(image.getbands())
+
+
+thumbnail_cache = ThumbnailCache()
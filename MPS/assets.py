@@ -0,0 +1,64 @@
+import os
+
+import customtkinter as ctk
+from PIL import Image
+
+IMAGES_FOLDER = "Images"
+
+
+def get_image(path):
+    """
+    Returns an image of the `Images` folder, opening every file only once.
+
+    `Image.open` only reads the header, the pixels are decoded when the image is drawn for the first time. An image
+    that is shown at several sizes is therefore decoded once.
+
+    Args:
+        path (str): The path relative to the `Images` folder, e.g. "Buttons/PlayDark.png".
+
+    Returns:
+        PIL.Image.Image: The image.
+    """
+    image = images.get(path)
+    if image is None:
+        image = images[path] = Image.open(os.path.join(IMAGES_FOLDER, path))
+    return image
+
+
+def get_icon(light_path, dark_path=None, size=(40, 40)):
+    """
+    Returns an image for a widget, created when it is first needed and shared by every widget that shows it.
+
+    Args:
+        light_path (str): The image shown in light mode, relative to the `Images` folder.
+        dark_path (str, optional): The image shown in dark mode, the light image if omitted.
+        size (tuple[int, int], optional): The size of the image on the screen.
+
+    Returns:
+        ctk.CTkImage: The image.
+    """
+    key = (light_path, dark_path, size)
+    icon = icons.get(key)
+    if icon is None:
+        icon = icons[key] = ctk.CTkImage(light_image=get_image(light_path),
+                                         dark_image=get_image(dark_path) if dark_path is not None else None,
+                                         size=size)
+    return icon
+
+
+def get_button_icon(name, size=(40, 40)):
+    """
+    Returns a button image of `Images/Buttons`. Light mode shows the dark drawing and dark mode the light one.
+
+    Args:
+        name (str): The name of the button image, e.g. "Play" for `PlayDark.png` and `PlayLight.png`.
+        size (tuple[int, int], optional): The size of the image on the screen.
+
+    Returns:
+        ctk.CTkImage: The image.
+    """
+    return get_icon(f"Buttons/{name}Dark.png", f"Buttons/{name}Light.png", size)
+
+
+images = {}  # Path -> opened image
+icons = {}  # (light path, dark path, size) -> image for widgets
@@ -0,0 +1,288 @@
+import os
+import json
+import subprocess
+import wave
+
+import waveform
+import loudness
+
+FFMPEG_PATH = os.path.join(os.path.dirname(__file__), "ffmpeg.exe")
+FFPROBE_PATH = os.path.join(os.path.dirname(__file__), "ffprobe.exe")
+CHUNK_FRAMES = 16384  # Number of frames read from ffmpeg at once, the memory used does not depend on the song length
+
+# Raw PCM format that ffmpeg writes for every sample width
+PCM_FORMATS = {
+    1: "u8",
+    2: "s16le",
+    3: "s24le",
+    4: "s32le"
+}
+
+STORAGE_FORMATS = ("wav", "flac")  # Formats songs can be stored in, FLAC takes about half the space of WAV
+FLAC_SAMPLE_WIDTHS = (2, 3)  # Sample widths FLAC stores losslessly, other songs are stored as WAV
+FLAC_COMPRESSION_LEVEL = 5  # ffmpeg's default, higher levels barely shrink the files and slow down the import
+
+# Hide the console window of ffmpeg on Windows
+CREATION_FLAGS = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+def probe(file_path):
+    """
+    Reads the parameters and the tags of the first audio stream of a file with ffprobe.
+
+    Args:
+        file_path (str): The path to the audio file.
+
+    Returns:
+        dict: The stream entry of the ffprobe JSON output, e.g. `sample_rate`, `channels` and `sample_fmt`, and
+            `tags` - the tags of the file and the stream with lowercase keys, e.g. `artist` and `title`.
+
+    Raises:
+        ValueError: If the file has no audio stream.
+        subprocess.CalledProcessError: If ffprobe could not read the file.
+    """
+    result = subprocess.run([FFPROBE_PATH,
+                             "-v", "error",
+                             "-select_streams", "a:0",
+                             "-show_entries", "stream=sample_rate,channels,sample_fmt,bits_per_sample,bits_per_raw_sample"
+                                              ":stream_tags:format_tags",
+                             "-of", "json",
+                             file_path],
+                            capture_output=True,
+                            check=True,
+                            creationflags=CREATION_FLAGS)
+    output = json.loads(result.stdout)
+    streams = output.get("streams")
+    if not streams:
+        raise ValueError(f"{file_path} has no audio stream")
+    stream = streams[0]
+    tags = {}
+    for entry in (output.get("format", {}), stream):  # Tags of the stream win, their case depends on the format
+        tags.update((key.lower(), value) for key, value in entry.get("tags", {}).items())
+    stream["tags"] = tags
+    return stream
+
+
+def get_sample_width(stream):
+    """
+    Chooses the sample width of the WAV file for an audio stream.
+
+    Integer sources keep their bit depth, while lossy sources that are decoded to floats (MP3, AAC, ...) are
+    stored as 16-bit, the same as `AudioSegment.from_file` does.
+
+    Args:
+        stream (dict): The stream entry returned by `probe`.
+
+    Returns:
+        int: The sample width in bytes.
+    """
+    sample_fmt = stream.get("sample_fmt", "")
+    bits = int(stream.get("bits_per_raw_sample") or stream.get("bits_per_sample") or 0)
+    if sample_fmt.startswith("u8"):
+        return 1
+    if sample_fmt.startswith(("flt", "dbl")) or bits <= 16:
+        return 2
+    return 3 if bits <= 24 else 4
+
+
+def get_stored_path(song_path):
+    """
+    Returns the path of the stored audio of a song.
+
+    Args:
+        song_path (str): The path to the song without the extension, e.g. `../Audio/<name>/<name>`.
+
+    Returns:
+        str: The path to the FLAC file if the song is stored as FLAC, otherwise the path to the WAV file.
+    """
+    flac_path = song_path + ".flac"
+    return flac_path if os.path.exists(flac_path) else song_path + ".wav"
+
+
+def decode(file_path, sample_width, chunk_size):
+    """
+    Decodes an audio file with ffmpeg and yields the raw PCM data in blocks.
+
+    Args:
+        file_path (str): The path to the source audio file.
+        sample_width (int): The sample width of the PCM data in bytes.
+        chunk_size (int): The size of every block except the last one.
+
+    Yields:
+        bytes: A block of interleaved PCM data.
+
+    Raises:
+        RuntimeError: If ffmpeg failed to decode the file.
+    """
+    process = subprocess.Popen([FFMPEG_PATH,
+                                "-v", "error",
+                                "-i", file_path,
+                                "-vn",
+                                "-f", PCM_FORMATS[sample_width],
+                                "-"],
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               creationflags=CREATION_FLAGS)
+    try:
+        while True:
+            data = process.stdout.read(chunk_size)
+            if not data:
+                break
+            yield data
+        error = process.stderr.read()
+        process.wait()
+    finally:
+        if process.returncode is None:  # Stopped early by an error of the writer
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to convert {file_path}: {error.decode(errors='replace').strip()}")
+
+
+def copy_blocks(blocks, write):
+    """
+    Writes PCM blocks with `write`.
+
+    Returns:
+        int: The size of the PCM data in bytes.
+    """
+    size = 0
+    for data in blocks:
+        write(data)
+        size += len(data)
+    return size
+
+
+def analyze(blocks, analyzers):
+    """
+    Passes PCM blocks through unchanged while every analyzer, e.g. a `waveform.PeakBuilder`, sees them on the way.
+    """
+    for data in blocks:
+        for analyzer in analyzers:
+            analyzer.add(data)
+        yield data
+
+
+def write_wav(blocks, wav_path, sample_width, channels, sample_rate):
+    with wave.open(wav_path, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        return copy_blocks(blocks, wav_file.writeframesraw)
+
+
+def write_flac(blocks, flac_path, sample_width, channels, sample_rate):
+    """
+    Encodes PCM blocks to FLAC by piping them into a second ffmpeg process.
+    """
+    process = subprocess.Popen([FFMPEG_PATH,
+                                "-v", "error",
+                                "-f", PCM_FORMATS[sample_width],
+                                "-ar", str(sample_rate),
+                                "-ac", str(channels),
+                                "-i", "-",
+                                "-c:a", "flac",
+                                "-compression_level", str(FLAC_COMPRESSION_LEVEL),
+                                "-y", flac_path],
+                               stdin=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               creationflags=CREATION_FLAGS)
+    try:
+        result = copy_blocks(blocks, process.stdin.write)
+        process.stdin.close()
+        error = process.stderr.read()
+        process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stderr.close()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {flac_path}: {error.decode(errors='replace').strip()}")
+    return result
+
+
+def convert(file_path, song_path, storage_format="wav", chunk_frames=CHUNK_FRAMES, peaks_path=None):
+    """
+    Converts an audio file to the storage format of the library by streaming the output of ffmpeg straight into
+    the stored file.
+
+    Unlike `AudioSegment.from_file(...).export(...)`, the decoded song is never held in memory as a whole: ffmpeg
+    writes raw PCM to a pipe and the data is copied to the stored file in blocks of `chunk_frames` frames.
+
+    Args:
+        file_path (str): The path to the source audio file.
+        song_path (str): The path of the stored file without the extension.
+        storage_format (str, optional): One of `STORAGE_FORMATS`. Songs with a sample width FLAC does not store
+            losslessly are always stored as WAV.
+        chunk_frames (int, optional): The number of frames copied at once.
+        peaks_path (str, optional): The path of a peak file with the waveform overview, computed from the same
+            blocks, so the song is decoded only once.
+
+    Returns:
+        dict: `path` of the stored file, its `sample_rate`, `channels`, `sample_width` and `frames`, the `artist`
+            and `title` tags of the source file or None, the integrated `loudness` in LUFS, None for a silent song,
+            and the sample `peak`, measured from the same blocks.
+
+    Raises:
+        RuntimeError: If ffmpeg failed to decode or encode the file. The incomplete file is removed.
+    """
+    stream = probe(file_path)
+    channels = int(stream["channels"])
+    sample_width = get_sample_width(stream)
+    sample_rate = int(stream["sample_rate"])
+    chunk_size = chunk_frames * channels * sample_width  # Whole frames only, so the frame count stays exact
+
+    if storage_format == "flac" and sample_width in FLAC_SAMPLE_WIDTHS:
+        path, write = song_path + ".flac", write_flac
+    else:
+        path, write = song_path + ".wav", write_wav
+    decoded = decode(file_path, sample_width, chunk_size)
+    meter = loudness.LoudnessMeter(sample_width, channels, sample_rate)
+    analyzers = [meter]
+    if peaks_path is not None:
+        peak_builder = waveform.PeakBuilder(sample_width, channels)
+        analyzers.append(peak_builder)
+    blocks = analyze(decoded, analyzers)
+    try:
+        size = write(blocks, path, sample_width, channels, sample_rate)
+        if peaks_path is not None:
+            peak_builder.save(peaks_path, sample_rate)
+    except BaseException:
+        decoded.close()  # Stops the decoder if the writer failed
+        for written_path in (path, peaks_path):
+            if written_path is not None and os.path.exists(written_path):
+                os.remove(written_path)
+        raise
+
+    return {
+        "path": path,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "sample_width": sample_width,
+        "frames": size // (channels * sample_width),
+        "artist": stream["tags"].get("artist"),
+        "title": stream["tags"].get("title"),
+        "loudness": meter.get_loudness(),
+        "peak": meter.peak
+    }
+
+
+def convert_to_wav(file_path, wav_path, chunk_frames=CHUNK_FRAMES):
+    """
+    Converts an audio file to WAV, see `convert`.
+
+    Args:
+        file_path (str): The path to the source audio file.
+        wav_path (str): The path where the WAV file will be written.
+        chunk_frames (int, optional): The number of frames copied at once.
+
+    Returns:
+        dict: The same as `convert`.
+    """
+    return convert(file_path, os.path.splitext(wav_path)[0], "wav", chunk_frames)
@@ -0,0 +1,600 @@
+import time
+import threading
+from collections import deque
+
+import pyaudio
+
+import dsp
+import pcm
+import metrics
+
+END_OF_QUEUE = (b"", None, 0)  # Returned by `RingBuffer.get` once everything has been played
+
+
+class RingBuffer:
+    """
+    A ring of period-sized chunks shared by the feeder thread and the audio callback.
+
+    The chunks are stored as they are, so `memoryview` slices of a mapped song reach the output stream without
+    being copied. The writer blocks on a condition while every slot is taken, so a paused engine with a full
+    buffer uses no CPU. The reader of a sound device never waits, which keeps the audio callback real-time safe.
+
+    Args:
+        slots (int): The number of chunks the buffer holds.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.chunks = deque()
+        self.buffered = 0  # Bytes in the buffer
+        self.closed = False
+        self.done = False
+        self.condition = threading.Condition()
+
+    def put(self, chunk, source, position):
+        """
+        Appends a chunk, waiting for a free slot when the buffer is full.
+
+        Args:
+            chunk (bytes | memoryview): The data to append.
+            source (wav_reader.MappedWave): The song the end of the chunk belongs to.
+            position (int): The frame of `source` that follows the chunk.
+
+        Returns:
+            bool: False if the buffer was closed before the chunk could be appended.
+        """
+        with self.condition:
+            while len(self.chunks) >= self.slots and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return False
+            self.chunks.append((chunk, source, position))
+            self.buffered += len(chunk)
+            self.condition.notify_all()
+            return True
+
+    def get(self, wait=False):
+        """
+        Takes the oldest chunk.
+
+        Args:
+            wait (bool, optional): Wait for a chunk when the buffer is empty instead of returning at once.
+
+        Returns:
+            tuple | None: The chunk with the song and position it was appended with, None if the buffer is empty,
+                or `END_OF_QUEUE` once the buffer is empty and `finish` has been called.
+        """
+        with self.condition:
+            while wait and not self.chunks and not self.done and not self.closed:
+                self.condition.wait()
+            if not self.chunks:
+                return END_OF_QUEUE if self.done else None
+            entry = self.chunks.popleft()
+            self.buffered -= len(entry[0])
+            self.condition.notify_all()
+            return entry
+
+    def finish(self):
+        """Marks that no more chunks will be appended."""
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    def clear(self):
+        """Drops all buffered chunks and reopens the buffer for writing."""
+        with self.condition:
+            self.chunks.clear()
+            self.buffered = 0
+            self.closed = False
+            self.done = False
+            self.condition.notify_all()
+
+    def close(self):
+        """Drops all buffered chunks and stops a writer that waits for a free slot."""
+        with self.condition:
+            self.chunks.clear()
+            self.buffered = 0
+            self.closed = True
+            self.condition.notify_all()
+
+
+class PyAudioOutput:
+    """
+    The sound device output of the engine.
+
+    Args:
+        pyaudio_instance (pyaudio.PyAudio): The PyAudio instance used to open output streams.
+    """
+
+    waits_for_data = False  # A device cannot wait, missing data is an underrun
+
+    def __init__(self, pyaudio_instance):
+        self.p = pyaudio_instance
+
+    def get_device_format(self, sample_width=2):
+        """
+        Returns the format the default output device runs at, so songs can be converted to it instead of the
+        device being reopened for every format.
+
+        Args:
+            sample_width (int, optional): The sample width of the stream in bytes, the device converts it itself.
+
+        Returns:
+            tuple[int, int, int]: The sample width, at most two channels and the default rate of the device.
+        """
+        info = self.p.get_default_output_device_info()
+        return sample_width, min(int(info["maxOutputChannels"]), 2), int(info["defaultSampleRate"])
+
+    def open(self, sample_width, channels, rate, frames_per_buffer, callback):
+        """
+        Opens a stopped output stream that pulls its data from `callback`.
+
+        Args:
+            sample_width (int): The sample width in bytes.
+            channels (int): The number of channels.
+            rate (int): The sample rate in Hz.
+            frames_per_buffer (int): The number of frames requested per callback.
+            callback (callable): A PyAudio stream callback.
+
+        Returns:
+            pyaudio.Stream: The opened stream.
+        """
+        return self.p.open(format=self.p.get_format_from_width(sample_width),
+                           channels=channels,
+                           rate=rate,
+                           output=True,
+                           frames_per_buffer=frames_per_buffer,
+                           stream_callback=callback,
+                           start=False)
+
+
+class CaptureStream:
+    """
+    A stream of `CaptureOutput` that calls the callback from its own thread, as fast as it can, and writes the
+    returned audio to a sink instead of a device.
+    """
+
+    def __init__(self, output, frames_per_buffer, callback):
+        self.output = output
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.thread = None
+        self.running = False
+        self.active = False
+
+    def __run(self):
+        while self.running:
+            data, flag = self.callback(None, self.frames_per_buffer, {}, 0)
+            self.output.write(data)
+            if flag != pyaudio.paContinue:
+                break
+        self.active = False
+
+    def start_stream(self):
+        self.running = True
+        self.active = True
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop_stream(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        self.active = False
+
+    def close(self):
+        self.stop_stream()
+
+    def is_active(self):
+        return self.active
+
+    def get_output_latency(self):
+        return 0.0
+
+
+class CaptureOutput:
+    """
+    An output that captures the played audio instead of sending it to a sound device, so the engine can run
+    headless.
+
+    The stream is not paced by a clock: it waits for the feeder instead of reporting underruns, so the captured
+    audio is exactly what a device would have played, only faster.
+
+    Args:
+        sink (file object, optional): A binary file the audio is written to. If omitted, the audio is collected in
+            `captured`.
+    """
+
+    def __init__(self, sink=None):
+        self.waits_for_data = True
+        self.sink = sink
+        self.captured = bytearray()
+        self.format = None
+
+    def open(self, sample_width, channels, rate, frames_per_buffer, callback):
+        self.format = (sample_width, channels, rate)
+        return CaptureStream(self, frames_per_buffer, callback)
+
+    def write(self, data):
+        if self.sink is not None:
+            self.sink.write(data)
+        else:
+            self.captured += data
+
+
+class AudioEngine:
+    """
+    A playback engine built on the callback mode of PyAudio.
+
+    A feeder thread reads the song into a ring buffer of `buffer_periods` chunks of `frames_per_buffer` frames,
+    and the output stream pulls one chunk per callback. Pausing stops the stream, so the callback is no longer
+    called and the feeder sleeps on the full buffer.
+
+    A song queued with `queue_next` is played gaplessly: when the feeder reaches the end of the current song it
+    fills the rest of the last chunk from the next song and goes on reading it, on the same output stream.
+
+    With a crossfade of `crossfade_seconds`, the feeder starts reading the queued song that long before the end of
+    the current one and mixes the two (see `dsp.crossfade`). Playback moves on to the queued song, and
+    `on_track_changed` is called, once the current song has faded out completely.
+
+    Songs made of several stems (see `stem_mixer.StemSong`) are mixed by `mixer` in the callback, one period at a
+    time, and the mixed audio is processed by `dsp_chain`, so gain, volume and equalizer changes are heard within
+    one period.
+
+    While `normalize` is set, every song is played with the gain it was loaded or queued with, e.g. the loudness
+    normalization computed at import (see `loudness.get_gain`). The gain is applied by the feeder, ramped where it
+    changes, and the crossfade mixes both songs with their own gains, so switching songs keeps the level even.
+
+    Args:
+        output (PyAudioOutput | CaptureOutput): Opens the streams the engine plays to.
+        frames_per_buffer (int, optional): The period size, i.e. the number of frames per callback.
+        buffer_periods (int, optional): The number of periods the ring buffer holds.
+        on_finished (callable, optional): Called without arguments from the callback thread when the last song has
+            been played to the end.
+        on_track_changed (callable, optional): Called with the new song from the callback thread when playback
+            moves on to the queued song.
+        on_first_audio (callable, optional): Called without arguments from the callback thread when the first
+            period of a loaded song is handed to the output, e.g. to time how long the song took to be heard.
+        mixer (stem_mixer.StemMixer, optional): Mixes the stems of songs with more than one stem.
+        dsp_chain (dsp.DspChain, optional): Processes the audio before it is sent to the output.
+    """
+
+    def __init__(self, output, frames_per_buffer=1024, buffer_periods=8, on_finished=None, on_track_changed=None,
+                 on_first_audio=None, mixer=None, dsp_chain=None):
+        self.output = output
+        self.mixer = mixer
+        self.dsp_chain = dsp_chain
+        self.crossfade_seconds = 0.0  # Overlap of a song with the queued one, read by the feeder
+        self.normalize = False  # Whether the gains of the songs are applied, read by the feeder
+        self.frames_per_buffer = frames_per_buffer
+        self.buffer_periods = buffer_periods
+        self.on_finished = on_finished
+        self.on_track_changed = on_track_changed
+        self.on_first_audio = on_first_audio
+
+        self.source = None  # The song that is being played
+        self.feeding = None  # The song the feeder reads, ahead of `source` near the end of a song
+        self.next_source = None
+        self.gains = {}  # Song -> gain it was loaded or queued with
+        self.normalizer = dsp.Volume()  # Applies the gains, used by the feeder only
+        self.lock = threading.Lock()
+        self.stream = None
+        self.format = None
+        self.ring = RingBuffer(buffer_periods)
+        self.feeder = None
+        self.frame_size = 0  # Bytes per frame read from the song, with all stems
+        self.output_frame_size = 0  # Bytes per frame sent to the output
+        self.rate = 0
+
+        self.position = 0  # Frames played from the start of the song
+        self.underruns = 0
+        self.finished = False
+        self.first_audio_pending = False  # No audio of the loaded song has been handed to the output yet
+        self.tail = None  # The audio `dsp_chain` still held at the end of the queue, not yet played
+
+    @staticmethod
+    def get_format(source):
+        stems = source.getnstems() if hasattr(source, "getnstems") else 1
+        return source.getsampwidth(), source.getnchannels(), source.getframerate(), stems
+
+    def load(self, source, gain=1.0):
+        """
+        Stops the current song and prepares `source` for playback. The output stream is kept open if the new song
+        has the same sample width, channels and rate, also when it has another number of stems.
+
+        Args:
+            source (wav_reader.MappedWave | wave.Wave_read): The opened song. Any object with `readframes`,
+                `setpos`, `tell`, `getsampwidth`, `getnchannels` and `getframerate` works.
+            gain (float, optional): The linear gain the song is played with while `normalize` is set.
+        """
+        source_format = self.get_format(source)
+        if self.stream is not None and source_format[:3] == self.format[:3]:
+            self.stream.stop_stream()
+            self.__stop_feeder()
+        else:
+            self.stop()
+            sample_width, channels, self.rate, _ = source_format
+            self.output_frame_size = sample_width * channels
+            self.stream = self.output.open(sample_width, channels, self.rate, self.frames_per_buffer, self.__callback)
+        self.format = source_format
+        self.frame_size = self.output_frame_size * source_format[3]
+
+        with self.lock:
+            self.next_source = None
+            self.gains = {source: gain}
+        self.source = source
+        self.first_audio_pending = True
+        self.__restart_feeder(0)
+
+    def queue_next(self, source, gain=1.0):
+        """
+        Queues the song that is played gaplessly after the current one.
+
+        Args:
+            source (wav_reader.MappedWave | None): The opened song, or None to clear the queue.
+            gain (float, optional): The linear gain the song is played with while `normalize` is set.
+
+        Returns:
+            bool: False if the song has a different format and cannot follow the current song on the same stream.
+        """
+        if source is not None and self.get_format(source) != self.format:
+            return False
+        with self.lock:
+            self.next_source = source
+            # Only the songs that can still be read keep their gains
+            self.gains = {song: song_gain for song, song_gain in self.gains.items()
+                          if song is self.source or song is self.feeding}
+            if source is not None:
+                self.gains[source] = gain
+        return True
+
+    def play(self):
+        """Starts or resumes playback. A song that has been played to the end starts again from the beginning."""
+        if self.stream is None or self.stream.is_active():
+            return
+        if self.finished:
+            self.__restart_feeder(0)
+            self.stream.stop_stream()  # A completed stream has to be stopped before it can be started again
+        self.stream.start_stream()
+
+    def pause(self):
+        """Pauses playback. The buffered audio is kept, so resuming is instant."""
+        if self.stream is not None and self.stream.is_active():
+            self.stream.stop_stream()
+
+    def seek(self, frame):
+        """
+        Moves playback to the given frame. Playback continues from there if the engine was playing.
+
+        Args:
+            frame (int): The frame of the song to play next.
+        """
+        if self.stream is None:
+            return
+        was_playing = self.stream.is_active()
+        self.stream.stop_stream()
+        self.__restart_feeder(frame)
+        if was_playing:
+            self.stream.start_stream()
+
+    def stop(self):
+        """Stops playback and closes the output stream."""
+        if self.stream is None:
+            return
+        self.stream.stop_stream()
+        self.__stop_feeder()
+        self.stream.close()
+        self.stream = None
+        self.format = None
+
+    def is_playing(self):
+        return self.stream is not None and self.stream.is_active()
+
+    def is_reading(self, source):
+        """
+        Returns whether a song is being played or read. A queued song the feeder has moved on to is played after
+        the current one even if the queue is cleared, and must stay open.
+
+        Args:
+            source (wav_reader.MappedWave): The song.
+        """
+        with self.lock:
+            return source is self.source or source is self.feeding
+
+    def get_stats(self):
+        """
+        Returns the buffer sizes, latency and underrun numbers of the engine.
+
+        Returns:
+            dict: `underruns` - the number of periods that were padded with silence because the buffer ran dry,
+                `period_latency` and `buffer_latency` - the length of one period and of the whole ring buffer in
+                seconds, `buffered_latency` - the audio buffered right now in seconds and `output_latency` - the
+                latency the output reports for the device.
+        """
+        stats = {
+            "frames_per_buffer": self.frames_per_buffer,
+            "buffer_periods": self.buffer_periods,
+            "underruns": self.underruns,
+            "period_latency": 0.0,
+            "buffer_latency": 0.0,
+            "buffered_latency": 0.0,
+            "output_latency": 0.0
+        }
+        if self.stream is not None:
+            stats["period_latency"] = self.frames_per_buffer / self.rate
+            stats["buffer_latency"] = self.frames_per_buffer * self.buffer_periods / self.rate
+            stats["buffered_latency"] = self.ring.buffered / self.frame_size / self.rate
+            stats["output_latency"] = self.stream.get_output_latency()
+        return stats
+
+    def __stop_feeder(self):
+        self.ring.close()
+        if self.feeder is not None:
+            self.feeder.join()
+            self.feeder = None
+        with self.lock:
+            if self.feeding is not None and self.feeding is not self.source:
+                self.next_source = self.feeding  # The feeder had already moved on to the queued song
+        self.feeding = None
+
+    def __restart_feeder(self, frame):
+        self.__stop_feeder()
+        self.source.setpos(frame)
+        self.position = frame
+        self.feeding = self.source
+        self.normalizer.set_gain(self.__get_gain(self.source))
+        self.normalizer.reset()  # The buffered audio was dropped, so there is nothing to ramp from
+        if self.dsp_chain is not None:
+            self.dsp_chain.reset()  # Its delayed audio came from before the jump
+        self.tail = None
+        self.finished = False
+        self.ring.clear()
+        self.feeder = threading.Thread(target=self.__feed, args=(self.source,), daemon=True)
+        self.feeder.start()
+
+    def __take_next_source(self):
+        with self.lock:
+            source, self.next_source = self.next_source, None
+            if source is not None:
+                self.feeding = source  # Under the lock, so `is_reading` sees the song either queued or taken
+        if source is not None:
+            source.setpos(0)
+        return source
+
+    def __get_gain(self, source):
+        with self.lock:
+            return self.gains.get(source, 1.0) if self.normalize else 1.0
+
+    def __apply_gain(self, data, source, ramp=True):
+        """
+        Applies the gain of `source` to a chunk read from it. Chunks of songs without a gain are returned as they
+        are.
+
+        Args:
+            ramp (bool, optional): Ramp from the gain of the last chunk, False for the first chunk of a song that
+                follows another one.
+        """
+        self.normalizer.set_gain(self.__get_gain(source))
+        if not ramp:
+            self.normalizer.reset()
+        if self.normalizer.is_neutral():
+            return data
+        sample_width, channels, _, stems = self.format
+        samples = pcm.to_float(data, sample_width).reshape(-1, channels * stems)
+        return pcm.from_float(self.normalizer.process(samples), sample_width)
+
+    def __feed(self, source):
+        """
+        Reads the songs into the ring buffer until the end of the queue or until the buffer is closed. The time
+        spent reading is added to the "playback.decode" timing, with the seconds of audio read as its amount.
+        """
+        chunk_size = self.frames_per_buffer * self.frame_size
+        while True:
+            fade_frames = round(self.crossfade_seconds * self.rate)
+            if fade_frames and source.getnframes() - source.tell() <= fade_frames:
+                next_source = self.__take_next_source()
+                if next_source is not None:
+                    source = self.__feed_crossfade(source, next_source)
+                    if source is None:
+                        return
+                    continue
+
+            start = time.perf_counter()
+            data = source.readframes(self.frames_per_buffer)
+            metrics.add("playback.decode", time.perf_counter() - start, len(data) / self.frame_size / self.rate)
+            data = self.__apply_gain(data, source)
+            if len(data) < chunk_size:  # The end of the song
+                next_source = self.__take_next_source()
+                if next_source is not None:
+                    # The seam between two songs is copied, the part of the next song at its own gain
+                    missing_frames = self.frames_per_buffer - len(data) // self.frame_size
+                    data = bytes(data) + bytes(self.__apply_gain(next_source.readframes(missing_frames), next_source,
+                                                                 ramp=False))
+                    source = next_source
+                elif not data:
+                    self.ring.finish()
+                    return
+            if not self.ring.put(data, source, source.tell()):
+                return
+
+    def __feed_crossfade(self, outgoing, incoming):
+        """
+        Reads the rest of `outgoing` mixed with the start of `incoming` into the ring buffer. The chunks belong to
+        `outgoing` until it has been read completely, so the track only changes when the fade is over and the
+        outgoing song is no longer read.
+
+        Returns:
+            wav_reader.MappedWave | None: The incoming song, or None if the buffer was closed.
+        """
+        sample_width, channels, _, stems = self.format
+        length = outgoing.getnframes() - outgoing.tell()
+        outgoing_gain = self.__get_gain(outgoing)
+        incoming_gain = self.__get_gain(incoming)
+        mixed = 0
+        while mixed < length:
+            # Every chunk is a whole period of the incoming song, a short chunk would be padded with silence
+            data = dsp.crossfade(outgoing.readframes(min(self.frames_per_buffer, length - mixed)),
+                                 incoming.readframes(self.frames_per_buffer),
+                                 sample_width, channels * stems, mixed, length, outgoing_gain, incoming_gain)
+            mixed += self.frames_per_buffer
+            source = outgoing if mixed < length else incoming
+            if not self.ring.put(data, source, source.tell()):
+                return None
+        # The incoming song is already at its gain at the end of the fade
+        self.normalizer.set_gain(incoming_gain)
+        self.normalizer.reset()
+        return incoming
+
+    def __callback(self, in_data, frame_count, time_info, status):
+        """
+        Called by the output stream whenever the device needs `frame_count` more frames.
+        """
+        if status & pyaudio.paOutputUnderflow:
+            self.underruns += 1
+
+        size = frame_count * self.output_frame_size
+        entry = self.ring.get(wait=self.output.waits_for_data)
+        if entry is None:
+            self.underruns += 1
+            return bytes(size), pyaudio.paContinue
+        if entry is END_OF_QUEUE:
+            if self.tail is None:
+                self.tail = self.__flush_dsp_chain()
+            if self.tail:
+                data, self.tail = self.tail[:size], self.tail[size:]
+                return data + bytes(size - len(data)), pyaudio.paContinue
+            self.finished = True
+            if self.on_finished is not None:
+                self.on_finished()
+            return bytes(size), pyaudio.paComplete
+
+        data, source, self.position = entry
+        if self.first_audio_pending:
+            self.first_audio_pending = False
+            if self.on_first_audio is not None:
+                self.on_first_audio()
+        if source is not self.source:
+            self.source = source
+            if self.on_track_changed is not None:
+                self.on_track_changed(source)
+        sample_width, channels, rate, stems = self.format
+        if stems > 1:
+            data = self.mixer.mix(data, sample_width, channels)
+        if len(data) < size:
+            data = bytes(data) + bytes(size - len(data))  # The last chunk of the queue, padded before the delay
+        if self.dsp_chain is not None:
+            data = self.dsp_chain.process(data, sample_width, channels, rate)
+        return data, pyaudio.paContinue
+
+    def __flush_dsp_chain(self):
+        """
+        Returns the audio `dsp_chain` delayed past the end of the queue, by processing as much silence as it is late.
+        """
+        if self.dsp_chain is None:
+            return b""
+        sample_width, channels, rate, _ = self.format
+        frames = round(self.dsp_chain.get_latency(rate) * rate)
+        if not frames:
+            return b""
+        return self.dsp_chain.process(bytes(frames * self.output_frame_size), sample_width, channels, rate)
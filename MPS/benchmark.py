@@ -0,0 +1,438 @@
+"""
+Benchmarks for the slow paths of MPS.
+
+Memory benchmarks run every method in a fresh process, so the peak memory of one method does not hide the peak
+memory of another. Playback benchmarks read songs the way the feeder thread does and need no sound device.
+
+Usage:
+    python benchmark.py convert <audio file> [<audio file> ...]
+    python benchmark.py storage <audio file> [<audio file> ...]
+    python benchmark.py songs_list [--songs 100000]
+    python benchmark.py rescan [--files 50000]
+    python benchmark.py waveform [--minutes 120]
+    python benchmark.py startup [--runs 5]
+    python benchmark.py dsp [--rate 48000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+
+import audio_conversion
+import wav_reader
+import flac_reader
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the current process.
+
+    Returns:
+        int: The peak memory in bytes.
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes
+
+
+def convert_with_pydub(file_path, wav_path):
+    """The old import path: the whole song is decoded into an `AudioSegment` and exported."""
+    from pydub import AudioSegment
+    AudioSegment.converter = audio_conversion.FFMPEG_PATH
+    AudioSegment.from_file(file_path).export(wav_path, format="wav")
+
+
+def convert_with_stream(file_path, wav_path):
+    """The streaming import path."""
+    audio_conversion.convert_to_wav(file_path, wav_path)
+
+
+CONVERTERS = {
+    "pydub": convert_with_pydub,
+    "stream": convert_with_stream
+}
+
+
+def run_converter(name, file_path, wav_path, results):
+    """Runs one converter in the current (child) process and reports wall time and peak memory."""
+    start = time.perf_counter()
+    CONVERTERS[name](file_path, wav_path)
+    results.put((time.perf_counter() - start, peak_rss()))
+
+
+def measure(target, *args):
+    """
+    Runs `target` in a fresh process.
+
+    Returns:
+        tuple[float, int]: The wall time in seconds and the peak memory in bytes reported by the process.
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(*args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def benchmark_convert(file_paths):
+    """
+    Compares the `AudioSegment.from_file`/`export` path with `audio_conversion.convert_to_wav`.
+
+    Args:
+        file_paths (list[str]): The audio files to convert.
+    """
+    print(f"{'file':<40} {'method':<8} {'time, s':>10} {'peak RSS, MB':>14}")
+    with tempfile.TemporaryDirectory() as folder:
+        for file_path in file_paths:
+            for name in CONVERTERS:
+                wav_path = os.path.join(folder, name + ".wav")
+                seconds, peak = measure(run_converter, name, file_path, wav_path)
+                os.remove(wav_path)
+                print(f"{os.path.basename(file_path)[:40]:<40} {name:<8} {seconds:>10.2f} {peak / 2 ** 20:>14.1f}")
+
+
+def play_through(path):
+    """
+    Reads a stored song from start to end in periods of the player, the same way the feeder thread does.
+
+    Returns:
+        int: The number of frames read.
+    """
+    reader = flac_reader.open(path) if path.endswith(".flac") else wav_reader.open(path)
+    frames = 0
+    try:
+        while True:
+            data = reader.readframes(1024)
+            if not data:
+                return frames
+            frames += len(data) // (reader.getnchannels() * reader.getsampwidth())
+    finally:
+        reader.close()
+
+
+def benchmark_storage(file_paths):
+    """
+    Compares the storage formats on a sample library: disk footprint, import time and the CPU time playback
+    needs per hour of audio.
+
+    The CPU time includes the decoder processes where `os.times` reports the time of child processes, which is not
+    the case on Windows.
+
+    Args:
+        file_paths (list[str]): The audio files of the sample library.
+    """
+    print(f"{'format':<8} {'size, MB':>10} {'import, s':>10} {'playback CPU, s/h':>18}")
+    with tempfile.TemporaryDirectory() as folder:
+        for storage_format in audio_conversion.STORAGE_FORMATS:
+            size = 0
+            stored = []
+            start = time.perf_counter()
+            for index, file_path in enumerate(file_paths):
+                info = audio_conversion.convert(file_path, os.path.join(folder, str(index)), storage_format)
+                size += os.path.getsize(info["path"])
+                stored.append((info["path"], info["sample_rate"]))
+            import_seconds = time.perf_counter() - start
+
+            audio_seconds = 0
+            before = os.times()
+            for path, sample_rate in stored:
+                audio_seconds += play_through(path) / sample_rate
+            after = os.times()
+            cpu_seconds = sum(after[:4]) - sum(before[:4])
+            print(f"{storage_format:<8} {size / 2 ** 20:>10.1f} {import_seconds:>10.2f} "
+                  f"{cpu_seconds / max(audio_seconds, 1e-9) * 3600:>18.2f}")
+            for path, sample_rate in stored:
+                os.remove(path)
+
+
+def benchmark_songs_list(songs):
+    """
+    Measures how long refreshing the songs list takes for a library of `songs` songs: the first load, a refresh
+    after an import of 100 songs, and a full rebuild of a plain tree view the way the list used to be refreshed.
+    Needs a display.
+
+    Args:
+        songs (int): The number of songs in the synthetic library.
+    """
+    from tkinter import ttk
+    import customtkinter as ctk
+    import song_library
+
+    working_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.makedirs(os.path.join(folder, "MPS"))
+        os.chdir(os.path.join(folder, "MPS"))  # The library is found at ../Audio, like next to the real app
+        try:
+            import file_operations
+            import Form
+
+            library = file_operations.get_library()
+            empty = (None,) * (len(song_library.COLUMNS) - 1)
+            library.add_songs((f"Song {index}",) + empty for index in range(songs))
+            root = ctk.CTk()
+
+            start = time.perf_counter()
+            songs_list = Form.RightFrame.CreatingTreeview(master=root)  # Loads the list
+            root.update()
+            print(f"first load of {songs} songs: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+            library.add_songs((f"New song {index}",) + empty for index in range(100))
+            start = time.perf_counter()
+            songs_list.update_songs_list()
+            root.update()
+            print(f"refresh after importing 100 songs: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+            treeview = ttk.Treeview(root, columns=("name", "length"), show="headings")
+            start = time.perf_counter()
+            treeview.delete(*treeview.get_children())
+            for index, song_name in enumerate(library.get_names()):
+                treeview.insert("", "end", values=(song_name,), tags=("even" if index % 2 == 0 else "odd",))
+            root.update()
+            print(f"full rebuild of a plain tree view: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+            root.destroy()
+            library.close()
+        finally:
+            os.chdir(working_folder)
+
+
+def benchmark_rescan(files):
+    """
+    Measures a folder scan and the comparison with the manifest of the previous scan, for a synthetic tree of
+    `files` empty files in folders of 100 files, after 1% of the files were changed, added and removed.
+
+    Args:
+        files (int): The number of files in the tree.
+    """
+    import folder_scan
+    import song_library
+
+    with tempfile.TemporaryDirectory() as folder:
+        tree = os.path.join(folder, "tree")
+        paths = []
+        for index in range(files):
+            folder_path = os.path.join(tree, f"album {index // 100}")
+            if index % 100 == 0:
+                os.makedirs(folder_path)
+            paths.append(os.path.join(folder_path, f"song {index}.mp3"))
+            open(paths[-1], "wb").close()
+        library = song_library.SongLibrary(os.path.join(folder, "Audio", "library.db"))
+
+        start = time.perf_counter()
+        scanned = folder_scan.scan(tree)
+        added, changed, removed = folder_scan.compare(library.get_manifest(tree), scanned)
+        library.update_manifest(tree, scanned, removed)
+        print(f"first scan of {len(scanned)} files: {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"{len(added)} to import")
+
+        step = 100
+        for path in paths[::step]:
+            with open(path, "ab") as file:
+                file.write(b"changed")
+        for path in paths[1::step]:
+            os.remove(path)
+        for index in range(0, files, step):
+            open(os.path.join(tree, f"album {index // 100}", "new song.mp3"), "wb").close()
+
+        start = time.perf_counter()
+        scanned = folder_scan.scan(tree)
+        manifest = library.get_manifest(tree)
+        added, changed, removed = folder_scan.compare(manifest, scanned)
+        library.update_manifest(tree, {path: scanned[path] for path in added + changed}, removed)
+        print(f"rescan: {(time.perf_counter() - start) * 1000:.1f} ms, {len(added)} added, {len(changed)} changed, "
+              f"{len(removed)} removed")
+        library.close()
+
+
+def benchmark_waveform(minutes):
+    """
+    Measures how long the seek bar needs to get the waveform overview of a long mix: building the peaks of a
+    synthetic song of `minutes` minutes, the size of the peak file, and loading and reducing it to the width of the
+    seek bar.
+
+    Args:
+        minutes (int): The length of the synthetic song.
+    """
+    import numpy as np
+    import waveform
+
+    block_frames = audio_conversion.CHUNK_FRAMES
+    block = (np.random.default_rng(0).standard_normal(block_frames * 2) * 3000).astype(np.int16).tobytes()
+    builder = waveform.PeakBuilder(2, 2)
+    start = time.perf_counter()
+    for _ in range(minutes * 60 * 44100 // block_frames):
+        builder.add(block)
+    print(f"building the peaks of {minutes} minutes: {time.perf_counter() - start:.2f} s")
+
+    with tempfile.TemporaryDirectory() as folder:
+        peaks_path = os.path.join(folder, "song.peaks")
+        builder.save(peaks_path, 44100)
+        print(f"peak file: {os.path.getsize(peaks_path) / 1024:.0f} KB")
+        for width in (300, 600, 1200):
+            start = time.perf_counter()
+            waveform.Peaks(peaks_path).get_columns(width)
+            print(f"loading and reducing to {width} columns: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+STARTUP_SCRIPT = """
+import sys
+import time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import Form
+imported = time.perf_counter()
+app = Form.app = Form.MPS()
+created = time.perf_counter()
+app.update()  # Draws the first frame
+shown = time.perf_counter()
+print(imported - start, created - start, shown - start)
+app.destroy()
+"""
+
+
+def benchmark_startup(runs):
+    """
+    Measures the time from starting Python to the first drawn frame of the window, with an empty library. Every
+    run starts a new interpreter, the first run is the closest to a cold start. Needs a display.
+
+    Args:
+        runs (int): The number of runs.
+    """
+    import shutil
+    import subprocess
+
+    source_folder = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'run':>4} {'imports, ms':>12} {'window, ms':>12} {'first frame, ms':>16} {'process, ms':>12}")
+    with tempfile.TemporaryDirectory() as folder:
+        working_folder = os.path.join(folder, "MPS")  # The library is created at ../Audio, next to it
+        shutil.copytree(os.path.join(source_folder, "Images"), os.path.join(working_folder, "Images"))
+        for run in range(1, runs + 1):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, source_folder], cwd=working_folder,
+                                    capture_output=True, text=True, check=True)
+            process_seconds = time.perf_counter() - start
+            imported, created, shown = map(float, result.stdout.split()[-3:])
+            print(f"{run:>4} {imported * 1000:>12.0f} {created * 1000:>12.0f} {shown * 1000:>16.0f} "
+                  f"{process_seconds * 1000:>12.0f}")
+
+
+def benchmark_dsp(rate, seconds=30, frames_per_buffer=1024):
+    """
+    Measures the CPU time of the playback processing per second of 16-bit stereo audio, in percent of one core,
+    for every stage of `dsp.DspChain` and for a crossfade.
+
+    Args:
+        rate (int): The sample rate in Hz.
+        seconds (int, optional): The length of the synthetic audio.
+        frames_per_buffer (int, optional): The block size.
+    """
+    import numpy as np
+    import dsp
+    import pcm
+
+    samples = np.random.default_rng(0).standard_normal((rate * seconds, 2)).astype(np.float32) * 0.1
+    data = pcm.from_float(samples, 2)
+    block_size = frames_per_buffer * 4
+    blocks = [data[offset:offset + block_size] for offset in range(0, len(data) - block_size + 1, block_size)]
+    presets = list(dsp.EQ_PRESETS)
+
+    def run(setup, change=None):
+        chain = dsp.DspChain()
+        setup(chain)
+        start = time.process_time()
+        for index, block in enumerate(blocks):
+            if change is not None:
+                change(chain, index)
+            chain.process(block, 2, 2, rate)
+        return (time.process_time() - start) / seconds * 100
+
+    print(f"{'stage':<32} {'CPU, % of a core':>17}")
+    print(f"{'bypassed':<32} {run(lambda chain: None):>17.3f}")
+    print(f"{'volume':<32} {run(lambda chain: chain.volume.set_gain(0.5)):>17.3f}")
+    print(f"{'volume moved every block':<32} "
+          f"{run(lambda chain: None, lambda chain, index: chain.volume.set_gain(index % 2 * 0.5)):>17.3f}")
+    print(f"{'equalizer':<32} {run(lambda chain: chain.equalizer.set_bands(dsp.EQ_PRESETS['Vocal'])):>17.3f}")
+
+    def change_preset(chain, index):
+        chain.equalizer.set_bands(dsp.EQ_PRESETS[presets[index % len(presets)]])
+
+    print(f"{'equalizer changed every block':<32} {run(lambda chain: None, change_preset):>17.3f}")
+
+    start = time.process_time()
+    for index, block in enumerate(blocks):
+        dsp.crossfade(block, block, 2, 2, index * frames_per_buffer, len(blocks) * frames_per_buffer)
+    print(f"{'crossfade':<32} {(time.process_time() - start) / seconds * 100:>17.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MPS benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="Compare peak memory and time of the import converters")
+    convert_parser.add_argument("files", nargs="+")
+
+    storage_parser = commands.add_parser("storage", help="Compare disk footprint, import time and playback CPU "
+                                                         "of the storage formats")
+    storage_parser.add_argument("files", nargs="+")
+
+
+    songs_list_parser = commands.add_parser("songs_list", help="Measure how long refreshing the songs list takes")
+    songs_list_parser.add_argument("--songs", type=int, default=100000)
+
+    rescan_parser = commands.add_parser("rescan", help="Measure an incremental folder rescan")
+    rescan_parser.add_argument("--files", type=int, default=50000)
+
+    waveform_parser = commands.add_parser("waveform", help="Measure building and drawing a waveform overview")
+    waveform_parser.add_argument("--minutes", type=int, default=120)
+
+    startup_parser = commands.add_parser("startup", help="Measure the time to the first frame of the window")
+    startup_parser.add_argument("--runs", type=int, default=5)
+
+    dsp_parser = commands.add_parser("dsp", help="Measure the CPU time of volume, equalizer and crossfade")
+    dsp_parser.add_argument("--rate", type=int, default=48000)
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        benchmark_convert(args.files)
+    elif args.command == "storage":
+        benchmark_storage(args.files)
+    elif args.command == "songs_list":
+        benchmark_songs_list(args.songs)
+    elif args.command == "rescan":
+        benchmark_rescan(args.files)
+    elif args.command == "waveform":
+        benchmark_waveform(args.minutes)
+    elif args.command == "startup":
+        benchmark_startup(args.runs)
+    elif args.command == "dsp":
+        benchmark_dsp(args.rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import threading
+
+import numpy as np
+
+import pcm
+
+EQ_TAPS = 2048  # Length of the FIR filter of the equalizer, 2048 resolves bass bands down to about 60 Hz
+SHELF_Q = 0.707  # Q of the shelving bands, the steepest shelf without a bump
+
+# Preset name -> bands as (kind, frequency in Hz, gain in dB, Q), kind is "low_shelf", "peak" or "high_shelf"
+EQ_PRESETS = {
+    "Flat": [],
+    "Bass Boost": [("low_shelf", 120, 6.0, SHELF_Q)],
+    "Treble Boost": [("high_shelf", 6000, 5.0, SHELF_Q)],
+    "Vocal": [("low_shelf", 150, -3.0, SHELF_Q), ("peak", 2500, 4.0, 1.0), ("high_shelf", 10000, -2.0, SHELF_Q)],
+    "Loudness": [("low_shelf", 100, 6.0, SHELF_Q), ("peak", 1000, -2.0, 0.7), ("high_shelf", 8000, 4.0, SHELF_Q)]
+}
+
+
+def get_band_coefficients(kind, frequency, gain, q, rate):
+    """
+    Returns the coefficients of one band as a biquad filter, from the Audio EQ Cookbook by Robert Bristow-Johnson.
+
+    Args:
+        kind (str): "low_shelf", "peak", "high_shelf" or "high_pass".
+        frequency (float): The center or corner frequency in Hz.
+        gain (float): The gain in dB.
+        q (float): The quality factor, higher values make the band narrower.
+        rate (int): The sample rate in Hz.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: The numerator and denominator coefficients (b0, b1, b2), (a0, a1, a2).
+    """
+    a = 10 ** (gain / 40)
+    w0 = 2 * np.pi * min(frequency, rate * 0.49) / rate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    if kind == "peak":
+        b = (1 + alpha * a, -2 * cos_w0, 1 - alpha * a)
+        d = (1 + alpha / a, -2 * cos_w0, 1 - alpha / a)
+    elif kind == "low_shelf":
+        root = 2 * np.sqrt(a) * alpha
+        b = (a * ((a + 1) - (a - 1) * cos_w0 + root),
+             2 * a * ((a - 1) - (a + 1) * cos_w0),
+             a * ((a + 1) - (a - 1) * cos_w0 - root))
+        d = ((a + 1) + (a - 1) * cos_w0 + root,
+             -2 * ((a - 1) + (a + 1) * cos_w0),
+             (a + 1) + (a - 1) * cos_w0 - root)
+    elif kind == "high_shelf":
+        root = 2 * np.sqrt(a) * alpha
+        b = (a * ((a + 1) + (a - 1) * cos_w0 + root),
+             -2 * a * ((a - 1) + (a + 1) * cos_w0),
+             a * ((a + 1) + (a - 1) * cos_w0 - root))
+        d = ((a + 1) - (a - 1) * cos_w0 + root,
+             2 * ((a - 1) - (a + 1) * cos_w0),
+             (a + 1) - (a - 1) * cos_w0 - root)
+    elif kind == "high_pass":  # The gain is not used
+        b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+        d = (1 + alpha, -2 * cos_w0, 1 - alpha)
+    else:
+        raise ValueError(f"unknown band kind: {kind}")
+    return np.array(b), np.array(d)
+
+
+def design_filter(bands, rate, taps=EQ_TAPS):
+    """
+    Designs a linear-phase FIR filter with the magnitude response of the bands in series.
+
+    The magnitude of every band is evaluated on the frequency grid of the filter and multiplied, and the filter is
+    the windowed inverse transform of the product. A linear-phase filter delays every frequency by the same
+    `taps // 2` frames, so the bands do not smear transients the way cascaded IIR filters would.
+
+    Args:
+        bands (list[tuple]): The bands as (kind, frequency, gain, Q), see `EQ_PRESETS`.
+        rate (int): The sample rate in Hz.
+        taps (int, optional): The length of the filter.
+
+    Returns:
+        numpy.ndarray: The float32 filter coefficients.
+    """
+    z = np.exp(-1j * np.linspace(0, np.pi, taps // 2 + 1))  # z^-1 on the grid of the filter
+    magnitude = np.ones(len(z))
+    for kind, frequency, gain, q in bands:
+        b, d = get_band_coefficients(kind, frequency, gain, q, rate)
+        magnitude *= np.abs((b[0] + b[1] * z + b[2] * z ** 2) / (d[0] + d[1] * z + d[2] * z ** 2))
+    impulse = np.roll(np.fft.irfft(magnitude, taps), taps // 2)  # The zero-phase response, centered
+    return (impulse * np.hanning(taps)).astype(np.float32)
+
+
+class Volume:
+    """
+    A gain stage. A change of the gain is ramped linearly over the next block, like the gains of
+    `stem_mixer.StemMixer`, so it is heard within one period and without clicks.
+    """
+
+    def __init__(self):
+        self.gain = 1.0
+        self.muted = False
+        self.applied = 1.0  # The gain at the end of the last block
+
+    def set_gain(self, gain):
+        """
+        Args:
+            gain (float): The linear gain, 1.0 keeps the audio as it is.
+        """
+        self.gain = float(gain)
+
+    def set_muted(self, muted):
+        self.muted = muted
+
+    def get_target(self):
+        return 0.0 if self.muted else self.gain
+
+    def is_neutral(self):
+        return self.applied == 1.0 and self.get_target() == 1.0
+
+    def reset(self):
+        """Applies the gain at once from the next block on, for audio that does not continue the last block."""
+        self.applied = self.get_target()
+
+    def process(self, samples):
+        """
+        Applies the gain to a block.
+
+        Args:
+            samples (numpy.ndarray): The float samples of the block, one row per frame.
+
+        Returns:
+            numpy.ndarray: The block with the gain applied.
+        """
+        target = self.get_target()
+        if target == self.applied:
+            return samples if target == 1.0 else samples * np.float32(target)
+        ramp = np.linspace(self.applied, target, len(samples), dtype=np.float32)
+        self.applied = target
+        return samples * ramp[:, None]
+
+
+class History:
+    """
+    The last frames of a stream, kept in a ring that is allocated once and written in place block by block.
+
+    Args:
+        frames (int): The number of frames kept.
+        channels (int): The number of samples per frame.
+    """
+
+    def __init__(self, frames, channels):
+        self.ring = np.zeros((frames, channels), dtype=np.float32)
+        self.end = 0  # The index after the newest frame
+
+    def reset(self):
+        """Fills the history with silence."""
+        self.ring.fill(0.0)
+        self.end = 0
+
+    def write(self, samples):
+        """
+        Appends a block, overwriting the oldest frames.
+
+        Args:
+            samples (numpy.ndarray): The float samples, one row per frame.
+        """
+        size = len(self.ring)
+        if len(samples) >= size:
+            self.ring[:] = samples[len(samples) - size:]
+            self.end = 0
+            return
+        stop = self.end + len(samples)
+        if stop <= size:
+            self.ring[self.end:stop] = samples
+        else:
+            self.ring[self.end:] = samples[:size - self.end]
+            self.ring[:stop - size] = samples[size - self.end:]
+        self.end = stop % size
+
+    def read(self, frames):
+        """
+        Returns the newest frames, oldest first. The result is a view of the ring if they do not wrap around.
+
+        Args:
+            frames (int): The number of frames, at most the size of the history.
+        """
+        start = (self.end - frames) % len(self.ring)
+        if start + frames <= len(self.ring):
+            return self.ring[start:start + frames]
+        return np.concatenate((self.ring[start:], self.ring[:self.end]))
+
+
+class Equalizer:
+    """
+    A parametric equalizer with any number of shelving and peaking bands, applied as one FIR filter by fast
+    convolution.
+
+    Every block is filtered with the overlap-save method: the block is appended to the last `taps - 1` frames and
+    the whole is multiplied with the filter in the frequency domain, so the work per block is a few FFTs whatever
+    the number of bands. When the bands change, the block is filtered with the old and the new filter and the two
+    are crossfaded, so a change is heard within one period, without a click and without emptying any buffer.
+
+    The filter delays the audio by `taps // 2` frames, about 20 ms. A flat equalizer is bypassed and adds no
+    latency until the first filter is applied. From then on the audio stays `taps // 2` frames late, also when the
+    equalizer is made flat again, so turning it off does not skip audio, until `reset` is called at a jump in the
+    audio. The input is kept in a `History` either way, so the filter starts on the audio that came before it.
+
+    Args:
+        taps (int, optional): The length of the filter.
+    """
+
+    def __init__(self, taps=EQ_TAPS):
+        self.taps = taps
+        self.bands = []
+        self.version = 0  # Incremented on every change of the bands
+        self.lock = threading.Lock()
+
+        # Used by the audio thread only
+        self.applied = None  # (version, rate) of `spectra`
+        self.filter = None  # The coefficients of the applied filter, None while bypassed
+        self.spectra = {}  # FFT size -> spectrum of `filter`
+        self.history = None  # `History` of the last `taps - 1` frames of the input
+        self.delaying = False  # Whether the output is `taps // 2` frames late
+
+    def set_bands(self, bands):
+        """
+        Args:
+            bands (list[tuple]): The bands as (kind, frequency, gain, Q), see `EQ_PRESETS`. Bands with a gain of
+                0 dB are left out.
+        """
+        with self.lock:
+            self.bands = [band for band in bands if band[2] != 0]
+            self.version += 1
+
+    def reset(self):
+        """Forgets the input, for audio that does not continue the last block, e.g. after a seek."""
+        if self.history is not None:
+            self.history.reset()
+        self.delaying = self.filter is not None
+
+    def get_spectrum(self, size):
+        spectrum = self.spectra.get(size)
+        if spectrum is None:
+            spectrum = self.spectra[size] = np.fft.rfft(self.filter, size)[:, None].astype(np.complex64)
+        return spectrum
+
+    def process(self, samples, rate):
+        """
+        Filters a block.
+
+        Args:
+            samples (numpy.ndarray): The float samples of the block, one row per frame.
+            rate (int): The sample rate in Hz.
+
+        Returns:
+            numpy.ndarray: The filtered block, `taps // 2` frames late while `delaying`.
+        """
+        if self.history is None or self.history.ring.shape[1] != samples.shape[1]:
+            self.history = History(self.taps - 1, samples.shape[1])
+        with self.lock:
+            version, bands = self.version, self.bands
+        if self.filter is None and self.applied == (version, rate):  # Bypassed
+            output = self.__delay(samples) if self.delaying else samples
+            self.history.write(samples)
+            return output
+
+        frames = len(samples)
+        signal = np.concatenate((self.history.read(self.taps - 1), samples))
+        self.history.write(samples)
+        size = 1 << (len(signal) - 1).bit_length()  # The circular convolution must not wrap into the block
+        unfiltered = signal[self.taps - 1 - self.taps // 2:][:frames] if self.delaying else samples
+        previous = self.__filter(signal, size, frames) if self.filter is not None else unfiltered
+        if self.applied == (version, rate):
+            return previous
+
+        self.applied = (version, rate)
+        self.spectra = {}
+        ramp = np.linspace(0.0, 1.0, frames, dtype=np.float32)[:, None]
+        self.filter = design_filter(bands, rate, self.taps) if bands else None
+        if self.filter is None:
+            return previous + (unfiltered - previous) * ramp
+        self.delaying = True
+        current = self.__filter(signal, size, frames)
+        return previous + (current - previous) * ramp
+
+    def __delay(self, samples):
+        """Returns the block `taps // 2` frames late, the way the filter delays it."""
+        delay = self.taps // 2
+        delayed = np.empty_like(samples)
+        from_history = min(delay, len(samples))
+        delayed[:from_history] = self.history.read(delay)[:from_history]
+        delayed[from_history:] = samples[:len(samples) - from_history]
+        return delayed
+
+    def __filter(self, signal, size, frames):
+        filtered = np.fft.irfft(np.fft.rfft(signal, size, axis=0) * self.get_spectrum(size), size, axis=0)
+        return filtered[self.taps - 1:self.taps - 1 + frames].astype(np.float32, copy=False)
+
+
+class DspChain:
+    """
+    The processing of the played audio after the stems are mixed: the equalizer, then the volume.
+
+    The chain works on the PCM blocks of the audio callback. Once the equalizer has been turned on, the audio is
+    late by its latency until the next `reset`, see `get_latency`. The settings may be changed from any thread.
+    """
+
+    def __init__(self):
+        self.volume = Volume()
+        self.equalizer = Equalizer()
+
+    def get_latency(self, rate):
+        """
+        Returns the delay the chain adds to the audio in seconds, i.e. how much silence has to be processed after
+        the last block to hear all of it.
+
+        Args:
+            rate (int): The sample rate in Hz.
+        """
+        return self.equalizer.taps // 2 / rate if self.equalizer.delaying else 0.0
+
+    def reset(self):
+        """Forgets the audio before the next block, for audio that does not continue the last block."""
+        self.equalizer.reset()
+
+    def process(self, data, sample_width, channels, rate):
+        """
+        Processes one block.
+
+        Args:
+            data (bytes | memoryview): Interleaved PCM data.
+            sample_width (int): The sample width in bytes.
+            channels (int): The number of channels.
+            rate (int): The sample rate in Hz.
+
+        Returns:
+            bytes: The processed PCM data.
+        """
+        samples = pcm.to_float(data, sample_width).reshape(-1, channels)
+        samples = self.equalizer.process(samples, rate)
+        samples = self.volume.process(samples)
+        return pcm.from_float(samples, sample_width)
+
+
+def crossfade(outgoing, incoming, sample_width, samples_per_frame, start, length, outgoing_gain=1.0,
+              incoming_gain=1.0):
+    """
+    Mixes the end of one song into the start of the next with equal-power curves, so the loudness stays even
+    through the fade.
+
+    Args:
+        outgoing (bytes | memoryview): The frames of the song that fades out. It may be shorter than `incoming`.
+        incoming (bytes | memoryview): The frames of the song that fades in. It may be shorter than `outgoing`.
+        sample_width (int): The sample width in bytes.
+        samples_per_frame (int): The number of samples per frame, the channels times the stems.
+        start (int): The frames of the fade that have been mixed before this block.
+        length (int): The length of the whole fade in frames.
+        outgoing_gain (float, optional): The linear gain of the song that fades out.
+        incoming_gain (float, optional): The linear gain of the song that fades in.
+
+    Returns:
+        bytes: The mixed frames, as long as the longer of the two.
+    """
+    outgoing = pcm.to_float(outgoing, sample_width).reshape(-1, samples_per_frame)
+    incoming = pcm.to_float(incoming, sample_width).reshape(-1, samples_per_frame)
+    frames = max(len(outgoing), len(incoming))
+    progress = np.minimum((start + np.arange(frames, dtype=np.float32)) / max(length, 1), 1.0) * (np.pi / 2)
+    mixed = np.zeros((frames, samples_per_frame), dtype=np.float32)
+    mixed[:len(outgoing)] += outgoing * (np.cos(progress[:len(outgoing)]) * outgoing_gain)[:, None]
+    mixed[:len(incoming)] += incoming * (np.sin(progress[:len(incoming)]) * incoming_gain)[:, None]
+    return pcm.from_float(mixed, sample_width)
@@ -1,10 +1,19 @@
 import os
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
 from tkinter import filedialog
-from pydub import AudioSegment
 import shutil
 
-# Set ffmpeg path
-AudioSegment.converter = os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
+import album_art
+import audio_conversion
+import fingerprints
+import folder_scan
+import metrics
+import song_library
+import waveform
+import stem_separation
 
 
 def get_right_frame(right_frame):
@@ -28,122 +37,652 @@ def get_right_frame(right_frame):
     frame = right_frame
 
 
-def load_existing_songs():
+def get_library():
     """
-    Loads existing songs from the song list file.
+    Returns the song library, opening it on first use.
+
+    The library is opened lazily, so the worker processes of the import pool, which import this module, never
+    open the database.
 
     Returns:
-        set: A set of song names loaded from the song list file. If the file does not exist, returns an empty set.
+        song_library.SongLibrary: The library of imported songs.
+    """
+    global library
+    if library is None:
+        library = song_library.SongLibrary(database_path, legacy_list_path=song_list_path)
+    return library
 
-    Notes:
-        The function reads from a global variable `song_list_path` which should specify the path to the song list file.
-        Each line in the file is treated as a song name and is added to the returned set.
+
+def convert_song(file_path, song_name, audio_folder, fingerprint, file_hash=None, storage_format="wav"):
+    """
+    Converts a single audio file to the storage format inside its own song folder.
+
+    This function runs inside a worker process of the import pool, so it only touches the file system and
+    never the global song list or the UI.
+
+    Args:
+        file_path (str): The path to the source audio file.
+        song_name (str): The name of the song, used for both the folder and the stored file.
+        audio_folder (str): The root folder that holds all imported songs.
+        fingerprint (str): The fingerprint of the source file.
+        file_hash (str, optional): The full hash of the source file, computed here if it is not known yet.
+        storage_format (str, optional): One of `audio_conversion.STORAGE_FORMATS`.
+
+    Returns:
+        tuple: The values of `song_library.COLUMNS` for the converted song.
+    """
+    if file_hash is None:
+        file_hash = fingerprints.hash_file(file_path)
+    new_folder = os.path.join(audio_folder, song_name)  # Creating new folder for the song with similar name
+    os.makedirs(new_folder, exist_ok=True)
+    song_path = os.path.join(new_folder, song_name)  # Path where the song will be posted, without the extension
+
+    # Stream the decoded audio into the stored file
+    info = audio_conversion.convert(file_path, song_path, storage_format,
+                                    peaks_path=waveform.get_peaks_path(song_path))
+    try:
+        album_art.extract(file_path, new_folder)  # Thumbnails of the cover art, if the file has one
+    except Exception as e:
+        print(f"Error occurred while extracting the cover art of {file_path}: {e}")
+    return (song_name,
+            os.path.abspath(file_path),
+            info["frames"] / info["sample_rate"],
+            info["sample_rate"],
+            info["channels"],
+            fingerprint,
+            file_hash,
+            info["sample_width"],
+            info["artist"],
+            info["title"],
+            info["loudness"],
+            info["peak"])
+
+
+def get_storage_format():
+    """
+    Returns the format new songs are stored in, one of `audio_conversion.STORAGE_FORMATS`.
     """
-    if not os.path.exists(song_list_path):
-        return set()
-    with open(song_list_path, "r") as file:
-        return set(line.strip() for line in file)
+    return get_library().get_setting("storage_format", "wav")
 
 
-def save_song(song_name):
+def set_storage_format(storage_format):
     """
-    Appends a new song name to the song list file.
+    Sets the format new songs are stored in. Songs that are already imported keep their format.
 
     Args:
-        song_name (str): The name of the song to be added to the song list file.
+        storage_format (str): One of `audio_conversion.STORAGE_FORMATS`.
+    """
+    if storage_format not in audio_conversion.STORAGE_FORMATS:
+        raise ValueError(f"unknown storage format: {storage_format}")
+    get_library().set_setting("storage_format", storage_format)
 
-    Notes:
-        The function appends the song name to the file specified by the global variable `song_list_path`.
-        If the file does not exist, it will be created. Each song name is written on a new line.
+
+def get_executor():
+    """
+    Returns the process pool used for importing songs, creating it on first use.
+
+    Returns:
+        ProcessPoolExecutor: A pool with one worker per CPU core.
     """
-    with open(song_list_path, "a") as file:
-        file.write(song_name + "\n")
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return executor
+
+
+def get_base_name(file_path):
+    """Returns the file name without its extension, the name a song imported from the file is given first."""
+    return os.path.basename(file_path).rsplit(".", 1)[0]
+
+
+def get_song_name(file_path):
+    """
+    Returns a song name for a file that is not taken by an imported song or by a song being imported.
+
+    The name is the file name without its extension. A different file with a taken name gets a number, e.g. a
+    second "intro.mp3" from another folder becomes "intro (2)".
+
+    Args:
+        file_path (str): The path to the source audio file.
+
+    Returns:
+        str: The song name.
+    """
+    name = base_name = get_base_name(file_path)
+    number = 1
+    while name in get_library() or name in pending_songs:
+        number += 1
+        name = f"{base_name} ({number})"
+    return name
+
+
+class ImportFile:
+    """
+    One file of an import batch.
+
+    A file is identified by its fingerprint first. Only a file whose fingerprint matches an imported song or
+    another file of the batch is hashed as a whole, and it is converted if no match has the same full hash.
+
+    Args:
+        path (str): The absolute path to the file.
+        size (int): The size of the file in bytes.
+        mtime (float): The modification time of the file.
+        scan (tuple, optional): The folder, path and metadata of a file found by `scan_folder`, written to the
+            manifest of the folder once the file has been imported or has failed.
+    """
+
+    def __init__(self, path, size, mtime, scan=None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.scan = scan
+        self.imported = False  # The content of the file is in the library
+        self.copies = []  # Files of the batch skipped as copies of this one, written to their manifests with it
+        self.fingerprint = None
+        self.file_hash = None
+        self.song_name = None
+        self.state = "identifying"  # Then "comparing" or "converting", and "finished" at the end
+        self.hashing = False
+        self.failed = False
+        self.library_hashes = ()  # Full hashes of the imported songs with the same fingerprint
+        self.candidates = ()  # Earlier files of the batch with the same fingerprint
+
+    def get_cache_row(self):
+        return self.path, self.size, self.mtime, self.fingerprint, self.file_hash
+
+
+class ImportJob:
+    """
+    A batch of audio files that is imported on the process pool in the background.
+
+    Every file goes through up to three jobs on the pool: a fingerprint, a full hash if the fingerprint matches,
+    and the conversion to the storage format. The fingerprint and hash of a file are cached in the library by path,
+    size and modification time, so importing the same folder again reads none of the unchanged files. A file with
+    the same content as an imported song or another file of the batch is skipped, whatever its name.
+
+    The files handed to `submit` are looked up in the library on a preparation thread, `SUBMIT_CHUNK` files and
+    a few queries at a time, so a folder of tens of thousands of files never runs a query per file on the Tk thread.
+
+    Finished jobs are collected on the Tk thread by polling with `after()`, and the songs and cached hashes are
+    added to the library in one transaction per poll, so the library and the UI are only ever changed from the Tk
+    thread. The songs list is refreshed once, when the whole batch is finished.
+
+    A file found by a folder scan is written to the manifest of its folder once its song is in the library, once it
+    turned out to be a duplicate or once it failed, so the next scan only tries it again if it changed. A file that
+    was cancelled is left out, so it is found again by the next scan.
+    """
+
+    def __init__(self):
+        self.results = queue.Queue()
+        # (files, songs by fingerprint, scans of the skipped files) of every chunk the preparation thread looked up
+        self.prepared = queue.Queue()
+        self.preparing = 0  # Chunks handed to the preparation thread that have not been collected yet
+        self.futures = []
+        self.preparers = []  # The preparation threads
+        self.poll_id = None  # The `after` job of the next poll
+        self.total = 0
+        self.done = 0
+        self.converted = 0
+        self.cancelled = False
+        self.started = time.perf_counter()
+        self.by_fingerprint = {}  # Fingerprint -> files of the batch with it
+        self.comparing = []  # Files waiting for full hashes
+        self.fingerprinted = []  # Files whose fingerprint was computed since the last poll
+        self.cache_rows = []  # Hashes computed since the last poll
+        self.manifest_rows = {}  # Folder -> {path: scan metadata} of the scanned files finished since the last poll
+
+    def submit(self, file_paths, folder_path=None, scanned=None):
+        """
+        Adds files to the batch. They are looked up on the preparation thread and identified by `poll`.
+
+        Args:
+            file_paths (Iterable[str]): Paths to the audio files.
+            folder_path (str, optional): The folder the files were found in by `scan_folder`.
+            scanned (dict[str, tuple], optional): The metadata of the files from `folder_scan.scan`.
+        """
+        file_paths = list(file_paths)
+        self.preparing += -(-len(file_paths) // SUBMIT_CHUNK)
+        preparer = threading.Thread(target=self.__prepare, args=(get_library(), file_paths, folder_path, scanned),
+                                    daemon=True)
+        self.preparers.append(preparer)
+        preparer.start()
+
+    def cancel(self):
+        """Cancels every job that has not been started yet. Running conversions are allowed to finish."""
+        self.cancelled = True
+        for future in self.futures:
+            future.cancel()
+
+    def stop(self):
+        """
+        Cancels the batch and waits for its preparation threads and its running jobs, so nothing of it reads the
+        library or writes to the audio folder afterwards. Nothing of the batch is added to the library.
+        """
+        self.cancel()
+        if self.poll_id is not None:
+            frame.after_cancel(self.poll_id)
+        for preparer in self.preparers:
+            preparer.join()
+        wait(self.futures)
+        pending_songs.difference_update(future.file.song_name for future in self.futures if future.stage == "convert")
+
+    def is_finished(self):
+        return self.done == self.total and not self.preparing
+
+    def poll(self):
+        """
+        Collects finished jobs, starts the next job of their files, updates the progress and reschedules itself
+        until the batch is done.
+        """
+        library = get_library()
+        while True:
+            try:
+                files, library_songs, imported = self.prepared.get_nowait()
+            except queue.Empty:
+                break
+            self.preparing -= 1
+            for scan in imported:  # Imported before fingerprints were stored
+                self.__record(scan)
+            if self.cancelled:
+                continue
+            self.total += len(files)
+            for file in files:
+                if file.fingerprint is None:
+                    self.__run(fingerprints.fingerprint_file, file, "fingerprint", file.path)
+                else:
+                    self.__identify(file, library_songs.get(file.fingerprint, ()))
+
+        songs = []
+        converted = []
+        while True:
+            try:
+                future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.futures.remove(future)
+            song = self.__collect(future)
+            if future.stage == "convert":
+                converted.append(future.file.song_name)
+                if song is not None:
+                    songs.append(song)
+        if self.fingerprinted:
+            library_songs = library.find_by_fingerprints({file.fingerprint for file in self.fingerprinted})
+            for file in self.fingerprinted:
+                self.__identify(file, library_songs.get(file.fingerprint, ()))
+            self.fingerprinted = []
+        if songs:
+            library.add_songs(songs)
+        pending_songs.difference_update(converted)  # Only now, so their names are never given out twice
+        if self.cache_rows:
+            library.cache_file_hashes(self.cache_rows)
+            self.cache_rows = []
+        self.__compare()
+        for folder_path, files in self.manifest_rows.items():  # After their songs, so a crash cannot skip them
+            library.update_manifest(folder_path, files, ())
+        self.manifest_rows = {}
+
+        if not self.is_finished():
+            frame.show_import_progress(self.done, self.total)
+            self.poll_id = frame.after(POLL_INTERVAL, self.poll)
+            return
+
+        global import_job
+        import_job = None
+        metrics.record("import.batch", time.perf_counter() - self.started, self.total, files=self.total,
+                       converted=self.converted, cancelled=self.cancelled)
+        frame.hide_import_progress()
+        update_songs_list()
+
+    def __prepare(self, library, file_paths, folder_path, scanned):
+        """
+        Runs on the preparation thread: skips the songs imported before fingerprints were stored, reads the size
+        and modification time of the other files unless the scan found them, and looks up their cached hashes and
+        the songs with their fingerprints, with a few queries per `SUBMIT_CHUNK` files. Every chunk is handed over
+        to `poll`.
+        """
+        for start in range(0, len(file_paths), SUBMIT_CHUNK):
+            if self.cancelled:
+                self.prepared.put(([], {}, []))
+                continue
+            chunk = file_paths[start:start + SUBMIT_CHUNK]
+            # Songs imported before fingerprints were stored can only be recognised by their name
+            unfingerprinted = library.find_unfingerprinted(get_base_name(file_path) for file_path in chunk)
+            files = []
+            imported = []  # Scans of the files that are skipped
+            for file_path in chunk:
+                scan = (folder_path, file_path, scanned[file_path]) if scanned is not None else None
+                file_path = os.path.abspath(file_path)
+                if get_base_name(file_path) in unfingerprinted:
+                    print(f"Audio file {file_path} has already been imported")
+                    metrics.count("import.duplicates")
+                    if scan is not None:
+                        imported.append(scan)
+                    continue
+                if scan is not None:
+                    size, mtime = scan[2][:2]
+                else:
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError as error:
+                        print(f"Error occurred while processing {file_path}: {error}")
+                        continue
+                    size, mtime = stat.st_size, stat.st_mtime
+                files.append(ImportFile(file_path, size, mtime, scan))
+
+            cached = library.get_file_hashes((file.path, file.size, file.mtime) for file in files)
+            for file in files:
+                file.fingerprint, file.file_hash = cached.get(file.path, (None, None))
+            self.prepared.put((files, library.find_by_fingerprints(file.fingerprint for file in files
+                                                                   if file.fingerprint is not None), imported))
+
+    def __run(self, function, file, stage, *args):
+        future = get_executor().submit(function, *args)
+        future.file = file
+        future.stage = stage
+        future.submitted = time.perf_counter()
+        future.add_done_callback(self.results.put)  # Runs in the pool's thread, so only hand it over
+        self.futures.append(future)
+
+    def __collect(self, future):
+        """
+        Checks the result of one job and moves its file on to the next stage.
+
+        Args:
+            future (concurrent.futures.Future): The finished job.
+
+        Returns:
+            tuple | None: The library values of the song if the file was converted, otherwise None.
+        """
+        file = future.file
+        # A failed hash only ends the file if it was waiting for it, a converting file is finished by its conversion
+        ends_file = future.stage != "hash" or file.state == "comparing"
+        if future.cancelled():
+            if ends_file:
+                print(f"Import of {file.path} was cancelled")
+                self.__finish(file)
+            return None
+        error = future.exception()
+        if error is not None:
+            print(f"Error occurred while processing {file.path}: {error}")
+            file.failed = True
+            if ends_file:
+                self.__finish(file, failed=True)
+            return None
+
+        result = future.result()
+        # Measured from the submission, so the time spent waiting for a worker counts too
+        seconds = time.perf_counter() - future.submitted
+        if future.stage == "fingerprint":
+            metrics.add("import.fingerprint", seconds)
+            file.fingerprint = result
+            self.cache_rows.append(file.get_cache_row())
+            if self.cancelled:
+                self.__finish(file)
+            else:
+                self.fingerprinted.append(file)  # Looked up in the library together at the end of the poll
+            return None
+        if future.stage == "hash":
+            metrics.add("import.hash", seconds)
+            file.file_hash = result
+            self.cache_rows.append(file.get_cache_row())
+            return None
+        metrics.add("import.convert", seconds, result[2])  # The amount is the length of the song in seconds
+        self.converted += 1
+        file.file_hash = result[song_library.COLUMNS.index("source_hash")]
+        self.cache_rows.append(file.get_cache_row())
+        self.__finish(file, imported=True)
+        return result
+
+    def __identify(self, file, library_songs):
+        """
+        Converts a file right away if no imported song and no file of the batch has its fingerprint, or else
+        schedules the full hashes needed to tell whether it is a duplicate.
+
+        Args:
+            file (ImportFile): The file, with its fingerprint.
+            library_songs (Iterable[tuple[str, str]]): The names and source hashes of the imported songs with its
+                fingerprint.
+        """
+        batch_files = self.by_fingerprint.setdefault(file.fingerprint, [])
+        file.candidates = list(batch_files)
+        batch_files.append(file)
+        if not library_songs and not file.candidates:
+            self.__convert(file)
+            return
+
+        file.library_hashes = {file_hash for name, file_hash in library_songs}
+        file.state = "comparing"
+        self.comparing.append(file)
+        for other in file.candidates + [file]:
+            if other.file_hash is None and not other.hashing:
+                other.hashing = True
+                self.__run(fingerprints.hash_file, other, "hash", other.path)
+
+    def __compare(self):
+        """Skips or converts the files whose full hash and the full hashes of their candidates are known."""
+        for file in list(self.comparing):
+            if self.cancelled:
+                self.__finish(file)
+                continue
+            candidates = [other for other in file.candidates if not other.failed]
+            if file.file_hash is None or any(other.file_hash is None for other in candidates):
+                continue
+            self.comparing.remove(file)
+            original = next((other for other in candidates if other.file_hash == file.file_hash), None)
+            if file.file_hash in file.library_hashes or original is not None:
+                print(f"Audio file {file.path} has already been imported")
+                metrics.count("import.duplicates")
+                if file.file_hash in file.library_hashes or original.imported:
+                    self.__finish(file, imported=True)
+                else:  # Written to the manifest only if the original is imported
+                    original.copies.append(file)
+                    self.__finish(file)
+            else:
+                self.__convert(file)
+
+    def __convert(self, file):
+        file.state = "converting"
+        file.song_name = get_song_name(file.path)
+        pending_songs.add(file.song_name)
+        self.__run(convert_song, file, "convert", file.path, file.song_name, audio_folder, file.fingerprint,
+                   file.file_hash, get_storage_format())
+
+    def __record(self, scan):
+        if scan is not None:
+            folder_path, path, metadata = scan
+            self.manifest_rows.setdefault(folder_path, {})[path] = metadata
+
+    def __finish(self, file, imported=False, failed=False):
+        """
+        Counts a file as done. It and its copies are written to the manifests of their folders if its content is in
+        the library now, or if it failed, so it is not tried again until it changes.
+        """
+        if file.state == "finished":
+            return
+        file.imported = imported
+        if imported or failed:
+            for scanned_file in [file] + file.copies:
+                self.__record(scanned_file.scan)
+        if file in self.comparing:
+            self.comparing.remove(file)
+        file.state = "finished"
+        self.done += 1
+
+
+def import_songs(file_paths, folder_path=None, scanned=None):
+    """
+    Imports the given audio files in the background.
+
+    Files are recognised by their content, not by their name: a file with the same content as an imported song or
+    another file being imported is skipped, and a different file with a taken name is imported under a numbered
+    name. The files are added to the running import batch, or a new batch is started.
+
+    Args:
+        file_paths (Iterable[str]): Paths to the audio files that should be imported.
+        folder_path (str, optional): The folder `scan_folder` found the files in. Each file is written to its
+            manifest once it has been imported or has failed.
+        scanned (dict[str, tuple], optional): The metadata of the files from `folder_scan.scan`.
+    """
+    global import_job
+    file_paths = list(file_paths)
+    if not file_paths:
+        return
+
+    if import_job is None:
+        import_job = ImportJob()
+        import_job.submit(file_paths, folder_path, scanned)
+        import_job.poll_id = frame.after(POLL_INTERVAL, import_job.poll)
+    else:
+        import_job.submit(file_paths, folder_path, scanned)
+
+
+def cancel_import():
+    """
+    Cancels the songs of the running import batch that have not been converted yet. They are not written to the
+    manifests of their folders, so the next scan imports them.
+    """
+    if import_job is not None:
+        import_job.cancel()
 
 
 def move_files():
     """
     Move and convert selected audio files to WAV format.
 
-    This function opens a file dialog for the user to select audio files. For each selected file:
-    - If the file's name (without extension) is not already in the existing songs set, it creates a new directory
-      in the specified audio folder with the same name as the file (without extension).
+    This function opens a file dialog for the user to select audio files and hands them to `import_songs`, which
+    converts them on a process pool without blocking the UI. For each selected file:
+    - If the file's content is not already in the library, it creates a new directory in the specified audio
+      folder with the same name as the file (without extension), numbered if that name is taken.
     - Converts the audio file to WAV format and saves it in the new directory.
-    - Updates the list of existing songs by adding the name of the new file.
+    - Adds the song with its format, duration and the hash of its source file to the library.
     - Handles any exceptions that occur during file processing and logs an error message.
 
     Notes:
-        The function uses the `filedialog` module to select files and `AudioSegment` from `pydub` to process audio files.
+        The function uses the `filedialog` module to select files and `audio_conversion` to process audio files.
     """
     file_paths = filedialog.askopenfilenames(title="Open")
-    for file_path in file_paths:
-        file_name_without_extension = os.path.basename(file_path).rsplit(".", 1)[0]
-
-        if file_name_without_extension in existing_songs:
-            # TODO ...
-            print(f"Audio file {file_name_without_extension} has already been imported")
-            continue
-
-        new_folder = os.path.join(audio_folder, file_name_without_extension)  # Creating new folder for the song with similar name
-        os.makedirs(new_folder, exist_ok=True)
-        wav_path = os.path.join(new_folder, file_name_without_extension + ".wav")  # Path where the song will be posted
-
-        try:
-            audio = AudioSegment.from_file(file_path)  # Load the audio file
-            audio.export(wav_path, format="wav")  # Export the audio as WAV format
-            save_song(file_name_without_extension)  # Save the song name to the list
-            existing_songs.add(file_name_without_extension)  # Add the song to the set of existing songs
-        except Exception as e:
-            print(f"Error occurred while processing {file_path}: {e}")
-
-    update_songs_list()
+    import_songs(file_paths)
 
 
 def move_folder():
     """
     Move and convert all audio files in a selected folder to WAV format.
 
-    Opens a directory dialog for the user to select a folder. For each audio file found within the selected folder
-    and its subdirectories:
-    - If the file's name (without extension) is not already in the existing songs set, it creates a new directory
-      in the specified audio folder with the same name as the file (without extension).
+    Opens a directory dialog for the user to select a folder. The folder is scanned by `scan_folder`, and every
+    file within the folder and its subdirectories that was added or changed since the folder was last opened is
+    handed to `import_songs`, which converts it on a process pool:
+    - If the file's content is not already in the library, it creates a new directory in the specified audio
+      folder with the same name as the file (without extension), numbered if that name is taken.
     - Converts the audio file to WAV format and saves it in the new directory.
-    - Updates the list of existing songs by adding the name of the new file.
+    - Adds the song with its format, duration and the hash of its source file to the library.
     - Handles any exceptions that occur during file processing and logs an error message.
 
     Notes:
-        The function uses the `filedialog` module to select the folder and `AudioSegment` from `pydub` to process audio files.
+        The function uses the `filedialog` module to select the folder and `audio_conversion` to process audio files.
     """
     folder_path = filedialog.askdirectory(title="Select Folder")
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for filename in filenames:
-            file_name_without_extension = filename.rsplit(".", 1)[0]
+    if folder_path:
+        scan_folder(folder_path)
 
-            if file_name_without_extension in existing_songs:
-                print(f"Audio file {file_name_without_extension} has already been imported")
-                continue
 
-            new_folder = os.path.join(audio_folder, file_name_without_extension)  # Creating new folder for the song with similar name
-            os.makedirs(new_folder, exist_ok=True)
-            wav_path = os.path.join(new_folder, file_name_without_extension + ".wav")  # Path where the song will be posted
+def scan_folder(folder_path):
+    """
+    Scans a folder on a background thread and imports the files that were added or changed since its last scan.
 
-            try:
-                audio = AudioSegment.from_file(os.path.join(dirpath, filename))  # Load the audio file
-                audio.export(wav_path, format="wav")  # Export the audio as WAV format
-                save_song(file_name_without_extension)  # Save the song name to the list
-                existing_songs.add(file_name_without_extension)  # Add the song to the set of existing songs
-            except Exception as e:
-                print(f"Error occurred while processing {os.path.join(dirpath, filename)}: {e}")
+    The first scan of a folder imports every file. The scan itself is I/O bound, so it runs on a thread and does
+    not wait behind the conversions on the import pool.
+
+    Args:
+        folder_path (str): The folder to scan.
+    """
+    folder_path = os.path.normcase(os.path.abspath(folder_path))
+    if folder_path in scanning:
+        return
+    scanning.add(folder_path)
+    if len(scanning) == 1:
+        frame.after(POLL_INTERVAL, poll_scans)
+    threading.Thread(target=run_scan, args=(folder_path, scan_generation), daemon=True).start()
+
+
+def rescan_folders():
+    """Scans every folder that was imported before again."""
+    for folder_path in get_library().get_scanned_folders():
+        scan_folder(folder_path)
+
+
+def run_scan(folder_path, generation):
+    """Runs on the scan thread and hands the result of `folder_scan.scan` over to `poll_scans`."""
+    try:
+        scan_results.put((generation, folder_path, folder_scan.scan(folder_path), None))
+    except Exception as error:
+        scan_results.put((generation, folder_path, None, error))
 
-    update_songs_list()
+
+def poll_scans():
+    """
+    Compares finished scans with the manifests of their folders, imports the added and changed audio files and
+    reports the removed ones. Reschedules itself while folders are being scanned.
+
+    Files that are not audio files by their extension, e.g. cover images and playlists, are written to the
+    manifest right away, so they are not looked at again until they change.
+    """
+    library = get_library()
+    while True:
+        try:
+            generation, folder_path, files, error = scan_results.get_nowait()
+        except queue.Empty:
+            break
+        if generation != scan_generation:  # Started before `cancel_all`
+            continue
+        scanning.discard(folder_path)
+        if error is not None:
+            print(f"Error occurred while scanning {folder_path}: {error}")
+            continue
+
+        added, changed, removed = folder_scan.compare(library.get_manifest(folder_path), files)
+        for path in removed:
+            print(f"Audio file {path} was removed from {folder_path}")
+        print(f"Scanned {folder_path}: {len(files)} files, {len(added)} added, {len(changed)} changed, "
+              f"{len(removed)} removed")
+        audio_paths = [path for path in added + changed if folder_scan.is_audio_file(path)]
+        other_files = {path: files[path] for path in added + changed if not folder_scan.is_audio_file(path)}
+        library.update_manifest(folder_path, other_files, removed)  # The audio files once they have been imported
+        import_songs(audio_paths, folder_path, files)
+
+    if scanning:
+        frame.after(POLL_INTERVAL, poll_scans)
+
+
+def cancel_all():
+    """
+    Stops the running import batch and drops the results of the running folder scans. Waits for the conversions
+    that are running, so nothing is written to the library or the audio folder afterwards.
+    """
+    global import_job, scan_generation
+    scan_generation += 1
+    scanning.clear()
+    if import_job is not None:
+        import_job.stop()
+        import_job = None
+        frame.hide_import_progress()
 
 
 def delete_all_songs():
-    """Delete all songs and clear the song list file."""
-    open(song_list_path, 'w').close()  # Clear the song list file
-    existing_songs.clear()  # Clear set of songs
-    update_songs_list()  # Update treeview
+    """
+    Delete all songs and the library. The player must have closed its songs, see `music_controls.Player.unload`.
+    """
+    global library
+    stem_separation.cancel_all()  # The songs waiting for separation are deleted too
+    cancel_all()  # The songs being imported too
+    settings = get_library().get_settings()
+    get_library().close()  # The database lives in the audio folder and is deleted with it
+    library = None
     if os.path.exists(audio_folder):
         shutil.rmtree(audio_folder)  # Delete the folder with all songs
+    album_art.thumbnail_cache.clear()
+    for key, value in settings.items():  # The settings are kept
+        get_library().set_setting(key, value)
+    update_songs_list()  # Update treeview
 
 
 def update_songs_list():
@@ -167,6 +706,15 @@ def update_songs_list():
     frame.songs_list.update_songs_list()  # Update the Treeview
 
 
-song_list_path = "../Audio/song_list.txt"
+song_list_path = "../Audio/song_list.txt"  # Songs of versions before the library, moved into it on first start
 audio_folder = os.path.join("..", "Audio")
-existing_songs = load_existing_songs()
+database_path = os.path.join(audio_folder, "library.db")
+library = None
+pending_songs = set()  # Names of the songs that are being converted right now
+executor = None
+import_job = None
+scanning = set()  # Folders that are being scanned right now
+scan_generation = 0  # Incremented by `cancel_all`, so the scans started before are dropped
+scan_results = queue.Queue()
+POLL_INTERVAL = 100  # Milliseconds between checks for finished conversions
+SUBMIT_CHUNK = 500  # Files the preparation thread of an import looks up in the library at a time
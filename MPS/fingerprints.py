@@ -0,0 +1,51 @@
+import os
+import hashlib
+
+SAMPLE_SIZE = 64 * 1024  # Bytes read at every sampled offset of a fingerprint
+SAMPLES = 5  # Header, three evenly spaced chunks and the end of the file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def fingerprint_file(path):
+    """
+    Computes a fast fingerprint of a file from its size, its header and a few evenly spaced chunks.
+
+    Only `SAMPLES * SAMPLE_SIZE` bytes are read, whatever the size of the file. Different fingerprints mean
+    different files, but equal fingerprints have to be confirmed with `hash_file`.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        str: The hex digest of the fingerprint.
+    """
+    size = os.path.getsize(path)
+    fingerprint = hashlib.sha1(size.to_bytes(8, "little"))
+    with open(path, "rb") as file:
+        if size <= SAMPLES * SAMPLE_SIZE:
+            fingerprint.update(file.read())
+        else:
+            for index in range(SAMPLES):
+                file.seek((size - SAMPLE_SIZE) * index // (SAMPLES - 1))
+                fingerprint.update(file.read(SAMPLE_SIZE))
+    return fingerprint.hexdigest()
+
+
+def hash_file(path):
+    """
+    Computes the SHA-1 of the whole file.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    file_hash = hashlib.sha1()
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            file_hash.update(block)
+    return file_hash.hexdigest()
@@ -0,0 +1,150 @@
+import wave
+import struct
+import builtins
+import subprocess
+
+import audio_conversion
+
+HISTORY_LIMIT = 4 * 1024 * 1024  # Bytes of decoded audio kept after a restart of the decoder, so going back is free
+
+
+class FlacReader:
+    """
+    A FLAC reader that decodes the song with ffmpeg while it is being played.
+
+    The format and the exact length of the song are read from the STREAMINFO block, so opening a song does not
+    start a process. ffmpeg is started at the first `readframes` and writes raw PCM to a pipe, which is read by the
+    feeder thread of the audio engine. Seeking restarts ffmpeg at the new position. The first `HISTORY_LIMIT`
+    bytes after every start are kept, so going back to the start after prefetching, like the engine does for the
+    queued song, does not restart the decoder. The interface matches `wave.Wave_read`.
+
+    Args:
+        path (str): The path to the FLAC file.
+
+    Raises:
+        wave.Error: If the file is not a FLAC file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with builtins.open(path, "rb") as file:
+            header = file.read(42)
+        if len(header) < 42 or header[:4] != b"fLaC" or header[4] & 0x7F != 0:
+            raise wave.Error(f"{path} is not a valid FLAC file")
+
+        # STREAMINFO: 20 bits sample rate, 3 bits channels - 1, 5 bits bits per sample - 1, 36 bits total samples
+        fields = int.from_bytes(header[18:26], "big")
+        self.framerate = fields >> 44
+        self.nchannels = (fields >> 41 & 0x7) + 1
+        bits = (fields >> 36 & 0x1F) + 1
+        self.nframes = fields & 0xFFFFFFFFF
+        self.sampwidth = (bits + 7) // 8
+        self.frame_size = self.nchannels * self.sampwidth
+        if self.framerate == 0 or self.sampwidth not in audio_conversion.PCM_FORMATS:
+            raise wave.Error(f"{path} has an unsupported format")
+
+        self.position = 0
+        self.process = None
+        self.start = 0  # The frame the decoder was started at
+        self.read_size = 0  # Bytes read from the decoder since it was started
+        self.history = bytearray()  # The first bytes read from the decoder, None once `HISTORY_LIMIT` is exceeded
+
+    def getnchannels(self):
+        return self.nchannels
+
+    def getsampwidth(self):
+        return self.sampwidth
+
+    def getframerate(self):
+        return self.framerate
+
+    def getnstems(self):
+        return 1
+
+    def getnframes(self):
+        return self.nframes
+
+    def tell(self):
+        return self.position
+
+    def setpos(self, pos):
+        if not 0 <= pos <= self.nframes:
+            raise wave.Error("position not in range")
+        offset = (pos - self.start) * self.frame_size
+        if self.process is not None and 0 <= offset <= self.read_size and (
+                offset == self.read_size or self.history is not None):
+            self.position = pos  # Still reachable through the running decoder
+            return
+        self.__stop()
+        self.position = pos
+
+    def rewind(self):
+        self.setpos(0)
+
+    def readframes(self, nframes):
+        """
+        Returns the next `nframes` frames, waiting for the decoder if it has not decoded them yet.
+
+        Args:
+            nframes (int): The number of frames to read.
+
+        Returns:
+            bytes: The PCM data, shorter than requested at the end of the song.
+        """
+        size = max(min(nframes, self.nframes - self.position), 0) * self.frame_size
+        if size == 0:
+            return b""
+        if self.process is None:
+            self.__start()
+
+        offset = (self.position - self.start) * self.frame_size
+        data = bytearray()
+        if offset < self.read_size:
+            data += self.history[offset:offset + size]
+        while len(data) < size:
+            block = self.process.stdout.read(size - len(data))
+            if not block:
+                break
+            data += block
+            self.read_size += len(block)
+            if self.history is not None:
+                if len(self.history) + len(block) <= HISTORY_LIMIT:
+                    self.history += block
+                else:
+                    self.history = None
+        del data[len(data) - len(data) % self.frame_size:]
+        self.position += len(data) // self.frame_size
+        return bytes(data)
+
+    def __start(self):
+        command = [audio_conversion.FFMPEG_PATH, "-v", "error"]
+        if self.position > 0:
+            command += ["-ss", f"{self.position / self.framerate:.6f}"]
+        command += ["-i", self.path, "-f", audio_conversion.PCM_FORMATS[self.sampwidth], "-"]
+        self.process = subprocess.Popen(command,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        creationflags=audio_conversion.CREATION_FLAGS)
+        self.start = self.position
+        self.read_size = 0
+        self.history = bytearray()
+
+    def __stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+    def close(self):
+        self.__stop()
+
+
+def open(path):
+    """
+    Opens a FLAC file for reading, like `wave.open(path, "rb")`.
+
+    Returns:
+        FlacReader: The opened song.
+    """
+    return FlacReader(path)
@@ -0,0 +1,262 @@
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import pcm
+
+RESAMPLER_TAPS = 32  # Input frames each output frame is computed from when the rate goes up, more when it goes down
+RESAMPLER_ROLLOFF = 0.95  # Cutoff of the anti-aliasing filter, relative to the Nyquist frequency of the lower rate
+RESAMPLER_BETA = 8.0  # Kaiser window parameter, about 80 dB of stopband attenuation
+MAX_PHASES = 1024  # Filter phases of the resampler, rates with a larger ratio use the phase just before the position
+SURROUND_DOWNMIX = 0.7071  # Gain of the center and surround channels of 5.1 when mixed to stereo
+
+
+def get_filter_bank(input_rate, output_rate):
+    """
+    Returns the polyphase filter of the resampler between two rates, designed once per pair of rates.
+
+    Output frame `n` lies at input position `n * down / up`. The output is the sum of the input frames around that
+    position weighted with a Kaiser-windowed sinc, and the weights depend only on the fractional part of the
+    position, so there are `up` different sets of weights, the phases.
+
+    Args:
+        input_rate (int): The rate of the song in Hz.
+        output_rate (int): The rate of the output in Hz.
+
+    Returns:
+        tuple: `up` and `down`, the ratio of the rates in lowest terms, the number of phases, `half` - the taps on
+            each side of the position, and the float32 weights with one row of `2 * half` taps per phase.
+    """
+    key = (input_rate, output_rate)
+    bank = filter_banks.get(key)
+    if bank is None:
+        divisor = math.gcd(input_rate, output_rate)
+        up, down = output_rate // divisor, input_rate // divisor
+        phases = min(up, MAX_PHASES)
+        cutoff = min(1.0, up / down) * RESAMPLER_ROLLOFF  # In units of the Nyquist frequency of the input
+        half = math.ceil(RESAMPLER_TAPS / 2 / min(1.0, up / down))  # Longer when lowering the rate
+
+        # Distance of each tap from the output position, for every phase
+        distances = (np.arange(2 * half) - half + 1)[None, :] - (np.arange(phases) / phases)[:, None]
+        window = np.i0(RESAMPLER_BETA * np.sqrt(np.clip(1 - (distances / half) ** 2, 0, 1))) / np.i0(RESAMPLER_BETA)
+        weights = cutoff * np.sinc(cutoff * distances) * window
+        weights /= weights.sum(axis=1, keepdims=True)  # Unity gain at 0 Hz for every phase
+        bank = filter_banks[key] = (up, down, phases, half, weights.astype(np.float32))
+    return bank
+
+
+def get_channel_matrix(input_channels, output_channels):
+    """
+    Returns the matrix that maps the channels of a song to the channels of the output.
+
+    Mono is copied to every output channel, and every channel is averaged to mono. 5.1 in the channel order of
+    ffmpeg is mixed down to stereo with the center and surround channels at -3 dB and without the LFE channel.
+    Other layouts keep their first channels.
+
+    Args:
+        input_channels (int): The channels of the song.
+        output_channels (int): The channels of the output.
+
+    Returns:
+        numpy.ndarray | None: The float32 matrix of shape (input, output), None if the channels are the same.
+    """
+    if input_channels == output_channels:
+        return None
+    if input_channels == 1:
+        matrix = np.ones((1, output_channels))
+    elif output_channels == 1:
+        matrix = np.full((input_channels, 1), 1 / input_channels)
+    elif input_channels == 6 and output_channels == 2:
+        front_left, front_right, center, _, back_left, back_right = np.eye(6)
+        matrix = np.stack((front_left + SURROUND_DOWNMIX * (center + back_left),
+                           front_right + SURROUND_DOWNMIX * (center + back_right)), axis=1)
+        matrix /= 1 + 2 * SURROUND_DOWNMIX  # Full-scale channels in phase do not clip
+    else:
+        matrix = np.eye(input_channels, output_channels)
+    return matrix.astype(np.float32)
+
+
+class Resampler:
+    """
+    A streaming polyphase resampler, see `get_filter_bank`.
+
+    Blocks of any size can be passed to `process`, the output is the same as if the whole song had been resampled
+    at once. Every output frame of a block is computed at once by gathering the input frames around its position
+    and weighting them with the taps of its phase, so the work is a few array operations per block. The input is
+    buffered one channel per row, so the frames around a position are a contiguous window of each row.
+
+    Args:
+        input_rate (int): The rate of the input in Hz.
+        output_rate (int): The rate of the output in Hz.
+        samples_per_frame (int): The samples of one frame, e.g. the channels.
+    """
+
+    def __init__(self, input_rate, output_rate, samples_per_frame):
+        self.up, self.down, self.phases, self.half, self.weights = get_filter_bank(input_rate, output_rate)
+        self.samples_per_frame = samples_per_frame
+        self.reset()
+
+    def reset(self):
+        """Starts a new stream, e.g. after a seek. The frames before its start are silence."""
+        self.buffer = np.zeros((self.samples_per_frame, self.half - 1), dtype=np.float32)
+        self.start = 1 - self.half  # The input position of the first buffered frame
+        self.received = 0  # Input frames of the stream
+        self.produced = 0  # Output frames of the stream
+
+    def process(self, samples):
+        """
+        Resamples the next block.
+
+        Args:
+            samples (numpy.ndarray): The float samples, one row per frame.
+
+        Returns:
+            numpy.ndarray: The output frames that can be computed from the input so far. The last `half` input
+                frames are kept until the input that follows them arrives, or until `flush`.
+        """
+        self.buffer = np.concatenate((self.buffer, samples.T), axis=1)
+        self.received += len(samples)
+        # An output frame needs the `half` input frames after its position
+        end = self.start + self.buffer.shape[1] - self.half
+        return self.__produce(-(-end * self.up // self.down) if end > 0 else 0)
+
+    def flush(self):
+        """
+        Returns the output frames of the last input frames, with silence after the end of the input.
+        """
+        self.buffer = np.concatenate((self.buffer, np.zeros((self.samples_per_frame, self.half), dtype=np.float32)),
+                                     axis=1)
+        return self.__produce(-(-self.received * self.up // self.down))
+
+    def __produce(self, stop):
+        if stop <= self.produced:
+            return np.empty((0, self.samples_per_frame), dtype=np.float32)
+        numerators = np.arange(self.produced, stop, dtype=np.int64) * self.down
+        positions = numerators // self.up
+        phases = (numerators % self.up) * self.phases // self.up
+        windows = sliding_window_view(self.buffer, 2 * self.half, axis=1)[:, positions - self.start - self.half + 1]
+        output = np.einsum("nt,cnt->nc", self.weights[phases], windows)
+        self.produced = stop
+
+        # Drop the frames no later output frame reaches
+        first_needed = self.produced * self.down // self.up - self.half + 1
+        if first_needed > self.start:
+            self.buffer = self.buffer[:, first_needed - self.start:]
+            self.start = first_needed
+        return output
+
+
+class ConvertedSong:
+    """
+    A song read in another format: another sample width, other channels and another rate.
+
+    It has the interface of the song it converts, with every frame count and position in output frames, so the
+    audio engine plays it like a song stored in the output format. Songs made of stems are converted stem by stem
+    and stay interleaved, so they can still be mixed in the audio callback.
+
+    Args:
+        source (wav_reader.MappedWave | flac_reader.FlacReader | stem_mixer.StemSong): The opened song.
+        sample_width (int): The sample width of the output in bytes.
+        channels (int): The channels of the output.
+        rate (int): The rate of the output in Hz.
+    """
+
+    def __init__(self, source, sample_width, channels, rate):
+        self.source = source
+        self.sample_width = sample_width
+        self.channels = channels
+        self.rate = rate
+        self.stems = source.getnstems()
+        self.source_rate = source.getframerate()
+        self.matrix = get_channel_matrix(source.getnchannels(), channels)
+        self.resampler = Resampler(self.source_rate, rate, self.stems * channels) if self.source_rate != rate else None
+        self.nframes = -(-source.getnframes() * rate // self.source_rate)
+        self.position = 0
+        self.pending = np.empty((0, self.stems * channels), dtype=np.float32)  # Converted frames not read yet
+        self.finished = False  # The end of the song has been converted
+
+    def getnchannels(self):
+        return self.channels
+
+    def getsampwidth(self):
+        return self.sample_width
+
+    def getframerate(self):
+        return self.rate
+
+    def getnstems(self):
+        return self.stems
+
+    def getnframes(self):
+        return self.nframes
+
+    def tell(self):
+        return self.position
+
+    def setpos(self, pos):
+        """
+        Moves to an output frame. The song is read from the input frame at or before it.
+        """
+        self.source.setpos(min(pos * self.source_rate // self.rate, self.source.getnframes()))
+        self.position = pos
+        self.pending = self.pending[:0]
+        self.finished = False
+        if self.resampler is not None:
+            self.resampler.reset()
+
+    def rewind(self):
+        self.setpos(0)
+
+    def readframes(self, nframes):
+        """
+        Returns the next `nframes` converted frames.
+
+        Args:
+            nframes (int): The number of frames to read.
+
+        Returns:
+            bytes: The PCM data in the output format, shorter than requested at the end of the song.
+        """
+        while len(self.pending) < nframes and not self.finished:
+            missing = -(-(nframes - len(self.pending)) * self.source_rate // self.rate)
+            self.pending = np.concatenate((self.pending, self.__convert(self.source.readframes(missing))))
+        frames, self.pending = self.pending[:nframes], self.pending[nframes:]
+        self.position += len(frames)
+        return pcm.from_float(frames, self.sample_width)
+
+    def close(self):
+        self.source.close()
+
+    def __convert(self, data):
+        sample_width, channels = self.source.getsampwidth(), self.source.getnchannels()
+        samples = pcm.to_float(data, sample_width).reshape(-1, self.stems, channels)
+        if self.matrix is not None:
+            samples = samples @ self.matrix
+        samples = samples.reshape(-1, self.stems * self.channels)
+        if len(samples) == 0:
+            self.finished = True
+            return self.resampler.flush() if self.resampler is not None else samples
+        return self.resampler.process(samples) if self.resampler is not None else samples
+
+
+def to_format(source, sample_width, channels, rate):
+    """
+    Returns a song in the output format: the song itself if it is stored in that format, or else a
+    `ConvertedSong` that converts it while it is read.
+
+    Args:
+        source (wav_reader.MappedWave | flac_reader.FlacReader | stem_mixer.StemSong): The opened song.
+        sample_width (int): The sample width of the output in bytes.
+        channels (int): The channels of the output.
+        rate (int): The rate of the output in Hz.
+
+    Returns:
+        wav_reader.MappedWave | flac_reader.FlacReader | stem_mixer.StemSong | ConvertedSong: The song.
+    """
+    if (source.getsampwidth(), source.getnchannels(), source.getframerate()) == (sample_width, channels, rate):
+        return source
+    return ConvertedSong(source, sample_width, channels, rate)
+
+
+filter_banks = {}  # (input rate, output rate) -> filter bank, see `get_filter_bank`
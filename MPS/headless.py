@@ -0,0 +1,262 @@
+"""
+Runs the import, library and playback paths of MPS without a window.
+
+`file_operations` reports to the right frame of the window and schedules its polling with `after`. `HeadlessFrame`
+takes the place of that frame: it runs the scheduled callbacks in its own loop, so the same code paths the window
+uses can run from scripts and benchmarks. Paths are relative to the working directory like in the app, so songs
+are stored in `../Audio`.
+
+Usage:
+    python headless.py import <audio file> [<audio file> ...]
+    python headless.py folder <folder>
+    python headless.py refresh
+    python headless.py render <song name> [--output <file.wav>]
+"""
+import os
+import time
+import wave
+import heapq
+import argparse
+import threading
+
+import dsp
+import file_operations
+import music_controls
+import metrics
+import song_library
+import stem_mixer
+from audio_engine import AudioEngine, CaptureOutput
+
+
+class HeadlessSongsList:
+    """
+    The songs list of the window without the tree view: the names and lengths of the songs in the library, read
+    incrementally by `song_library.update_song_list` like in `Form.RightFrame.CreatingTreeview.update_songs_list`.
+    """
+
+    def __init__(self):
+        self.songs_list = []
+        self.durations = {}
+        self.last_song_id = 0
+
+    def update_songs_list(self):
+        """
+        Appends the songs imported since the last update, or reloads the list if songs were removed.
+
+        Returns:
+            int: The number of songs in the list.
+        """
+        with metrics.span("songs_list.refresh", headless=True) as refresh:
+            self.last_song_id, _, _ = song_library.update_song_list(file_operations.get_library(), self.songs_list,
+                                                                    self.durations, self.last_song_id)
+            refresh["songs"] = len(self.songs_list)
+        return len(self.songs_list)
+
+
+class HeadlessFrame:
+    """
+    Stands in for the right frame of the window in `file_operations`.
+
+    `after` queues a callback instead of handing it to Tk, and `run` calls the queued callbacks when they are due
+    until none is left, i.e. until every import and scan has finished.
+    """
+
+    def __init__(self):
+        self.songs_list = HeadlessSongsList()
+        self.scheduled = []  # Heap of (due time, order, callback, arguments)
+        self.order = 0
+        self.progress = (0, 0)  # Files done and files of the running import batch
+
+    def after(self, ms, callback, *args):
+        self.order += 1
+        heapq.heappush(self.scheduled, (time.monotonic() + ms / 1000, self.order, callback, args))
+        return self.order
+
+    def after_cancel(self, job_id):
+        self.scheduled = [entry for entry in self.scheduled if entry[1] != job_id]
+        heapq.heapify(self.scheduled)
+
+    def show_import_progress(self, done, total):
+        self.progress = (done, total)
+
+    def hide_import_progress(self):
+        pass
+
+    def run(self):
+        """Calls the scheduled callbacks, waiting for each until it is due, until none is left."""
+        while self.scheduled:
+            due, _, callback, args = heapq.heappop(self.scheduled)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            callback(*args)
+
+
+def get_frame():
+    """
+    Returns the headless frame, installing it in `file_operations` on first use.
+
+    Returns:
+        HeadlessFrame: The frame.
+    """
+    global frame
+    if frame is None:
+        frame = HeadlessFrame()
+        file_operations.get_right_frame(frame)
+    return frame
+
+
+def import_files(file_paths):
+    """
+    Imports audio files like "Open Files" and waits until the batch is finished.
+
+    Args:
+        file_paths (Iterable[str]): Paths to the audio files.
+
+    Returns:
+        int: The number of songs in the library afterwards.
+    """
+    headless_frame = get_frame()
+    file_operations.import_songs(file_paths)
+    headless_frame.run()
+    return len(file_operations.get_library())
+
+
+def import_folder(folder_path):
+    """
+    Imports the new and changed files of a folder like "Open Folder" and waits until the import is finished.
+
+    Args:
+        folder_path (str): The folder to scan.
+
+    Returns:
+        int: The number of songs in the library afterwards.
+    """
+    headless_frame = get_frame()
+    file_operations.scan_folder(folder_path)
+    headless_frame.run()
+    return len(file_operations.get_library())
+
+
+def refresh_library():
+    """
+    Refreshes the songs list from the library, like the window does after an import.
+
+    Returns:
+        int: The number of songs in the list.
+    """
+    return get_frame().songs_list.update_songs_list()
+
+
+class WaveSink:
+    """
+    A sink of `CaptureOutput` that writes the captured audio to a WAV file.
+
+    Args:
+        wav_file (wave.Wave_write): The opened file, with the format of the song set.
+    """
+
+    def __init__(self, wav_file):
+        self.wav_file = wav_file
+
+    def write(self, data):
+        self.wav_file.writeframesraw(data)
+
+
+def render(song_name, output_path=None):
+    """
+    Plays a song of the library through the audio engine as fast as possible, to a WAV file or to nowhere.
+
+    The song is played like in the app, from its stems if it has been separated, through a `dsp.DspChain` with the
+    volume and equalizer preset of the settings and with loudness normalization if it is enabled, so the time and
+    CPU time it takes measure the playback path of the `Player` without a sound device.
+
+    Args:
+        song_name (str): The song name.
+        output_path (str, optional): The WAV file the audio is written to. If omitted, the audio is discarded. The
+            last period is padded with silence, like on a sound device.
+
+    Returns:
+        dict: `frames` - the number of frames played, `seconds` - the length of the song, `wall_seconds` and
+            `cpu_seconds` - the time and the CPU time of this process the playback took.
+    """
+    source = music_controls.open_song(song_name)
+    sample_width, channels, rate, _ = AudioEngine.get_format(source)
+    if output_path is not None:
+        wav_file = wave.open(output_path, "wb")
+        wav_file.setsampwidth(sample_width)
+        wav_file.setnchannels(channels)
+        wav_file.setframerate(rate)
+        sink = WaveSink(wav_file)
+    else:
+        wav_file = None
+        sink = open(os.devnull, "wb")
+
+    library = file_operations.get_library()
+    dsp_chain = dsp.DspChain()
+    dsp_chain.volume.set_gain((float(library.get_setting("volume", 100)) / 100) ** 2)
+    dsp_chain.equalizer.set_bands(dsp.EQ_PRESETS[library.get_setting("equalizer", "Flat")])
+    finished = threading.Event()
+    engine = AudioEngine(CaptureOutput(sink),
+                         frames_per_buffer=music_controls.FRAMES_PER_BUFFER,
+                         buffer_periods=music_controls.BUFFER_PERIODS,
+                         on_finished=finished.set,
+                         mixer=stem_mixer.StemMixer(),
+                         dsp_chain=dsp_chain)
+    engine.normalize = library.get_setting("normalize", "1") == "1"
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        engine.load(source, music_controls.get_song_gain(song_name))
+        engine.play()
+        finished.wait()
+        engine.stop()
+    finally:
+        source.close()
+        if wav_file is not None:
+            wav_file.close()  # Writes the length into the header
+        else:
+            sink.close()
+    frames = source.getnframes()
+    return {
+        "frames": frames,
+        "seconds": frames / rate,
+        "wall_seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - cpu_start
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MPS without a window")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import audio files")
+    import_parser.add_argument("files", nargs="+")
+
+    folder_parser = commands.add_parser("folder", help="Import the new and changed files of a folder")
+    folder_parser.add_argument("folder")
+
+    commands.add_parser("refresh", help="Load the songs list from the library")
+
+    render_parser = commands.add_parser("render", help="Play a song to a WAV file or to nowhere")
+    render_parser.add_argument("song")
+    render_parser.add_argument("--output")
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+    if args.command == "import":
+        print(f"{import_files(args.files)} songs in the library")
+    elif args.command == "folder":
+        print(f"{import_folder(args.folder)} songs in the library")
+    elif args.command == "refresh":
+        print(f"{refresh_library()} songs in the list")
+    elif args.command == "render":
+        result = render(args.song, args.output)
+        print(f"{result['seconds']:.1f} s of audio rendered, {result['cpu_seconds']:.2f} s CPU")
+    print(f"{args.command}: {time.perf_counter() - start:.2f} s")
+    metrics.metrics.close()
+
+
+frame = None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import numpy as np
+
+import dsp
+import pcm
+
+SEGMENT_SECONDS = 0.1  # Hop between two gating blocks
+SEGMENTS_PER_BLOCK = 4  # Gating blocks of 400 ms overlapping by 75%
+ABSOLUTE_GATE = -70.0  # LUFS, blocks below it are silence
+RELATIVE_GATE = -10.0  # LU below the loudness of the blocks above the absolute gate
+TARGET_LOUDNESS = -18.0  # LUFS every song is normalized to, the reference level of ReplayGain 2.0
+SURROUND_WEIGHTS = (1.0, 1.0, 1.0, 0.0, 1.41, 1.41)  # 5.1 in the order of ffmpeg, the LFE channel is not counted
+
+
+def get_k_weighting(size, rate):
+    """
+    Returns the power response of the K-weighting filter of ITU-R BS.1770 on the grid of a real FFT: a high shelf
+    of +4 dB above 1.5 kHz, the effect of the head, and a high pass at 38 Hz.
+
+    Args:
+        size (int): The FFT size.
+        rate (int): The sample rate in Hz.
+
+    Returns:
+        numpy.ndarray: The squared magnitude for each of the `size // 2 + 1` frequencies.
+    """
+    z = np.exp(-1j * np.linspace(0, np.pi, size // 2 + 1))
+    response = np.ones(len(z))
+    for kind, frequency, gain, q in (("high_shelf", 1500, 4.0, dsp.SHELF_Q), ("high_pass", 38, 0.0, 0.5)):
+        b, d = dsp.get_band_coefficients(kind, frequency, gain, q, rate)
+        response *= np.abs((b[0] + b[1] * z + b[2] * z ** 2) / (d[0] + d[1] * z + d[2] * z ** 2)) ** 2
+    return response
+
+
+class LoudnessMeter:
+    """
+    Measures the integrated loudness of a song in LUFS following EBU R128 and ITU-R BS.1770, block by block while
+    the song is decoded.
+
+    The audio is cut into segments of 100 ms, and the K-weighted power of every segment is computed from its
+    spectrum: by Parseval's theorem the power of the filtered segment is the power spectrum weighted with the
+    response of the filter, so no filter has to run sample by sample. Four segments make one 400 ms gating block,
+    and the blocks are gated as in the standard when the loudness is read.
+
+    Args:
+        sample_width (int): The sample width in bytes.
+        channels (int): The number of channels.
+        rate (int): The sample rate in Hz.
+    """
+
+    def __init__(self, sample_width, channels, rate):
+        self.sample_width = sample_width
+        self.channels = channels
+        self.frame_size = sample_width * channels
+        self.segment_frames = max(round(rate * SEGMENT_SECONDS), 1)
+
+        # The power of a segment from its real spectrum: every bin but 0 and the Nyquist frequency stands for two
+        # bins of the full spectrum, and the sum is divided by the size squared
+        bins = np.full(self.segment_frames // 2 + 1, 2.0)
+        bins[0] = 1.0
+        if self.segment_frames % 2 == 0:
+            bins[-1] = 1.0
+        self.weighting = (get_k_weighting(self.segment_frames, rate) * bins / self.segment_frames ** 2)[:, None]
+        self.channel_weights = np.array(SURROUND_WEIGHTS if channels == 6 else (1.0,) * channels)
+        self.pending = np.empty((0, channels), dtype=np.float32)  # Frames of the unfinished segment
+        self.powers = []  # Weighted mean square of every segment, summed over the channels
+        self.peak = 0.0
+
+    def add(self, data):
+        """
+        Adds the next block of interleaved PCM data.
+
+        Args:
+            data (bytes | memoryview): The PCM data. A trailing partial frame is ignored.
+        """
+        data = data[:len(data) - len(data) % self.frame_size]
+        samples = pcm.to_float(data, self.sample_width).reshape(-1, self.channels)
+        if len(samples):
+            self.peak = max(self.peak, float(np.abs(samples).max()))
+        if len(self.pending):
+            samples = np.concatenate((self.pending, samples))
+        full = len(samples) - len(samples) % self.segment_frames
+        if full:
+            segments = samples[:full].reshape(-1, self.segment_frames, self.channels)
+            spectra = np.fft.rfft(segments, axis=1)
+            mean_square = (np.abs(spectra) ** 2 * self.weighting).sum(axis=1)  # Per segment and channel
+            self.powers.extend((mean_square * self.channel_weights).sum(axis=1))
+        self.pending = samples[full:].copy()
+
+    def get_loudness(self):
+        """
+        Returns the integrated loudness of everything added so far.
+
+        Returns:
+            float | None: The loudness in LUFS, or None if the song is silent.
+        """
+        powers = np.array(self.powers)
+        if len(powers) == 0:
+            return None
+        if len(powers) >= SEGMENTS_PER_BLOCK:
+            blocks = np.convolve(powers, np.ones(SEGMENTS_PER_BLOCK) / SEGMENTS_PER_BLOCK, mode="valid")
+        else:  # A song shorter than one gating block is measured as one block
+            blocks = np.array([powers.mean()])
+        with np.errstate(divide="ignore"):
+            loudness = -0.691 + 10 * np.log10(blocks)
+        blocks = blocks[loudness > ABSOLUTE_GATE]
+        if len(blocks) == 0:
+            return None
+        relative_gate = -0.691 + 10 * np.log10(blocks.mean()) + RELATIVE_GATE
+        with np.errstate(divide="ignore"):
+            blocks = blocks[-0.691 + 10 * np.log10(blocks) > relative_gate]
+        return float(-0.691 + 10 * np.log10(blocks.mean()))
+
+
+def get_gain(loudness, peak):
+    """
+    Returns the gain that brings a song to `TARGET_LOUDNESS`, lowered where needed so its peak does not clip.
+
+    Args:
+        loudness (float | None): The integrated loudness of the song in LUFS, None if it is unknown.
+        peak (float | None): The largest sample of the song, 1.0 is full scale.
+
+    Returns:
+        float: The linear gain, 1.0 for songs without a measured loudness.
+    """
+    if loudness is None:
+        return 1.0
+    gain = 10 ** ((TARGET_LOUDNESS - loudness) / 20)
+    if peak:
+        gain = min(gain, 1.0 / peak)
+    return gain
@@ -0,0 +1,332 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+LOG_FOLDER = os.path.join("..", "Logs")
+LOG_PATH = os.path.join(LOG_FOLDER, "metrics.jsonl")
+LOG_LIMIT = 5 * 1024 * 1024  # Bytes after which the log is moved to `metrics.jsonl.1` at the next start
+SUMMARY_INTERVAL = 60.0  # Seconds between the summaries of all timings and counters in the log
+WATCHDOG_INTERVAL = 100  # Milliseconds between the checks of the UI thread
+UI_STALL_THRESHOLD = 0.05  # Seconds the UI thread has to be late before the delay is logged as a stall
+SAMPLE_INTERVAL = 0.005  # Seconds between two samples of the sampling profiler
+PROFILE_VARIABLE = "MPS_PROFILE"  # Environment variable that starts the sampling profiler with the app
+
+
+class Timing:
+    """
+    The totals of one timed operation, e.g. every load of a track.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.amount = 0.0  # The work done, e.g. seconds of audio decoded
+
+    def add(self, seconds, amount):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.amount += amount
+
+    def to_dict(self):
+        timing = {
+            "count": self.count,
+            "total_ms": round(self.seconds * 1000, 3),
+            "mean_ms": round(self.seconds * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3)
+        }
+        if self.amount:
+            timing["amount"] = round(self.amount, 3)
+            timing["per_second"] = round(self.amount / self.seconds, 3) if self.seconds else None
+        return timing
+
+
+class Metrics:
+    """
+    Collects the timings and counters of the app and writes them to a log with one JSON object per line.
+
+    Every operation timed with `span` is written to the log when it ends, and its totals are kept in memory.
+    Timings recorded with `add` only update the totals, so they can be used on hot paths like decoding. A summary
+    of all totals, counters and gauges is written every `SUMMARY_INTERVAL` seconds and when the app closes.
+
+    The log is written by a background thread, so timing an operation never waits for the disk.
+
+    Args:
+        path (str | None, optional): The path of the log, None to keep the metrics in memory only.
+    """
+
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+        self.started = time.time()
+        self.timings = {}  # Name -> Timing
+        self.counters = Counter()
+        self.gauges = {}  # Name -> function that returns the current value
+        self.lock = threading.Lock()
+        self.lines = queue.SimpleQueue()
+        self.writer = None
+        self.sampler = None
+
+    @contextmanager
+    def span(self, name, amount=0, **fields):
+        """
+        Times the operation inside the `with` block and logs it when the block ends.
+
+        Args:
+            name (str): The name of the operation, e.g. "track.load".
+            amount (float, optional): The work done, e.g. the number of songs, used for the throughput.
+            **fields: Values that are logged with the timing, e.g. the song name.
+
+        Yields:
+            dict: The logged values, values known only at the end can be added inside the block.
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(name, time.perf_counter() - start, amount, **fields)
+
+    def record(self, name, seconds, amount=0, **fields):
+        """
+        Adds a timing that was measured by the caller to its totals and logs it, like a `span`. Used for operations
+        that start and end in different callbacks.
+
+        Args:
+            name (str): The name of the operation.
+            seconds (float): The time it took.
+            amount (float, optional): The work done.
+            **fields: Values that are logged with the timing.
+        """
+        self.add(name, seconds, amount)
+        self.log("span", name=name, ms=round(seconds * 1000, 3), **fields)
+
+    def add(self, name, seconds, amount=0):
+        """
+        Adds one timing of an operation to its totals without logging it.
+
+        Args:
+            name (str): The name of the operation.
+            seconds (float): The time it took.
+            amount (float, optional): The work done.
+        """
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.add(seconds, amount)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def add_gauge(self, name, function):
+        """
+        Registers a value that is read when a summary is written, e.g. a counter kept by the audio engine.
+
+        Args:
+            name (str): The name of the value.
+            function (callable): Returns the current value, called without arguments from the writer thread.
+        """
+        self.gauges[name] = function
+
+    def log(self, event, **fields):
+        """
+        Writes one event to the log.
+
+        Args:
+            event (str): The kind of event, e.g. "span" or "ui_stall".
+            **fields: The values of the event. They have to be serializable as JSON.
+        """
+        if self.path is None:
+            return
+        self.lines.put(json.dumps({"time": round(time.time(), 3), "event": event, **fields}))
+        if self.writer is None:
+            self.__start_writer()
+
+    def get_summary(self):
+        """
+        Returns the totals of all timings, the counters and the current values of the gauges.
+
+        Returns:
+            dict: `timings` - name -> totals, `counters` - name -> value and `gauges` - name -> value.
+        """
+        with self.lock:
+            timings = {name: timing.to_dict() for name, timing in sorted(self.timings.items())}
+            counters = dict(sorted(self.counters.items()))
+        gauges = {}
+        for name, function in sorted(self.gauges.items()):
+            try:
+                gauges[name] = function()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        return {"uptime_s": round(time.time() - self.started, 3), "timings": timings, "counters": counters,
+                "gauges": gauges}
+
+    def write_summary(self):
+        self.log("summary", **self.get_summary())
+
+    def watch_ui(self, widget):
+        """
+        Measures how long the UI thread is blocked. A check is scheduled every `WATCHDOG_INTERVAL` milliseconds
+        with `after`, and the time it runs late is time the event loop could not handle events.
+
+        Args:
+            widget (tkinter.Misc): Any widget of the window.
+        """
+        interval = WATCHDOG_INTERVAL / 1000
+        expected = time.perf_counter() + interval
+
+        def check():
+            nonlocal expected
+            now = time.perf_counter()
+            late = now - expected
+            if late > UI_STALL_THRESHOLD:
+                self.add("ui.stall", late)
+                self.log("ui_stall", ms=round(late * 1000, 3))
+            self.add("ui.lag", max(late, 0.0))  # The total is the time the UI thread was blocked
+            expected = now + interval
+            widget.after(WATCHDOG_INTERVAL, check)
+
+        widget.after(WATCHDOG_INTERVAL, check)
+
+    def start_profiler(self):
+        """Starts the sampling profiler of the UI thread, see `Sampler`."""
+        if self.sampler is None:
+            self.sampler = Sampler(threading.main_thread().ident)
+            self.sampler.start()
+            self.log("profiler_started")
+
+    def stop_profiler(self):
+        """
+        Stops the sampling profiler and writes the collected stacks next to the log.
+
+        Returns:
+            str | None: The path of the profile, or None if the profiler was not running.
+        """
+        if self.sampler is None:
+            return None
+        sampler, self.sampler = self.sampler, None
+        sampler.stop()
+        path = os.path.join(os.path.dirname(self.path or LOG_PATH),
+                            time.strftime("profile-%Y%m%d-%H%M%S.txt"))
+        sampler.save(path)
+        self.log("profiler_stopped", path=path, samples=sampler.samples)
+        print(f"Profile of {sampler.samples} samples written to {path}")
+        return path
+
+    def toggle_profiler(self):
+        if self.sampler is None:
+            self.start_profiler()
+        else:
+            self.stop_profiler()
+
+    def close(self):
+        """Stops the profiler, writes the last summary and waits until the log has been written."""
+        self.stop_profiler()
+        self.write_summary()
+        if self.writer is not None:
+            self.lines.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def __start_writer(self):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.__write, daemon=True)
+                self.writer.start()
+
+    def __write(self):
+        """
+        Appends the queued lines to the log and writes a summary every `SUMMARY_INTERVAL` seconds. A log that has
+        grown beyond `LOG_LIMIT` is moved aside first.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > LOG_LIMIT:
+                os.replace(self.path, self.path + ".1")
+            file = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            print(f"Error: The metrics log {self.path} could not be opened. {e}")
+            self.path = None
+            return
+
+        with file:
+            next_summary = time.monotonic() + SUMMARY_INTERVAL
+            while True:
+                try:
+                    line = self.lines.get(timeout=max(next_summary - time.monotonic(), 0.0))
+                except queue.Empty:
+                    self.lines.put(json.dumps({"time": round(time.time(), 3), "event": "summary",
+                                               **self.get_summary()}))
+                    next_summary = time.monotonic() + SUMMARY_INTERVAL
+                    continue
+                if line is None:
+                    return
+                file.write(line + "\n")
+                if self.lines.empty():
+                    file.flush()
+
+
+class Sampler:
+    """
+    A sampling profiler of one thread. It takes the stack of the thread every `SAMPLE_INTERVAL` seconds from its
+    own thread, so the profiled code runs at full speed and only the sampling thread costs CPU.
+
+    The profile is saved in the collapsed stack format, one line "outer;...;inner count" per stack, which
+    flame graph tools read directly.
+
+    Args:
+        thread_id (int): The `ident` of the thread to sample.
+        interval (float, optional): The seconds between two samples.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.running.set()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __run(self):
+        while self.running.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:  # The thread has ended
+                return
+            stack = ";".join(f"{os.path.basename(entry.filename)}:{entry.name}:{entry.lineno}"
+                             for entry in traceback.extract_stack(frame))
+            del frame
+            self.stacks[stack] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+metrics = Metrics()
+span = metrics.span
+record = metrics.record
+add = metrics.add
+count = metrics.count
+log = metrics.log
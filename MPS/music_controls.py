@@ -1,84 +1,724 @@
 import pyaudio
 import wave
 import os
+import queue
 import threading
+import time
 
-song = None
-position = 0
-p = pyaudio.PyAudio()
-stream = None
-is_playing = False
-music_thread = None
-pause_event = threading.Event()
+import dsp
+import loudness
+import metrics
+import play_order
+import wav_reader
+import flac_reader
+import stem_mixer
+import audio_conversion
+import format_conversion
+import file_operations
+from audio_engine import AudioEngine, PyAudioOutput
 
+OUTPUT_SAMPLE_WIDTH = 2  # Bytes per sample of the output stream, whatever the songs are stored in
+FRAMES_PER_BUFFER = 1024  # Frames per audio callback, smaller values lower the latency
+BUFFER_PERIODS = 8  # Periods kept in the ring buffer, larger values protect against underruns
+EVENT_INTERVAL = 50  # Milliseconds between the checks for state changes of the player on the Tk thread
 
-def get_song_name(name):
-    global song, position
+# Status -> the statuses the player can move to from it
+TRANSITIONS = {
+    "empty": ("loading",),  # No song is loaded
+    "loading": ("paused", "playing", "empty"),
+    "paused": ("loading", "playing", "empty"),
+    "playing": ("loading", "paused", "empty")
+}
+
+
+def get_song_path(name):
     song_folder = os.path.join("..", "Audio", name)
-    song_path = os.path.join(song_folder, name + ".wav")
-    try:
-        song = wave.open(song_path, "rb")
-        position = 0
+    return audio_conversion.get_stored_path(os.path.join(song_folder, name))
+
+
+def open_song(name):
+    """
+    Opens a song for playback. Songs that have been separated are played from their stems, so the stem sliders
+    and buttons work on them. Songs stored as FLAC are decoded while they are played.
+
+    Args:
+        name (str): The song name.
+
+    Returns:
+        stem_mixer.StemSong | wav_reader.MappedWave | flac_reader.FlacReader: The opened song.
+    """
+    if stem_mixer.has_stems(name):
+        return stem_mixer.StemSong(name)
+    song_path = get_song_path(name)
+    if song_path.endswith(".flac"):
+        return flac_reader.open(song_path)
+    return wav_reader.open(song_path)
+
+
+def get_song_gain(name):
+    """
+    Returns the gain that normalizes the loudness of a song, from the loudness measured when it was imported.
+
+    Args:
+        name (str): The song name.
+
+    Returns:
+        float: The linear gain, 1.0 for songs imported before loudness was measured.
+    """
+    song = file_operations.get_library().get_song(name)
+    if song is None:
+        return 1.0
+    return loudness.get_gain(song["loudness"], song["peak"])
+
+
+class Player:
+    """
+    The player of the app: the loaded song, the play queue and the playback status, owned by one player thread.
+
+    Every public method only puts a command into a queue and returns at once, so the Tk thread never waits for the
+    audio device or for a song to be opened. The player thread carries the commands out one after another, and the
+    audio callbacks, the loader threads and the prefetch threads hand their results over through the same queue, so
+    the state is only ever changed from the player thread and needs no locks.
+
+    A song chosen in the songs list is opened on a loader thread, so a song on slow storage does not hold up the
+    other commands, and the current song plays on until the new one is ready. Choosing another song cancels the
+    load: its song is dropped and closed when it is open. The time from the double-click to the first audio of the
+    song is logged as "playback.click_to_audio".
+
+    The playback status moves along `TRANSITIONS`. Every change is reported to the Tk thread through the callback
+    given to `attach`, which is polled with `after`.
+
+    Next and previous follow a `play_order.PlayOrder` of the queue, with shuffle and repeat. The song that follows
+    the current one in that order is opened ahead of time and queued in the engine, so it starts gaplessly.
+
+    The output stream is opened once in the format of the default output device. Songs stored in another sample
+    width, channels or rate are converted while they are read (see `format_conversion.ConvertedSong`), so moving
+    between songs of different formats neither reopens the device nor breaks gapless playback.
+
+    Args:
+        mixer (stem_mixer.StemMixer): Mixes the stems of separated songs.
+        dsp_chain (dsp.DspChain): Processes the played audio.
+    """
+
+    def __init__(self, mixer, dsp_chain):
+        self.mixer = mixer
+        self.dsp_chain = dsp_chain
+        self.crossfade_seconds = 0.0
+        self.normalize = False
+        self.commands = queue.SimpleQueue()  # (command, arguments), None stops the player thread
+        self.events = queue.SimpleQueue()  # (status, song name) of every change, for the Tk thread
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.handlers = {
+            "load": self.__select,
+            "loaded": self.__loaded,
+            "play": self.__play,
+            "pause": self.__pause,
+            "toggle": self.__toggle,
+            "next": self.__next,
+            "previous": self.__previous,
+            "seek": self.__seek,
+            "set_queue": self.__set_queue,
+            "set_shuffle": self.__set_shuffle,
+            "set_repeat": self.__set_repeat,
+            "prefetched": self.__prefetched,
+            "track_changed": self.__track_changed,
+            "finished": self.__finished,
+            "first_audio": self.__first_audio,
+            "unload": self.__unload
+        }
+
+        # Owned by the player thread. The Tk thread only reads `status`, `song_name`, `rate` and `frames`.
+        self.p = None
+        self.engine = None
+        self.status = "empty"
+        self.song = None
+        self.song_name = None
+        self.rate = 0  # Sample rate of the loaded song
+        self.frames = 0  # Length of the loaded song
+        self.output_format = None  # (sample width, channels, rate) songs are converted to, None to open any format
+        self.order = play_order.PlayOrder()
+        self.prefetched = None  # (song, name) opened ahead of time by `__prefetch_next`
+        self.prefetch_generation = 0  # Incremented whenever a prefetched song becomes outdated
+        self.load_generation = 0  # Incremented by every load, so a song the loader opened too late is dropped
+        self.resume_status = "empty"  # The status before the pending load, restored if the load fails
+        self.clicked = None  # (`time.perf_counter` of the double-click, song name) until the song is heard
+
+    def start(self):
+        """
+        Starts the player thread, which opens the audio device first. Initializing PortAudio enumerates every
+        audio device, which takes a large part of the startup time, so the window calls this once it is shown.
+        Commands sent earlier, e.g. the queue and play order set while the window is built, wait in the queue and
+        are carried out in order once the device is open.
+        """
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run, daemon=True)
+                self.thread.start()
+
+    def close(self):
+        """Stops playback and the player thread and releases the audio device."""
+        if self.thread is not None:
+            self.commands.put(None)
+            self.thread.join()
+
+    def attach(self, widget, callback):
+        """
+        Reports the status changes of the player to the Tk thread.
+
+        Args:
+            widget (tkinter.Misc): The widget whose `after` polls for changes.
+            callback (callable): Called on the Tk thread with the new status and the name of the loaded song.
+        """
+        def deliver():
+            while True:
+                try:
+                    status, song_name = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                callback(status, song_name)
+            widget.after(EVENT_INTERVAL, deliver)
+
+        widget.after(EVENT_INTERVAL, deliver)
+
+    def load(self, name):
+        """
+        Loads a song and keeps playing if a song was playing. A song of the queue becomes the current song of the
+        queue. A load that has not finished yet is cancelled.
+
+        Args:
+            name (str): The song name.
+        """
+        self.__post("load", name, time.perf_counter())
+
+    def play(self):
+        self.__post("play")
+
+    def pause(self):
+        self.__post("pause")
+
+    def toggle(self):
+        """Pauses a playing song and plays a paused one."""
+        self.__post("toggle")
+
+    def next(self):
+        self.__post("next")
+
+    def previous(self):
+        self.__post("previous")
+
+    def seek(self, seconds):
+        """
+        Moves playback of the loaded song to the given time.
+
+        Args:
+            seconds (float): The time from the start of the song.
+        """
+        self.__post("seek", seconds)
+
+    def unload(self):
+        """
+        Stops playback, closes the loaded and the prefetched song and empties the queue, e.g. before the songs are
+        deleted. Waits until the player thread has closed the songs.
+        """
+        closed = threading.Event()
+        self.__post("unload", closed)
+        if self.thread is not None and self.thread.is_alive():
+            closed.wait()
+
+    def set_queue(self, names):
+        """
+        Sets the songs that are played one after another and that next/previous go through. The names are copied,
+        so the queue costs O(n) and should only be set when it changed.
+
+        Args:
+            names (Iterable[str]): The names of the songs shown in the songs list, in their order.
+        """
+        self.__post("set_queue", list(names))
+
+    def set_shuffle(self, shuffle):
+        """
+        Args:
+            shuffle (bool): Whether the queue is played in a random order.
+        """
+        self.__post("set_shuffle", shuffle)
+
+    def set_repeat(self, mode):
+        """
+        Args:
+            mode (str): One of `play_order.REPEAT_MODES`.
+        """
+        self.__post("set_repeat", mode)
+
+    def set_crossfade(self, seconds):
+        """
+        Sets how long a song and the next song of the queue overlap. The change applies from the next track change
+        on, so it needs no command.
+
+        Args:
+            seconds (float): The length of the crossfade, 0 for gapless playback.
+        """
+        self.crossfade_seconds = seconds
+        if self.engine is not None:
+            self.engine.crossfade_seconds = seconds
+
+    def set_normalize(self, enabled):
+        """
+        Turns the loudness normalization on or off. The engine ramps to the new gain within a few periods, so it
+        needs no command either.
+
+        Args:
+            enabled (bool): Whether songs are played at the gain measured when they were imported.
+        """
+        self.normalize = enabled
+        if self.engine is not None:
+            self.engine.normalize = enabled
+
+    def get_position(self):
+        """
+        Returns the time of the loaded song that is being played, in seconds.
+        """
+        engine, rate = self.engine, self.rate
+        if engine is None or not rate:
+            return 0.0
+        return engine.position / rate
+
+    def get_duration(self):
+        """
+        Returns the length of the loaded song in seconds.
+        """
+        rate = self.rate
+        return self.frames / rate if rate else 0.0
+
+    def get_stats(self):
+        """
+        Returns the underrun counter and latency numbers of the playback engine, see `AudioEngine.get_stats`.
+        """
+        return self.engine.get_stats() if self.engine is not None else {}
+
+    def __post(self, command, *args):
+        self.commands.put((command, args))
+
+    def __run(self):
+        """
+        The player thread: opens the audio device and carries out the commands until `close` is called.
+        """
+        try:
+            self.p = pyaudio.PyAudio()
+            output = PyAudioOutput(self.p)
+            self.engine = AudioEngine(output,
+                                      frames_per_buffer=FRAMES_PER_BUFFER,
+                                      buffer_periods=BUFFER_PERIODS,
+                                      on_finished=lambda: self.commands.put(("finished", ())),
+                                      on_track_changed=lambda source: self.commands.put(("track_changed", (source,))),
+                                      on_first_audio=lambda: self.commands.put(("first_audio",
+                                                                                (time.perf_counter(),))),
+                                      mixer=self.mixer,
+                                      dsp_chain=self.dsp_chain)
+            self.engine.crossfade_seconds = self.crossfade_seconds
+            self.engine.normalize = self.normalize
+        except Exception as e:
+            print(f"Error: The audio device could not be opened. {e}")
+            return
+        try:
+            self.output_format = output.get_device_format(OUTPUT_SAMPLE_WIDTH)
+        except Exception as e:  # No default device, every song opens a stream in its own format
+            print(f"Error: The format of the audio device could not be read. {e}")
+        metrics.metrics.add_gauge("audio.underruns", lambda: self.engine.underruns)
+
+        while True:
+            command = self.commands.get()
+            if command is None:
+                break
+            name, args = command
+            try:
+                self.handlers[name](*args)
+            except Exception as e:
+                print(f"Error: The player command {name} failed. {e}")
+
+        self.engine.stop()
+        self.__close_prefetched()
+        if self.song is not None:
+            self.song.close()
+        self.p.terminate()
+
+    def __set_status(self, status):
+        """
+        Moves the player to a new status and reports the change to the Tk thread.
+
+        Raises:
+            ValueError: If the player cannot move from its status to `status`.
+        """
+        if status != self.status and status not in TRANSITIONS[self.status]:
+            raise ValueError(f"the player cannot go from {self.status} to {status}")
+        self.status = status
+        self.events.put((status, self.song_name))
+
+    def __select(self, name, clicked):
+        """
+        Starts loading a song chosen by the user on a loader thread, which hands it back with a "loaded" command.
+
+        Args:
+            name (str): The song name.
+            clicked (float): The `time.perf_counter` of the double-click.
+        """
+        self.load_generation += 1
+        if self.status != "loading":
+            self.resume_status = self.status
+            self.__set_status("loading")
+        self.clicked = (clicked, name)
+        threading.Thread(target=self.__load_song, args=(self.load_generation, name), daemon=True).start()
+
+    def __load_song(self, generation, name):
+        """
+        The loader thread of `__select`: opens the song and brings its start into memory. A load that was cancelled
+        before or while the song was opened closes it.
+        """
+        if generation != self.load_generation:
+            return
+        try:
+            with metrics.span("track.open", song=name):
+                source = self.__open(name)
+                source.readframes(FRAMES_PER_BUFFER * BUFFER_PERIODS)
+                source.rewind()
+        except Exception as e:
+            print_load_error(name, e)
+            source = None
+        if source is not None and generation != self.load_generation:
+            source.close()
+            return
+        self.commands.put(("loaded", (generation, name, source)))
+
+    def __loaded(self, generation, name, source):
+        """
+        A loader thread has opened a song chosen by the user, which becomes the current song of the play order.
+        """
+        if generation != self.load_generation:  # Another song was chosen in the meantime
+            if source is not None:
+                source.close()
+            return
+        if source is None:  # The loader could not open it, the previous song stays loaded
+            self.clicked = None
+            self.__set_status(self.resume_status if self.song is not None else "empty")
+            return
+        self.order.jump(name)
+        self.__load(name, source)
+
+    def __load(self, name, source=None):
+        """
+        Loads a song, from the prefetched or loaded song if it is given. The play order has already moved to it.
+        Cancels a load that is still running.
+
+        Args:
+            name (str): The song name.
+            source (wav_reader.MappedWave, optional): The song if it has already been opened.
+        """
+        if self.status == "loading":  # Finishing the load of `__select`
+            self.load_generation += 1
+            previous_status = self.resume_status
+        else:
+            previous_status = self.status
+            self.__set_status("loading")
+        if self.clicked is not None and self.clicked[1] != name:  # Next or previous was pressed during the load
+            self.clicked = None
+        try:
+            with metrics.span("track.load", song=name, opened=source is not None):
+                new_song = source if source is not None else self.__open(name)
+                self.engine.load(new_song, get_song_gain(name))
+        except Exception as e:
+            if source is not None:
+                source.close()
+            print_load_error(name, e)
+            # The previous song stays loaded, the engine is only changed once the new song is open
+            self.__set_status(previous_status if self.song is not None else "empty")
+            return
+
+        previous_song, self.song = self.song, new_song
+        self.song_name = name
+        self.rate = new_song.getframerate()
+        self.frames = new_song.getnframes()
         print(f"Loaded song: {name}")
-    except FileNotFoundError:
-        print(f"Error: The file {song_path} was not found.")
-    except wave.Error as e:
-        print(f"Error: The file {song_path} could not be opened as a WAV file. {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-
-
-def play_pause_music():
-    global is_playing
-    if not is_playing:
-        if pause_event.is_set():
-            pause_event.clear()
-            is_playing = True
+        if previous_status == "playing":
+            self.__start_engine()
         else:
-            play_music()
-    else:
-        pause_music()
+            self.clicked = None  # Only a song that starts playing is timed
+            self.__set_status("paused")
+        self.__prefetch_next(previous_song)
 
+    def __open(self, name):
+        """
+        Opens a song in the format of the output stream. Called from the prefetch threads too.
+        """
+        source = open_song(name)
+        if self.output_format is None:
+            return source
+        return format_conversion.to_format(source, *self.output_format)
 
-def play_music():
-    global music_thread, is_playing
+    def __start_engine(self):
+        with metrics.span("playback.start", song=self.song_name):
+            self.engine.play()
+        self.__set_status("playing")
 
-    def play():
-        global stream, position, is_playing
-        if song is None:
+    def __play(self):
+        if self.status == "loading":  # The chosen song starts playing once it is loaded
+            self.resume_status = "playing"
+            return
+        if self.song is None:
             print("No song loaded for playback.")
             return
-        if stream is None or not stream.is_active():
-            stream = p.open(format=p.get_format_from_width(song.getsampwidth()),
-                            channels=song.getnchannels(),
-                            rate=song.getframerate(),
-                            output=True)
-        song.setpos(position)
-        while stream.is_active():
-            if pause_event.is_set():
-                pause_event.wait()
-                continue
-            data = song.readframes(1024)
-            if not data:
-                break
-            stream.write(data)
-            position = song.tell()
-        stream.stop_stream()
-        stream.close()
-        stream = None
-        is_playing = False
-
-    if music_thread is None or not music_thread.is_alive():
-        pause_event.clear()
-        music_thread = threading.Thread(target=play)
-        music_thread.start()
-        is_playing = True
-
-
-def pause_music():
-    global is_playing
-    pause_event.set()
-    is_playing = False
+        if self.status != "playing":
+            self.__start_engine()
+
+    def __pause(self):
+        if self.status == "loading":  # The previous song plays on during the load
+            self.engine.pause()
+            if self.resume_status == "playing":
+                self.resume_status = "paused"
+        elif self.status == "playing":
+            self.engine.pause()
+            self.__set_status("paused")
+
+    def __toggle(self):
+        if self.status == "playing" or self.status == "loading" and self.resume_status == "playing":
+            self.__pause()
+        else:
+            self.__play()
+
+    def __next(self):
+        name = self.order.advance()
+        if name is None:
+            return
+        source = None
+        if self.prefetched is not None and self.prefetched[1] == name:
+            source, _ = self.prefetched
+            self.prefetched = None
+            self.engine.queue_next(None)
+        self.__load(name, source)
+
+    def __previous(self):
+        name = self.order.go_back()
+        if name is not None:
+            self.__load(name)
+
+    def __seek(self, seconds):
+        if self.song is None:
+            return
+        frame = min(max(round(seconds * self.rate), 0), self.frames)
+        self.engine.seek(frame)
+
+    def __unload(self, closed):
+        """
+        Closes every song the player holds. Songs that loader or prefetch threads are still opening are closed by
+        them, because their generations are outdated.
+        """
+        try:
+            self.load_generation += 1
+            self.prefetch_generation += 1
+            self.engine.stop()
+            self.__close_prefetched()
+            if self.song is not None:
+                self.song.close()
+            self.song = self.song_name = self.clicked = None
+            self.rate = self.frames = 0
+            order = play_order.PlayOrder()  # Its history names the songs that are gone
+            order.set_shuffle(self.order.shuffle)
+            order.set_repeat(self.order.repeat)
+            self.order = order
+            self.__set_status("empty")
+        finally:
+            closed.set()
+
+    def __set_queue(self, names):
+        self.order.set_queue(names)
+        if self.song is not None:
+            self.__prefetch_next()
+
+    def __set_shuffle(self, shuffle):
+        self.order.set_shuffle(shuffle)
+        if self.song is not None:
+            self.__prefetch_next()
+
+    def __set_repeat(self, mode):
+        self.order.set_repeat(mode)
+        if self.song is not None:
+            self.__prefetch_next()
+
+    def __prefetch_next(self, finished_song=None):
+        """
+        Opens and pre-buffers the song that follows the current one in the play order on a background thread, which
+        hands it back with a "prefetched" command, so the track change is gapless.
+
+        Args:
+            finished_song (wav_reader.MappedWave, optional): A song that is no longer played and is closed by the
+                background thread.
+        """
+        self.engine.queue_next(None)
+        if self.prefetched is not None and self.engine.is_reading(self.prefetched[0]):
+            return  # The engine has moved on to the prefetched song, so it is played next whatever the order says
+        self.prefetch_generation += 1
+        outdated, self.prefetched = self.prefetched, None
+
+        name = self.order.peek_next(finished=True)
+        threading.Thread(target=self.__prefetch,
+                         args=(self.prefetch_generation, name, [finished_song, outdated[0] if outdated else None]),
+                         daemon=True).start()
+
+    def __prefetch(self, generation, name, closing):
+        """
+        The background part of `__prefetch_next`.
+        """
+        for source in closing:
+            if source is not None:
+                source.close()
+        if name is None:
+            return
+
+        try:
+            source = self.__open(name)
+            source.readframes(FRAMES_PER_BUFFER * BUFFER_PERIODS)  # Bring the start of the song into memory
+            source.rewind()
+        except Exception as e:
+            print(f"Error: The song {name} could not be prefetched. {e}")
+            return
+        self.commands.put(("prefetched", (generation, source, name)))
+
+    def __prefetched(self, generation, source, name):
+        if generation != self.prefetch_generation:  # Another song was loaded in the meantime
+            source.close()
+            return
+        self.prefetched = (source, name)
+        self.engine.queue_next(source, get_song_gain(name))
+
+    def __follow_order(self, name):
+        """
+        Moves the play order on to the prefetched song that is played now. If the order was changed after the
+        song had been queued, the song becomes the current song of the order instead.
+        """
+        if self.order.peek_next(finished=True) == name:
+            self.order.advance(finished=True)
+        else:
+            self.order.jump(name)
+
+    def __close_prefetched(self):
+        if self.prefetched is not None:
+            self.prefetched[0].close()
+            self.prefetched = None
+
+    def __track_changed(self, source):
+        """
+        Playback has moved on to the prefetched song, which the engine queued gaplessly.
+        """
+        if self.prefetched is None or self.prefetched[0] is not source:
+            return
+        _, self.song_name = self.prefetched
+        self.prefetched = None
+        self.__follow_order(self.song_name)
+        previous_song, self.song = self.song, source
+        self.rate = source.getframerate()
+        self.frames = source.getnframes()
+        self.events.put((self.status, self.song_name))
+        self.__prefetch_next(previous_song)
+
+    def __first_audio(self, heard):
+        """
+        The output has been handed the first period of the song the engine loaded last.
+
+        Args:
+            heard (float): The `time.perf_counter` of the audio callback.
+        """
+        if self.clicked is None or self.clicked[1] != self.song_name:
+            return
+        clicked, name = self.clicked
+        self.clicked = None
+        metrics.record("playback.click_to_audio", heard - clicked, song=name)
+
+    def __finished(self):
+        """
+        The queue has been played to the end. If the next song could not be played gaplessly because its format
+        differs, it is loaded on a new output stream now.
+        """
+        if self.status != "playing":
+            return
+        if self.prefetched is None:
+            self.__set_status("paused")
+            return
+        source, name = self.prefetched
+        self.prefetched = None
+        self.__follow_order(name)
+        self.__load(name, source)
+
+
+def print_load_error(name, error):
+    if isinstance(error, FileNotFoundError):
+        print(f"Error: The file {get_song_path(name)} was not found.")
+    elif isinstance(error, wave.Error):
+        print(f"Error: The file {get_song_path(name)} could not be opened. {error}")
+    else:
+        print(f"An unexpected error occurred: {error}")
+
+
+def set_stem_gain(stem, gain):
+    """
+    Sets the gain of one stem. The change is heard within one buffer period.
+
+    Args:
+        stem (str): The stem name, one of `stem_mixer.STEMS`.
+        gain (float): The linear gain, 1.0 keeps the stem as it is.
+    """
+    mixer.set_gain(stem, gain)
+
+
+def toggle_stem_mute(stem):
+    """
+    Mutes or unmutes one stem.
+
+    Args:
+        stem (str): The stem name, one of `stem_mixer.STEMS`.
+
+    Returns:
+        bool: True if the stem is muted now.
+    """
+    muted = not mixer.is_muted(stem)
+    mixer.set_muted(stem, muted)
+    return muted
+
+
+def set_volume(volume):
+    """
+    Sets the playback volume. The change is ramped over one buffer period.
+
+    Args:
+        volume (float): The volume in percent. The gain is its square, which is closer to how loud it sounds than a
+            linear gain.
+    """
+    dsp_chain.volume.set_gain((volume / 100) ** 2)
+
+
+def toggle_mute():
+    """
+    Mutes or unmutes playback.
+
+    Returns:
+        bool: True if playback is muted now.
+    """
+    muted = not dsp_chain.volume.muted
+    dsp_chain.volume.set_muted(muted)
+    return muted
+
+
+def set_equalizer(preset):
+    """
+    Sets the bands of the equalizer. The change is crossfaded over one buffer period.
+
+    Args:
+        preset (str): The name of the bands in `dsp.EQ_PRESETS`.
+    """
+    dsp_chain.equalizer.set_bands(dsp.EQ_PRESETS[preset])
+
+
+mixer = stem_mixer.StemMixer()
+dsp_chain = dsp.DspChain()
+player = Player(mixer, dsp_chain)
 
 # TODO Del all songs
 # TODO Double click
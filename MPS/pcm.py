@@ -0,0 +1,56 @@
+import numpy as np
+
+# Full scale of the integer samples of every sample width
+FULL_SCALE = {
+    1: 128.0,
+    2: 32768.0,
+    3: 8388608.0,
+    4: 2147483648.0
+}
+
+
+def to_float(data, sample_width):
+    """
+    Converts interleaved PCM data to float samples in the range [-1, 1).
+
+    Args:
+        data (bytes | memoryview): The PCM data as stored in a WAV file (8-bit samples are unsigned).
+        sample_width (int): The sample width in bytes.
+
+    Returns:
+        numpy.ndarray: A one-dimensional float32 array with one value per sample.
+    """
+    if sample_width == 1:
+        samples = np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0
+    elif sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = ((samples ^ 0x800000) - 0x800000).astype(np.float32)  # Sign extension of the 24-bit values
+    else:
+        samples = np.frombuffer(data, dtype=np.int16 if sample_width == 2 else np.int32).astype(np.float32)
+    return samples * np.float32(1.0 / FULL_SCALE[sample_width])
+
+
+def from_float(samples, sample_width):
+    """
+    Converts float samples back to PCM data, clipping values outside of the range [-1, 1).
+
+    Args:
+        samples (numpy.ndarray): The samples, in any shape. They are written in C order.
+        sample_width (int): The sample width in bytes.
+
+    Returns:
+        bytes: The PCM data.
+    """
+    scale = FULL_SCALE[sample_width]
+    values = np.clip(np.rint(samples.ravel() * scale), -scale, scale - 1)
+    if sample_width == 1:
+        return (values + 128).astype(np.uint8).tobytes()
+    if sample_width == 3:
+        values = values.astype(np.int32)
+        raw = np.empty((values.size, 3), dtype=np.uint8)
+        raw[:, 0] = values & 0xFF
+        raw[:, 1] = (values >> 8) & 0xFF
+        raw[:, 2] = (values >> 16) & 0xFF
+        return raw.tobytes()
+    return values.astype(np.int16 if sample_width == 2 else np.int32).tobytes()
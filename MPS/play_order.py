@@ -0,0 +1,258 @@
+import random
+from collections import deque
+
+REPEAT_MODES = ("off", "all", "one")  # In the order the repeat button cycles through them
+HISTORY_LENGTH = 1000  # Songs "previous" can go back through
+
+
+class LazyPermutation:
+    """
+    A random permutation of `range(size)` that is drawn one position at a time, as the shuffled songs are played.
+
+    Drawing position `k` is one step of the Fisher-Yates shuffle: a random element of the positions not drawn yet
+    is swapped into position `k`. Only the swapped positions are stored, every other position still holds its own
+    index, so creating a permutation takes no time and memory whatever the size, and each position costs O(1).
+    A drawn position never changes, so the permutation can be read ahead, e.g. to prefetch the next song.
+
+    Args:
+        size (int): The number of elements.
+        rng (random.Random): The random number generator.
+        first (int, optional): The element placed at the first position, e.g. the song that is playing.
+    """
+
+    def __init__(self, size, rng, first=None):
+        self.size = size
+        self.rng = rng
+        self.swapped = {}  # Position -> element, for the positions that do not hold their own index
+        self.drawn = 0  # Positions before it are final
+        if first is not None:
+            self.__swap(0, first)
+            self.drawn = 1
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, position):
+        """
+        Returns the element at a position, drawing the positions up to it first.
+
+        Args:
+            position (int): The position, 0 <= position < size.
+
+        Returns:
+            int: The element.
+        """
+        while self.drawn <= position:
+            self.__swap(self.drawn, self.rng.randrange(self.drawn, self.size))
+            self.drawn += 1
+        return self.swapped.get(position, position)
+
+    def __swap(self, a, b):
+        value_a, value_b = self.swapped.get(a, a), self.swapped.get(b, b)
+        self.swapped[a], self.swapped[b] = value_b, value_a
+
+
+class PlayOrder:
+    """
+    The order the songs of the queue are played in, with shuffle and the repeat modes of `REPEAT_MODES`.
+
+    In order, the song after the current one is the next song of the queue. Shuffled, the songs are played in the
+    order of a `LazyPermutation` of the queue that starts with the song that was playing, so turning shuffle on or
+    off, or replacing the queue, costs O(1) and never copies the queue. Every song of the queue is played once
+    before any is repeated.
+
+    The played songs are kept in a history, so when shuffled "previous" goes back to the song that was actually
+    played before, and "next" goes forward through the same songs again before it moves on. In order, "previous"
+    goes to the song before the current one in the queue.
+
+    The order works on song names, so the history stays valid when the queue is filtered or reloaded.
+
+    Args:
+        seed (int, optional): The seed of the shuffle, for a reproducible order.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.names = []  # The queue
+        self.positions = {}  # Song name -> index in `names`
+        self.shuffle = False
+        self.repeat = "off"
+        self.current = None  # The name of the current song
+        self.permutation = None  # The shuffled order, None in order
+        self.cursor = 0  # The position in `permutation` of the last song it gave
+        self.next_permutation = None  # The order of the next round of repeat all, once the next song was read
+        self.history = deque(maxlen=HISTORY_LENGTH)  # The songs played before the current one, the last at the end
+        self.forward = []  # The songs "previous" went back from, the next one at the end
+
+    def set_queue(self, names):
+        """
+        Replaces the queue, e.g. when the songs list is filtered. The current song and the history are kept.
+
+        Args:
+            names (list[str]): The song names in the order of the songs list.
+        """
+        self.names = names
+        self.positions = {name: index for index, name in enumerate(names)}
+        self.forward = []
+        self.__restart_shuffle()
+
+    def set_shuffle(self, shuffle):
+        """
+        Turns shuffle on or off. The songs after the current one are shuffled anew, or follow it in queue order.
+
+        Args:
+            shuffle (bool): Whether to shuffle.
+        """
+        self.shuffle = shuffle
+        self.forward = []
+        self.__restart_shuffle()
+
+    def set_repeat(self, mode):
+        """
+        Args:
+            mode (str): One of `REPEAT_MODES`: "off" stops after the last song, "all" starts the queue again and
+                "one" plays the current song again when it ends.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in REPEAT_MODES:
+            raise ValueError(f"unknown repeat mode: {mode}")
+        self.repeat = mode
+
+    def jump(self, name):
+        """
+        Makes a song the current song, e.g. one that was chosen in the songs list. Shuffled, the songs after it are
+        shuffled anew.
+
+        Args:
+            name (str): The song name.
+        """
+        if name == self.current:
+            return
+        if self.current is not None:
+            self.history.append(self.current)
+        self.current = name
+        self.forward = []
+        self.__restart_shuffle()
+
+    def peek_next(self, finished=False):
+        """
+        Returns the song `advance` would move to, without moving. In shuffle, the next position of the
+        permutation is drawn, so `advance` moves to the same song.
+
+        Args:
+            finished (bool, optional): The current song has been played to the end, so "one" repeats it. Skipping
+                with "next" moves on in every mode.
+
+        Returns:
+            str | None: The name of the next song, or None at the end of the queue.
+        """
+        return self.__get_next(finished)[0]
+
+    def advance(self, finished=False):
+        """
+        Moves to the next song.
+
+        Args:
+            finished (bool, optional): See `peek_next`.
+
+        Returns:
+            str | None: The name of the new current song, or None at the end of the queue, which keeps the current
+                song.
+        """
+        name, move = self.__get_next(finished)
+        if name is None:
+            return None
+        if move == "forward":
+            self.forward.pop()
+        elif move == "cursor":
+            self.cursor += 1
+        elif move == "restart":  # Repeating all songs in a new shuffled order
+            self.permutation, self.cursor = self.__get_new_permutation(), 0
+        if move != "repeat":
+            if self.current is not None:
+                self.history.append(self.current)
+            self.current = name
+        return name
+
+    def go_back(self):
+        """
+        Moves to the song played before the current one when shuffled, or to the song before it in the queue.
+
+        Returns:
+            str | None: The name of the new current song, or None if there is nothing to go back to.
+        """
+        if self.shuffle:
+            if not self.history:
+                return None
+            self.forward.append(self.current)
+            self.current = self.history.pop()
+            return self.current
+
+        index = self.positions.get(self.current, 0) - 1
+        if index < 0:
+            if self.repeat != "all" or not self.names:
+                return None
+            index = len(self.names) - 1
+        self.history.append(self.current)
+        self.current = self.names[index]
+        return self.current
+
+    def __get_next(self, finished):
+        """
+        Returns the next song and how `advance` moves to it: "repeat", "forward" through the songs "previous" went
+        back from, "index" in order, "cursor" to the next position of the permutation or "restart" with a new one.
+        """
+        if finished and self.repeat == "one" and self.current is not None:
+            return self.current, "repeat"
+        if self.forward:
+            return self.forward[-1], "forward"
+        if not self.names:
+            return None, None
+        if not self.shuffle:
+            index = self.positions.get(self.current, -1) + 1
+            if index >= len(self.names):
+                if self.repeat != "all":
+                    return None, None
+                index = 0
+            return self.names[index], "index"
+        if self.permutation is None:
+            self.__restart_shuffle()
+        if self.cursor + 1 < len(self.permutation):
+            return self.names[self.permutation[self.cursor + 1]], "cursor"
+        if self.repeat != "all":
+            return None, None
+        if self.next_permutation is None:  # Drawn once, so `advance` plays the song `peek_next` returned
+            self.next_permutation = self.__get_new_permutation()
+        return self.names[self.next_permutation[0]], "restart"
+
+    def __get_new_permutation(self):
+        """
+        Returns the permutation of the next round of repeat all. It does not start with the song that ended the
+        last round, so no song is played twice in a row.
+        """
+        permutation, self.next_permutation = self.next_permutation, None
+        if permutation is not None:
+            return permutation
+        size = len(self.names)
+        last = self.positions.get(self.current)
+        first = self.rng.randrange(size - 1) if size > 1 else 0
+        if last is not None and size > 1 and first >= last:
+            first += 1
+        return LazyPermutation(size, self.rng, first)
+
+    def __restart_shuffle(self):
+        """
+        Starts a new permutation that begins with the current song, or with no song drawn if the current song is
+        not in the queue.
+        """
+        self.next_permutation = None
+        if not self.shuffle:
+            self.permutation = None
+            return
+        index = self.positions.get(self.current)
+        if index is None:
+            self.permutation, self.cursor = LazyPermutation(len(self.names), self.rng), -1
+        else:
+            self.permutation, self.cursor = LazyPermutation(len(self.names), self.rng, index), 0
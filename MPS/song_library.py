@@ -0,0 +1,321 @@
+import os
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source_path TEXT,
+    duration REAL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    imported_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    fingerprint TEXT NOT NULL,
+    file_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS folder_files (
+    folder TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    inode INTEGER NOT NULL,
+    PRIMARY KEY (folder, path)
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns added to the songs table after its first version, created in databases that lack them
+ADDED_COLUMNS = (("source_fingerprint", "TEXT"), ("source_hash", "TEXT"), ("sample_width", "INTEGER"),
+                 ("artist", "TEXT"), ("title", "TEXT"), ("loudness", "REAL"), ("peak", "REAL"))
+
+# Columns of earlier versions that are no longer stored, dropped from databases that have them if SQLite can
+REMOVED_COLUMNS = ("content_hash",)
+
+INDEXES = """
+DROP INDEX IF EXISTS songs_content_hash;
+CREATE INDEX IF NOT EXISTS songs_source_fingerprint ON songs (source_fingerprint);
+"""
+
+QUERY_CHUNK = 500  # Values per "IN (...)" query, below the variable limit of older SQLite versions
+
+# Columns of a song, in the order `add_songs` expects them
+COLUMNS = ("name", "source_path", "duration", "sample_rate", "channels", "source_fingerprint", "source_hash",
+           "sample_width", "artist", "title", "loudness", "peak")
+
+
+class SongLibrary:
+    """
+    The library of imported songs, stored in an SQLite database.
+
+    Song names are unique and indexed, and so are the fingerprints of the source files, so looking up a song or a
+    duplicate takes the same time for a hundred songs and for a hundred thousand. The songs
+    keep the order they were imported in.
+
+    The library also caches the fingerprint and hash of every file seen by an import, keyed by its path, size and
+    modification time, so importing a folder again does not read the files that did not change, and the manifest
+    of every scanned folder, so a rescan only has to look at what was added, changed or removed.
+
+    Args:
+        path (str): The path to the database file. The folder is created if it does not exist.
+        legacy_list_path (str, optional): The path to the old `song_list.txt`. Its songs are copied into a newly
+            created database.
+    """
+
+    def __init__(self, path, legacy_list_path=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        existing_columns = {row[1] for row in self.connection.execute("PRAGMA table_info(songs)")}
+        for column, column_type in ADDED_COLUMNS:
+            if column not in existing_columns:
+                self.connection.execute(f"ALTER TABLE songs ADD COLUMN {column} {column_type}")
+        self.connection.executescript(INDEXES)
+        if sqlite3.sqlite_version_info >= (3, 35):  # The first version with DROP COLUMN
+            for column in REMOVED_COLUMNS:
+                if column in existing_columns:
+                    self.connection.execute(f"ALTER TABLE songs DROP COLUMN {column}")
+
+        if is_new and legacy_list_path is not None and os.path.exists(legacy_list_path):
+            with open(legacy_list_path, "r") as file:
+                names = [line.strip() for line in file if line.strip()]
+            self.add_songs([(name,) + (None,) * (len(COLUMNS) - 1) for name in names])
+            print(f"Moved {len(names)} songs from {legacy_list_path} to the library")
+
+    def __contains__(self, name):
+        with self.lock:
+            cursor = self.connection.execute("SELECT 1 FROM songs WHERE name = ?", (name,))
+            return cursor.fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def add_songs(self, songs):
+        """
+        Adds songs in one transaction. Songs whose name is already in the library are ignored.
+
+        Args:
+            songs (Iterable[tuple]): One tuple of the values of `COLUMNS` per song.
+        """
+        imported_at = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR IGNORE INTO songs ({', '.join(COLUMNS)}, imported_at) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                (tuple(song) + (imported_at,) for song in songs)
+            )
+
+    def find_by_fingerprints(self, fingerprints):
+        """
+        Returns the songs imported from files with the given fingerprints, with one query per `QUERY_CHUNK`
+        fingerprints.
+
+        Args:
+            fingerprints (Iterable[str]): Fingerprints returned by `fingerprints.fingerprint_file`.
+
+        Returns:
+            dict[str, list[tuple[str, str]]]: The names of the songs and the full hashes of their source files by
+                fingerprint. Fingerprints without songs are left out.
+        """
+        songs = {}
+        for fingerprint, name, source_hash in self.__select_in(
+                "SELECT source_fingerprint, name, source_hash FROM songs WHERE source_fingerprint IN ({})",
+                fingerprints):
+            songs.setdefault(fingerprint, []).append((name, source_hash))
+        return songs
+
+    def find_unfingerprinted(self, names):
+        """
+        Returns which of the given songs were imported before fingerprints were stored, so they can only be
+        recognised by their name.
+
+        Args:
+            names (Iterable[str]): Song names.
+
+        Returns:
+            set[str]: The names of those songs.
+        """
+        return {row[0] for row in self.__select_in(
+            "SELECT name FROM songs WHERE source_fingerprint IS NULL AND name IN ({})", names)}
+
+    def get_file_hashes(self, files):
+        """
+        Returns the cached hashes of files that did not change since they were computed, with one query per
+        `QUERY_CHUNK` files.
+
+        Args:
+            files (Iterable[tuple[str, int, float]]): The absolute path, current size and current modification
+                time of every file.
+
+        Returns:
+            dict[str, tuple[str, str | None]]: The fingerprint and the full hash, which is None if it was never
+                needed, by path. Files that are not cached or changed are left out.
+        """
+        files = {path: (size, mtime) for path, size, mtime in files}
+        return {path: (fingerprint, file_hash) for path, size, mtime, fingerprint, file_hash in self.__select_in(
+            "SELECT path, size, mtime, fingerprint, file_hash FROM file_hashes WHERE path IN ({})", files)
+            if files[path] == (size, mtime)}
+
+    def cache_file_hashes(self, files):
+        """
+        Caches the hashes of files in one transaction, replacing what was cached for their paths.
+
+        Args:
+            files (Iterable[tuple]): Tuples of the path, size, modification time, fingerprint and full hash.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO file_hashes (path, size, mtime, fingerprint, "
+                                        "file_hash) VALUES (?, ?, ?, ?, ?)", files)
+
+    def get_manifest(self, folder_path):
+        """
+        Returns the files of a folder that were imported, as they were when its scan found them.
+
+        Args:
+            folder_path (str): The normalized absolute path to the folder.
+
+        Returns:
+            dict[str, tuple[int, float, int]]: The size, modification time and inode of every file by its path.
+        """
+        with self.lock:
+            return {row[0]: row[1:] for row in self.connection.execute(
+                "SELECT path, size, mtime, inode FROM folder_files WHERE folder = ?", (folder_path,))}
+
+    def update_manifest(self, folder_path, files, removed):
+        """
+        Updates the manifest of a folder in one transaction.
+
+        Args:
+            folder_path (str): The normalized absolute path to the folder.
+            files (dict[str, tuple[int, float, int]]): The files that were imported, as returned by
+                `folder_scan.scan`.
+            removed (Iterable[str]): The paths of the removed files.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO folder_files (folder, path, size, mtime, inode) "
+                                        "VALUES (?, ?, ?, ?, ?)",
+                                        ((folder_path, path) + tuple(metadata) for path, metadata in files.items()))
+            self.connection.executemany("DELETE FROM folder_files WHERE folder = ? AND path = ?",
+                                        ((folder_path, path) for path in removed))
+
+    def get_scanned_folders(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT DISTINCT folder FROM folder_files")]
+
+    def get_setting(self, key, default=None):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def get_settings(self):
+        """
+        Returns:
+            dict: Every setting, key -> value.
+        """
+        with self.lock:
+            return dict(self.connection.execute("SELECT key, value FROM settings"))
+
+    def set_setting(self, key, value):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+    def get_names(self):
+        """
+        Returns the names of all songs in the order they were imported.
+
+        Returns:
+            list[str]: The song names.
+        """
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT name FROM songs ORDER BY id")]
+
+    def get_songs_after(self, song_id):
+        """
+        Returns the songs imported after the song with the given id, so a list of songs can be updated without
+        reading the whole library again.
+
+        Args:
+            song_id (int): The id of the last known song, 0 to get all songs.
+
+        Returns:
+            list[tuple[int, str, float | None]]: The ids, names and durations in seconds of the songs in the order
+                they were imported. The duration is None for songs of `song_list.txt`.
+        """
+        with self.lock:
+            return self.connection.execute("SELECT id, name, duration FROM songs WHERE id > ? ORDER BY id",
+                                           (song_id,)).fetchall()
+
+    def get_song(self, name):
+        """
+        Returns everything stored about a song.
+
+        Returns:
+            dict | None: The columns of the song and `imported_at`, or None if the song is not in the library.
+        """
+        with self.lock:
+            cursor = self.connection.execute("SELECT * FROM songs WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip((column[0] for column in cursor.description), row))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __select_in(self, query, values):
+        """
+        Runs a query with one "IN ({})" placeholder for every `QUERY_CHUNK` values and returns all rows.
+        """
+        values = list(values)
+        rows = []
+        with self.lock:
+            for start in range(0, len(values), QUERY_CHUNK):
+                chunk = values[start:start + QUERY_CHUNK]
+                rows.extend(self.connection.execute(query.format(", ".join("?" * len(chunk))), chunk))
+        return rows
+
+
+def update_song_list(library, names, durations, last_song_id):
+    """
+    Brings a list of songs up to date with the library. Only the songs imported since the last update are read,
+    unless songs were removed, in which case the whole list is read again.
+
+    Args:
+        library (SongLibrary): The library.
+        names (list[str]): The listed song names in the order they were imported, changed in place.
+        durations (dict[str, float | None]): The lengths of the listed songs by name, changed in place.
+        last_song_id (int): The id of the last listed song, 0 for an empty list.
+
+    Returns:
+        tuple[int, list[str], bool]: The id of the last listed song now, the names that were added to the list and
+            whether the list was emptied first.
+    """
+    new_songs = library.get_songs_after(last_song_id)
+    reloaded = len(names) + len(new_songs) != len(library)  # Songs were removed
+    if reloaded:
+        names.clear()
+        durations.clear()
+        new_songs = library.get_songs_after(0)
+
+    new_names = [song_name for _, song_name, _ in new_songs]
+    names.extend(new_names)
+    durations.update((song_name, duration) for _, song_name, duration in new_songs)
+    if new_songs:
+        last_song_id = new_songs[-1][0]
+    elif not names:
+        last_song_id = 0
+    return last_song_id, new_names, reloaded
@@ -0,0 +1,129 @@
+import bisect
+from array import array
+
+PREFIX_QUERY_LENGTH = 3  # Shorter words of a query are looked up without trigrams
+
+
+def get_trigrams(text):
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+def normalize(text):
+    """Returns the text in lowercase with single spaces between its words, the form the index compares."""
+    return " ".join(text.lower().split())
+
+
+class SearchIndex:
+    """
+    An in-memory index for type-ahead search over song names.
+
+    The index is built over words: every distinct word keeps the positions of the songs it occurs in, and a
+    trigram index over the distinct words finds the words that contain a part of the query. Song names share
+    most of their words, so adding a song rarely touches the trigram index. A query of one word shorter than three
+    characters is compared with every distinct word instead, which are far fewer than the songs. A short word
+    after a space of the query has to start a word of the song, so it is looked up by bisection in a sorted word
+    list. The songs found for every word of the query are intersected before their text is compared with the
+    whole query.
+
+    Songs are identified by their position, in the order they were added, so the positions match the songs list
+    they were added from.
+    """
+
+    def __init__(self):
+        self.texts = []  # Lowercase searchable text of every song
+        self.postings = {}  # Word -> positions of the songs that contain it
+        self.trigrams = {}  # Trigram -> words that contain it
+        self.words = []  # Sorted distinct words
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, texts):
+        """
+        Adds songs to the index.
+
+        Args:
+            texts (Iterable[str]): The searchable text of every song, e.g. the song name.
+        """
+        new_words = []
+        for text in texts:
+            position = len(self.texts)
+            text = normalize(text)
+            self.texts.append(text)
+            for word in set(text.split()):
+                postings = self.postings.get(word)
+                if postings is None:
+                    postings = self.postings[word] = array("I")
+                    new_words.append(word)
+                    for trigram in get_trigrams(word):
+                        self.trigrams.setdefault(trigram, set()).add(word)
+                postings.append(position)
+
+        if len(new_words) > len(self.words) // 100:
+            self.words.extend(new_words)
+            self.words.sort()
+        else:
+            for word in new_words:
+                bisect.insort(self.words, word)
+
+    def search(self, query):
+        """
+        Finds the songs whose text contains `query`, ignoring case.
+
+        Args:
+            query (str): The text typed into the search box.
+
+        Returns:
+            list[int]: The positions of the matching songs in ascending order. An empty query matches all songs.
+        """
+        query = normalize(query)
+        tokens = query.split()
+        if not query:
+            return list(range(len(self.texts)))
+
+        if len(tokens) == 1 and len(query) < PREFIX_QUERY_LENGTH:
+            return sorted(self.__find_positions(word for word in self.words if query in word))
+
+        # Words of the query narrow down the songs: long words by the words that contain them, short words by the
+        # words they start. The first word may end in the middle of a word of the song, so it is only used when it
+        # is long enough for the trigram index.
+        positions = None
+        for index, token in enumerate(tokens):
+            if len(token) >= PREFIX_QUERY_LENGTH:
+                words = self.__find_words_containing(token)
+            elif index > 0:
+                words = self.__find_words_by_prefix(token)
+            else:
+                continue
+            found = self.__find_positions(words)
+            positions = found if positions is None else positions & found
+            if not positions:
+                return []
+        if positions is None:
+            positions = range(len(self.texts))
+        if len(tokens) > 1:  # Check that the words follow each other like in the query
+            return sorted(position for position in positions if query in self.texts[position])
+        return sorted(positions)
+
+    def __find_positions(self, words):
+        positions = set()
+        for word in words:
+            positions.update(self.postings[word])
+        return positions
+
+    def __find_words_containing(self, part):
+        words = None
+        for trigram in sorted(get_trigrams(part), key=lambda trigram: len(self.trigrams.get(trigram, ()))):
+            containing = self.trigrams.get(trigram)
+            if not containing:
+                return []
+            words = set(containing) if words is None else words & containing
+        return [word for word in words if part in word]
+
+    def __find_words_by_prefix(self, prefix):
+        index = bisect.bisect_left(self.words, prefix)
+        words = []
+        while index < len(self.words) and self.words[index].startswith(prefix):
+            words.append(self.words[index])
+            index += 1
+        return words
@@ -0,0 +1,163 @@
+import os
+import wave
+import threading
+
+import numpy as np
+
+import pcm
+import wav_reader
+
+STEMS = ("bass", "drums", "vocals", "other")
+
+
+def get_stem_paths(name):
+    """
+    Returns the paths of the stem files of a song, in the order of `STEMS`.
+
+    Args:
+        name (str): The song name.
+
+    Returns:
+        list[str]: The paths `../Audio/<name>/<stem>.wav`.
+    """
+    song_folder = os.path.join("..", "Audio", name)
+    return [os.path.join(song_folder, stem + ".wav") for stem in STEMS]
+
+
+def has_stems(name):
+    return all(os.path.isfile(path) for path in get_stem_paths(name))
+
+
+class StemSong:
+    """
+    The stems of a song, read together as one song.
+
+    `readframes` returns the frames of all stems interleaved, i.e. every frame holds one frame of each stem in the
+    order of `STEMS`. The stems are mixed by `StemMixer` in the audio callback, so gain changes are heard within
+    one period.
+
+    Args:
+        name (str): The song name.
+
+    Raises:
+        wave.Error: If a stem is not a valid WAV file or the stems have different formats.
+    """
+
+    def __init__(self, name):
+        self.stems = []
+        try:
+            for path in get_stem_paths(name):
+                self.stems.append(wav_reader.open(path))
+            formats = {(stem.getsampwidth(), stem.getnchannels(), stem.getframerate()) for stem in self.stems}
+            if len(formats) != 1:
+                raise wave.Error(f"the stems of {name} have different formats")
+        except BaseException:
+            self.close()
+            raise
+        self.frame_size = self.stems[0].frame_size
+        self.nframes = min(stem.getnframes() for stem in self.stems)  # Stems may differ by a few padding frames
+
+    def getnchannels(self):
+        return self.stems[0].getnchannels()
+
+    def getsampwidth(self):
+        return self.stems[0].getsampwidth()
+
+    def getframerate(self):
+        return self.stems[0].getframerate()
+
+    def getnstems(self):
+        return len(self.stems)
+
+    def getnframes(self):
+        return self.nframes
+
+    def tell(self):
+        return self.stems[0].tell()
+
+    def setpos(self, pos):
+        if pos > self.nframes:
+            raise wave.Error("position not in range")
+        for stem in self.stems:
+            stem.setpos(pos)
+
+    def rewind(self):
+        self.setpos(0)
+
+    def readframes(self, nframes):
+        """
+        Returns the next `nframes` frames of all stems, interleaved frame by frame.
+
+        Args:
+            nframes (int): The number of frames to read.
+
+        Returns:
+            memoryview: The interleaved PCM data, shorter than requested at the end of the song.
+        """
+        nframes = max(min(nframes, self.nframes - self.tell()), 0)
+        block = np.empty((nframes, len(self.stems), self.frame_size), dtype=np.uint8)
+        for index, stem in enumerate(self.stems):
+            block[:, index, :] = np.frombuffer(stem.readframes(nframes), dtype=np.uint8).reshape(nframes, self.frame_size)
+        return memoryview(block.reshape(-1))
+
+    def close(self):
+        for stem in self.stems:
+            stem.close()
+
+
+class StemMixer:
+    """
+    Mixes interleaved stem frames with a gain per stem.
+
+    The gains are read once per block, and a change is ramped linearly over the block, so moving a slider is
+    heard in the next period without clicks.
+
+    Args:
+        stems (int, optional): The number of stems.
+    """
+
+    def __init__(self, stems=len(STEMS)):
+        self.gains = np.ones(stems, dtype=np.float32)
+        self.muted = np.zeros(stems, dtype=bool)
+        self.applied = self.gains.copy()  # The gains at the end of the last mixed block
+        self.lock = threading.Lock()
+
+    def set_gain(self, stem, gain):
+        """
+        Args:
+            stem (str): The stem name, one of `STEMS`.
+            gain (float): The linear gain, 1.0 keeps the stem as it is.
+        """
+        with self.lock:
+            self.gains[STEMS.index(stem)] = gain
+
+    def set_muted(self, stem, muted):
+        with self.lock:
+            self.muted[STEMS.index(stem)] = muted
+
+    def is_muted(self, stem):
+        return bool(self.muted[STEMS.index(stem)])
+
+    def mix(self, data, sample_width, channels):
+        """
+        Mixes one block of interleaved stems.
+
+        Args:
+            data (bytes | memoryview): The frames returned by `StemSong.readframes`.
+            sample_width (int): The sample width in bytes.
+            channels (int): The number of channels of every stem.
+
+        Returns:
+            bytes: The mixed PCM data.
+        """
+        with self.lock:
+            target = np.where(self.muted, 0.0, self.gains).astype(np.float32)
+        samples = pcm.to_float(data, sample_width).reshape(-1, len(target), channels)
+
+        if np.array_equal(target, self.applied):
+            mixed = np.einsum("fsc,s->fc", samples, target)
+        else:
+            ramp = np.linspace(self.applied, target, len(samples), dtype=np.float32)
+            mixed = np.einsum("fsc,fs->fc", samples, ramp)
+            self.applied = target
+        return pcm.from_float(mixed, sample_width)
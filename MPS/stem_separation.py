@@ -0,0 +1,189 @@
+import os
+import queue
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import stem_mixer
+import audio_conversion
+
+MODEL = "htdemucs"  # Demucs model used for the separation
+THREADS_PER_JOB = 4  # Torch threads of one separation, the pool runs cpu_count / THREADS_PER_JOB jobs at once
+
+
+def get_center_frame(center_frame):
+    """
+    Sets the global variable `frame` to the provided `center_frame`, which shows the separation progress.
+
+    Args:
+        center_frame (ctk.CTkFrame): An instance of the `CenterFrame` class.
+    """
+    global frame
+    frame = center_frame
+
+
+def separate_song(name):
+    """
+    Separates a song into bass, drums, vocals and other stems next to its stored file.
+
+    This function runs inside a worker process of the separation pool. The stems are written to temporary files
+    first and renamed at the end, so a crash never leaves a complete-looking set of broken stems behind.
+
+    Args:
+        name (str): The song name.
+
+    Returns:
+        str: The name of the separated song.
+
+    Raises:
+        RuntimeError: If Demucs is not installed.
+    """
+    stem_paths = stem_mixer.get_stem_paths(name)
+    if all(os.path.isfile(path) for path in stem_paths):
+        return name  # Cached
+
+    try:
+        import torch
+        import demucs.separate
+    except ImportError:
+        raise RuntimeError("stem separation needs the demucs package")
+    torch.set_num_threads(THREADS_PER_JOB)
+
+    song_path = audio_conversion.get_stored_path(os.path.join(audio_folder, name, name))
+    with tempfile.TemporaryDirectory() as output_folder:
+        demucs.separate.main(["-n", MODEL, "-d", "cpu", "-o", output_folder, song_path])
+        result_folder = os.path.join(output_folder, MODEL, name)
+        for stem, path in zip(stem_mixer.STEMS, stem_paths):
+            shutil.move(os.path.join(result_folder, stem + ".wav"), path + ".part")
+    for path in stem_paths:
+        os.replace(path + ".part", path)
+    return name
+
+
+def load_queue():
+    """
+    Loads the songs waiting for separation from the queue file.
+
+    Returns:
+        list[str]: The song names, in the order they were queued.
+    """
+    if not os.path.exists(queue_path):
+        return []
+    with open(queue_path, "r") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def save_queue():
+    """
+    Writes the waiting songs to the queue file. The file is replaced as a whole, so a crash while writing keeps
+    the previous queue.
+    """
+    if not os.path.isdir(audio_folder):
+        return
+    with open(queue_path + ".tmp", "w") as file:
+        file.writelines(name + "\n" for name in pending)
+    os.replace(queue_path + ".tmp", queue_path)
+
+
+def get_executor():
+    """
+    Returns the process pool used for separating songs, creating it on first use.
+
+    Returns:
+        ProcessPoolExecutor: A pool that runs as many separations at once as there are groups of
+            `THREADS_PER_JOB` cores.
+    """
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=max(1, os.cpu_count() // THREADS_PER_JOB))
+    return executor
+
+
+def separate_songs(names):
+    """
+    Queues songs for stem separation. Songs that already have stems or are already queued are skipped.
+
+    The queue is saved to disk before the jobs start, so songs that were not separated yet are picked up again
+    by `resume` after a restart or a crash.
+
+    Args:
+        names (Iterable[str]): The song names.
+    """
+    global total
+    names = [name for name in names if name not in pending and not stem_mixer.has_stems(name)]
+    if not names:
+        return
+    pending.extend(names)
+    save_queue()
+
+    if not futures:
+        frame.after(POLL_INTERVAL, poll)
+    for name in names:
+        future = get_executor().submit(separate_song, name)
+        future.song_name = name
+        future.add_done_callback(results.put)  # Runs in the pool's thread, so only hand it over
+        futures.append(future)
+    total += len(names)
+    frame.show_separation_progress(done, total)
+
+
+def resume():
+    """Starts the separations that were queued in a previous session."""
+    names = load_queue()
+    if names:
+        print(f"Resuming stem separation of {len(names)} songs")
+        separate_songs(names)
+
+
+def cancel_all():
+    """Cancels the separations that have not been started yet and clears the queue."""
+    for future in futures:
+        future.cancel()
+    pending.clear()
+    save_queue()
+
+
+def poll():
+    """
+    Collects finished separations, updates the queue file and the progress, and reschedules itself until the
+    queue is empty.
+    """
+    global done, total
+    changed = False
+    while True:
+        try:
+            future = results.get_nowait()
+        except queue.Empty:
+            break
+        done += 1
+        futures.remove(future)
+        if future.song_name in pending:
+            pending.remove(future.song_name)
+            changed = True
+        if future.cancelled():
+            continue
+        error = future.exception()
+        if error is not None:
+            print(f"Error occurred while separating {future.song_name}: {error}")
+        else:
+            print(f"Separated song: {future.song_name}")
+    if changed:
+        save_queue()
+
+    if futures:
+        frame.show_separation_progress(done, total)
+        frame.after(POLL_INTERVAL, poll)
+    else:
+        done = total = 0
+        frame.hide_separation_progress()
+
+
+audio_folder = os.path.join("..", "Audio")
+queue_path = os.path.join(audio_folder, "separation_queue.txt")
+pending = []  # Songs waiting for separation, the same as in the queue file
+futures = []
+results = queue.Queue()
+executor = None
+done = 0
+total = 0
+POLL_INTERVAL = 500  # Milliseconds between checks for finished separations
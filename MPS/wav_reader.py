@@ -0,0 +1,156 @@
+import mmap
+import wave
+import struct
+import builtins
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+PAGE_SIZE = mmap.PAGESIZE
+
+
+class MappedWave:
+    """
+    A WAV reader that memory-maps the file instead of copying every chunk into a new bytes object.
+
+    `readframes` returns `memoryview` slices of the mapped PCM data, and seeking only moves an index, so any frame
+    of the song can be reached in O(1). The interface matches `wave.Wave_read`, so the reader can be used
+    wherever an opened `wave` file is expected.
+
+    Args:
+        path (str): The path to the WAV file.
+
+    Raises:
+        wave.Error: If the file is not a PCM WAV file.
+    """
+
+    def __init__(self, path):
+        self.file = builtins.open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__parse_header()
+        except (ValueError, struct.error) as e:  # mmap of an empty file or a truncated header
+            self.file.close()
+            raise wave.Error(f"{path} is not a valid WAV file: {e}")
+        except BaseException:
+            self.file.close()
+            raise
+        self.view = memoryview(self.map)[self.data_offset:self.data_offset + self.data_size]
+        self.position = 0
+
+    def __parse_header(self):
+        """
+        Finds the format and data chunks of the RIFF file.
+        """
+        riff, _, wave_id = struct.unpack_from("<4sI4s", self.map, 0)
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise wave.Error("file does not start with RIFF id")
+
+        fmt = None
+        offset = 12
+        while offset + 8 <= len(self.map):
+            chunk_id, chunk_size = struct.unpack_from("<4sI", self.map, offset)
+            offset += 8
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack_from("<HHIIHH", self.map, offset)
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE:
+                    fmt = (struct.unpack_from("<H", self.map, offset + 24)[0],) + fmt[1:]
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise wave.Error("data chunk before fmt chunk")
+                self.data_offset = offset
+                self.data_size = min(chunk_size, len(self.map) - offset)  # Streamed files may carry a bogus size
+                break
+            offset += chunk_size + (chunk_size & 1)  # Chunks are aligned to two bytes
+        else:
+            raise wave.Error("data chunk is missing")
+
+        audio_format, self.nchannels, self.framerate, _, block_align, bits = fmt
+        if audio_format != WAVE_FORMAT_PCM:
+            raise wave.Error(f"unknown format: {audio_format}")
+        self.sampwidth = (bits + 7) // 8
+        self.frame_size = block_align
+        self.data_size -= self.data_size % self.frame_size  # Ignore a trailing partial frame
+
+    def getnchannels(self):
+        return self.nchannels
+
+    def getsampwidth(self):
+        return self.sampwidth
+
+    def getframerate(self):
+        return self.framerate
+
+    def getnstems(self):
+        return 1
+
+    def getnframes(self):
+        return self.data_size // self.frame_size
+
+    def tell(self):
+        return self.position
+
+    def setpos(self, pos):
+        """
+        Moves the read position to the given frame.
+
+        Args:
+            pos (int): The frame to read next.
+
+        Raises:
+            wave.Error: If the position is outside the song.
+        """
+        if pos < 0 or pos > self.getnframes():
+            raise wave.Error("position not in range")
+        self.position = pos
+
+    def rewind(self):
+        self.position = 0
+
+    def readframes(self, nframes):
+        """
+        Returns the next `nframes` frames without copying them.
+
+        One byte of every page is touched, so the page faults happen in the thread that reads ahead and not in the
+        audio callback that plays the data later.
+
+        Args:
+            nframes (int): The number of frames to read.
+
+        Returns:
+            memoryview: A read-only view of the PCM data, shorter than requested at the end of the song.
+        """
+        start = self.position * self.frame_size
+        data = self.view[start:start + nframes * self.frame_size]
+        self.position += len(data) // self.frame_size
+        data[::PAGE_SIZE].tobytes()
+        return data
+
+    def close(self):
+        """
+        Closes the file. If slices of the song are still in use, the mapping is closed when they are released.
+        """
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open(path):
+    """
+    Opens a WAV file for reading through a memory map.
+
+    Args:
+        path (str): The path to the WAV file.
+
+    Returns:
+        MappedWave: The opened file.
+    """
+    return MappedWave(path)
@@ -0,0 +1,205 @@
+import os
+import zipfile
+import builtins
+
+import numpy as np
+
+import pcm
+
+PEAKS_EXTENSION = ".peaks"
+BUCKET_FRAMES = 1024  # Frames per peak of the finest level
+LEVEL_FACTOR = 8  # Buckets of a level merged into one bucket of the next level
+MIN_LEVEL_BUCKETS = 256  # No coarser level is built once a level has fewer buckets
+READ_FRAMES = 65536  # Frames read at once when the peaks of an imported song are built afterwards
+
+
+def get_peaks_path(song_path):
+    """
+    Returns the path of the peak file that belongs to a stored song.
+
+    Args:
+        song_path (str): The path to the WAV or FLAC file of the song.
+
+    Returns:
+        str: The path `<name>.peaks` in the folder of the song.
+    """
+    return os.path.splitext(song_path)[0] + PEAKS_EXTENSION
+
+
+class PeakBuilder:
+    """
+    Computes the waveform overview of a song from its PCM data, block by block.
+
+    Every bucket of `BUCKET_FRAMES` frames is reduced to its minimum and maximum sample over all channels. Coarser
+    levels merge `LEVEL_FACTOR` buckets of the level below, so drawing the overview only reduces the level that is
+    closest to the width in pixels. The peaks are stored as 8-bit values, about 6 KB per minute of audio.
+
+    Args:
+        sample_width (int): The sample width in bytes.
+        channels (int): The number of channels.
+    """
+
+    def __init__(self, sample_width, channels):
+        self.sample_width = sample_width
+        self.channels = channels
+        self.frame_size = sample_width * channels
+        self.pending = np.empty((0, channels), dtype=np.float32)  # Frames of the unfinished bucket
+        self.mins = []
+        self.maxs = []
+        self.frames = 0
+
+    def add(self, data):
+        """
+        Adds the next block of interleaved PCM data.
+
+        Args:
+            data (bytes | memoryview): The PCM data. A trailing partial frame is ignored.
+        """
+        data = data[:len(data) - len(data) % self.frame_size]
+        samples = pcm.to_float(data, self.sample_width).reshape(-1, self.channels)
+        self.frames += len(samples)
+        if len(self.pending):
+            samples = np.concatenate((self.pending, samples))
+        full = len(samples) - len(samples) % BUCKET_FRAMES
+        buckets = samples[:full].reshape(-1, BUCKET_FRAMES * self.channels)
+        self.mins.append(buckets.min(axis=1))
+        self.maxs.append(buckets.max(axis=1))
+        self.pending = samples[full:].copy()
+
+    def save(self, path, sample_rate):
+        """
+        Writes the peaks of all levels to a peak file.
+
+        Args:
+            path (str): The path to the peak file.
+            sample_rate (int): The sample rate of the song.
+        """
+        mins, maxs = self.mins, self.maxs
+        if len(self.pending):
+            mins = mins + [np.array([self.pending.min()])]
+            maxs = maxs + [np.array([self.pending.max()])]
+        mins = np.concatenate(mins) if mins else np.zeros(1, dtype=np.float32)
+        maxs = np.concatenate(maxs) if maxs else np.zeros(1, dtype=np.float32)
+
+        levels = {}
+        level = 0
+        while True:
+            levels[f"min_{level}"] = quantize(mins)
+            levels[f"max_{level}"] = quantize(maxs)
+            if len(mins) < MIN_LEVEL_BUCKETS:
+                break
+            mins = merge(mins, np.min)
+            maxs = merge(maxs, np.max)
+            level += 1
+        with builtins.open(path, "wb") as file:
+            np.savez(file, frames=self.frames, sample_rate=sample_rate, levels=level + 1, **levels)
+
+
+def quantize(peaks):
+    return np.rint(np.clip(peaks, -1.0, 1.0) * 127).astype(np.int8)
+
+
+def merge(peaks, reduce):
+    """
+    Merges every `LEVEL_FACTOR` buckets into one. The last bucket is repeated to fill the last group.
+    """
+    padding = -len(peaks) % LEVEL_FACTOR
+    if padding:
+        peaks = np.concatenate((peaks, np.repeat(peaks[-1:], padding)))
+    return reduce(peaks.reshape(-1, LEVEL_FACTOR), axis=1)
+
+
+class Peaks:
+    """
+    The waveform overview of a song, loaded from its peak file.
+
+    Args:
+        path (str): The path to the peak file.
+
+    Raises:
+        OSError: If the file could not be read.
+        ValueError: If the file is not a peak file.
+    """
+
+    def __init__(self, path):
+        with builtins.open(path, "rb") as file:
+            try:
+                data = np.load(file)
+                self.frames = int(data["frames"])
+                self.sample_rate = int(data["sample_rate"])
+                self.levels = [(data[f"min_{level}"], data[f"max_{level}"]) for level in range(int(data["levels"]))]
+            except (KeyError, EOFError, zipfile.BadZipFile) as e:
+                raise ValueError(f"{path} is not a valid peak file: {e}")
+
+    def get_columns(self, width):
+        """
+        Reduces the peaks to one minimum and maximum per pixel column.
+
+        The coarsest level with at least `width` buckets is reduced, so the work does not depend on the length of
+        the song.
+
+        Args:
+            width (int): The number of columns.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: The minimum and maximum of every column in the range [-1, 1].
+        """
+        mins, maxs = self.levels[0]
+        for level_mins, level_maxs in reversed(self.levels):
+            if len(level_mins) >= width:
+                mins, maxs = level_mins, level_maxs
+                break
+
+        if len(mins) >= width:
+            starts = np.linspace(0, len(mins), width, endpoint=False).astype(np.intp)
+            mins = np.minimum.reduceat(mins, starts)
+            maxs = np.maximum.reduceat(maxs, starts)
+        else:  # A short song, every bucket spans several columns
+            indices = np.arange(width) * len(mins) // width
+            mins, maxs = mins[indices], maxs[indices]
+        return mins / np.float32(127), maxs / np.float32(127)
+
+
+def load(song_path):
+    """
+    Loads the waveform overview of a stored song.
+
+    Args:
+        song_path (str): The path to the WAV or FLAC file of the song.
+
+    Returns:
+        Peaks | None: The overview, or None if the song has no peak file yet.
+    """
+    try:
+        return Peaks(get_peaks_path(song_path))
+    except FileNotFoundError:
+        return None
+
+
+def build(song_path):
+    """
+    Builds the peak file of a song that was imported before the peaks were computed at import.
+
+    Args:
+        song_path (str): The path to the WAV or FLAC file of the song.
+
+    Returns:
+        Peaks: The overview.
+    """
+    import wav_reader
+    import flac_reader  # Imported here, because flac_reader imports audio_conversion, which imports this module
+
+    reader = flac_reader.open(song_path) if song_path.endswith(".flac") else wav_reader.open(song_path)
+    try:
+        builder = PeakBuilder(reader.getsampwidth(), reader.getnchannels())
+        while True:
+            data = reader.readframes(READ_FRAMES)
+            if not data:
+                break
+            builder.add(data)
+    finally:
+        reader.close()
+    peaks_path = get_peaks_path(song_path)
+    builder.save(peaks_path + ".part", reader.getframerate())
+    os.replace(peaks_path + ".part", peaks_path)
+    return Peaks(peaks_path)
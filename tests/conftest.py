@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The modules of the app import each other by their plain names, like when it is started from MPS
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "MPS"))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "performance: checks the time, CPU time or memory of a path against a budget, "
+                                       "deselect with -m 'not performance'")
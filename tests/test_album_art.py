@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+import album_art
+
+
+def write_covers(song_folder, color):
+    song_folder.mkdir()
+    for size in album_art.THUMBNAIL_SIZES:
+        Image.new("RGB", (size, size), color).save(album_art.get_thumbnail_path(str(song_folder), size), quality=90)
+    return str(song_folder)
+
+
+def test_thumbnails_are_decoded_once(tmp_path):
+    cache = album_art.ThumbnailCache()
+    song_folder = write_covers(tmp_path / "song", (200, 0, 0))
+    image = cache.get(song_folder, 40)
+    assert image.size == (40, 40)
+    assert image.getpixel((20, 20))[0] > 150
+    assert cache.get(song_folder, 40) is image
+    assert cache.get(song_folder, 225).size == (225, 225)
+    assert cache.size == 40 * 40 * 3 + 225 * 225 * 3
+
+
+def test_songs_without_cover_are_cached_as_none(tmp_path):
+    cache = album_art.ThumbnailCache()
+    (tmp_path / "song").mkdir()
+    assert cache.get(str(tmp_path / "song"), 40) is None
+    write_covers(tmp_path / "other", (0, 0, 0))
+    (tmp_path / "other" / "cover_40.jpg").replace(tmp_path / "song" / "cover_40.jpg")
+    assert cache.get(str(tmp_path / "song"), 40) is None  # Until the cache is cleared
+    assert cache.size == 0
+    cache.clear()
+    assert cache.get(str(tmp_path / "song"), 40) is not None
+
+
+def test_least_recently_used_thumbnails_are_evicted(tmp_path):
+    cache = album_art.ThumbnailCache(limit=2 * 40 * 40 * 3)
+    folders = [write_covers(tmp_path / f"song{index}", (index * 50, 0, 0)) for index in range(3)]
+    first = cache.get(folders[0], 40)
+    cache.get(folders[1], 40)
+    assert cache.get(folders[0], 40) is first  # Used last, so the second song is evicted next
+    cache.get(folders[2], 40)
+    assert list(cache.images) == [(folders[0], 40), (folders[2], 40)]
+    assert cache.size == 2 * 40 * 40 * 3
+
+    cache.get(folders[0], 225)  # Larger than the limit, kept alone
+    assert list(cache.images) == [(folders[0], 225)]
+    cache.clear()
+    assert cache.size == 0 and not cache.images
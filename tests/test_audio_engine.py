@@ -0,0 +1,104 @@
+import threading
+import wave
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyaudio")  # The engine uses the status flags of PyAudio, the capturing output needs no device
+
+import dsp
+import wav_reader
+from audio_engine import AudioEngine, CaptureOutput
+
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+
+
+def write_song(path, nframes, value):
+    """Writes a song in which every sample is `value`, so silence in the output can only come from a gap."""
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(44100)
+        wav_file.writeframes(value.to_bytes(SAMPLE_WIDTH, "little", signed=True) * CHANNELS * nframes)
+    return path
+
+
+def play_queue(paths, frames_per_buffer, buffer_periods=8, dsp_chain=None, gains=None, normalize=False):
+    """
+    Plays songs one after another, each queued while the one before plays, and returns the captured audio. The
+    songs are loaded with `gains`, which are applied while `normalize` is set.
+    """
+    output = CaptureOutput()
+    finished = threading.Event()
+    engine = AudioEngine(output, frames_per_buffer, buffer_periods, on_finished=finished.set, dsp_chain=dsp_chain)
+    engine.normalize = normalize
+    gains = gains or [1.0] * len(paths)
+    songs = [wav_reader.open(str(path)) for path in paths]
+    try:
+        engine.load(songs[0], gains[0])
+        for song, gain in zip(songs[1:], gains[1:]):
+            engine.queue_next(song, gain)
+        engine.play()
+        assert finished.wait(10)
+        engine.stop()
+    finally:
+        for song in songs:
+            song.close()
+    return bytes(output.captured)
+
+
+@pytest.mark.parametrize("frames_per_buffer", [256, 512, 1000, 1024, 4096])
+def test_no_gap_between_queued_songs(tmp_path, frames_per_buffer):
+    # Neither length is a multiple of the period, so the track change falls inside a chunk
+    first = write_song(tmp_path / "first.wav", 44100 + 123, 1000)
+    second = write_song(tmp_path / "second.wav", 44100 + 77, 2000)
+    frame_size = SAMPLE_WIDTH * CHANNELS
+
+    captured = play_queue([first, second], frames_per_buffer)
+    expected = (1000).to_bytes(2, "little", signed=True) * CHANNELS * (44100 + 123) + \
+        (2000).to_bytes(2, "little", signed=True) * CHANNELS * (44100 + 77)
+    assert captured[:len(expected)] == expected  # A gap of 0 frames: the second song starts on the next frame
+    assert captured[len(expected):] == bytes(len(captured) - len(expected))  # The last period is padded
+    assert len(captured) % (frames_per_buffer * frame_size) == 0
+
+
+@pytest.mark.parametrize("frames_per_buffer", [256, 1000, 4096])
+def test_dsp_chain_plays_every_frame(tmp_path, frames_per_buffer):
+    first = write_song(tmp_path / "first.wav", 44100 + 123, 1000)
+    second = write_song(tmp_path / "second.wav", 44100 + 77, 2000)
+    nframes = 2 * 44100 + 200
+
+    # A flat chain adds no latency, so the audio is the same as without it
+    flat = play_queue([first, second], frames_per_buffer, dsp_chain=dsp.DspChain())
+    assert flat == play_queue([first, second], frames_per_buffer)
+
+    # An equalizer that barely changes the audio delays it, and the end of the queue is still played
+    dsp_chain = dsp.DspChain()
+    dsp_chain.equalizer.set_bands([("peak", 1000, 0.01, 1.0)])
+    captured = np.frombuffer(play_queue([first, second], frames_per_buffer, dsp_chain=dsp_chain),
+                             dtype=np.int16).reshape(-1, CHANNELS)
+    latency = dsp.EQ_TAPS // 2
+    assert len(captured) >= nframes + latency
+    assert len(captured) % frames_per_buffer == 0
+    end = latency + nframes
+    np.testing.assert_allclose(captured[end - 44100:end - 100], 2000, atol=2)
+    assert not captured[end + 100:].any()
+
+
+@pytest.mark.parametrize("frames_per_buffer", [256, 1000])
+def test_songs_are_played_at_their_loudness_gain(tmp_path, frames_per_buffer):
+    first = write_song(tmp_path / "first.wav", 44100 + 123, 1000)
+    second = write_song(tmp_path / "second.wav", 44100 + 77, 4000)
+    nframes = 2 * 44100 + 200
+
+    captured = np.frombuffer(play_queue([first, second], frames_per_buffer, gains=[2.0, 0.5], normalize=True),
+                             dtype=np.int16).reshape(-1, CHANNELS)
+    # Every song starts at its own gain, also right after the seam inside a chunk
+    assert (captured[:44100 + 123] == 2000).all()
+    assert (captured[44100 + 123:nframes] == 2000).all()
+    assert not captured[nframes:].any()
+
+    # The gains are ignored while normalization is off
+    assert play_queue([first, second], frames_per_buffer, gains=[2.0, 0.5]) == \
+        play_queue([first, second], frames_per_buffer)
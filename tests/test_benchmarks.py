@@ -0,0 +1,184 @@
+"""
+Performance checks of the import, library and playback paths, run headless on synthetic libraries.
+
+Every check fails if its path takes longer than its budget in `BUDGETS`. With pytest-benchmark installed the timed
+run is recorded in its statistics too, so `--benchmark-autosave` and `--benchmark-compare` track the numbers over
+time. Deselect the checks with `-m "not performance"`.
+"""
+import os
+import time
+import wave
+import subprocess
+import tracemalloc
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyaudio")
+pytest.importorskip("PIL")
+
+import audio_conversion
+import file_operations
+import folder_scan
+import headless
+import song_library
+
+pytestmark = pytest.mark.performance
+
+# Budgets of the checked paths, several times what they take on a laptop, so that only regressions fail
+BUDGETS = {
+    "songs_list_load_s": {1000: 0.05, 10000: 0.25, 100000: 1.5},
+    "songs_list_refresh_s": 0.1,  # 100 new songs, whatever the size of the library
+    "songs_list_load_mb": 64,  # Memory allocated while loading 100,000 songs
+    "rescan_s": {1000: 0.5, 10000: 3.0},  # A folder without changes
+    "playback_cpu_s_per_h": 120,  # CPU time per hour of audio, with the equalizer on
+    "import_files_per_s": 0.5
+}
+SOURCE_FORMATS = {  # Name -> extension and ffmpeg encoder arguments of the synthetic source files
+    "wav16": ("wav", ["-c:a", "pcm_s16le"]),
+    "wav24": ("wav", ["-c:a", "pcm_s24le"]),
+    "flac": ("flac", ["-c:a", "flac"]),
+    "mp3": ("mp3", ["-c:a", "libmp3lame", "-b:a", "192k"])
+}
+SOURCE_SECONDS = (5, 20, 60)  # Lengths of the synthetic source files, used in turn
+
+
+def run_timed(request, function, *args):
+    """
+    Runs `function` once and returns its result and the time it took, recorded by pytest-benchmark if installed.
+    """
+    if request.config.pluginmanager.hasplugin("benchmark"):
+        benchmark = request.getfixturevalue("benchmark")
+        result = benchmark.pedantic(function, args, rounds=1, iterations=1)
+        return result, benchmark.stats.stats.max
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+@pytest.fixture
+def app_folder(tmp_path, monkeypatch):
+    """Makes `<tmp_path>/MPS` the working directory, so the library is created in `<tmp_path>/Audio`."""
+    (tmp_path / "MPS").mkdir()
+    monkeypatch.chdir(tmp_path / "MPS")
+    monkeypatch.setattr(file_operations, "library", None)
+    monkeypatch.setattr(headless, "frame", None)
+    yield tmp_path
+    file_operations.get_library().close()
+
+
+def add_songs(count, prefix="Song"):
+    empty = (None,) * (len(song_library.COLUMNS) - 1)
+    file_operations.get_library().add_songs((f"{prefix} {index}",) + empty for index in range(count))
+
+
+@pytest.mark.parametrize("songs", [1000, 10000, 100000])
+def test_songs_list_load(request, app_folder, songs):
+    add_songs(songs)
+    listed, seconds = run_timed(request, headless.refresh_library)
+    assert listed == songs
+    assert seconds < BUDGETS["songs_list_load_s"][songs]
+
+
+@pytest.mark.parametrize("songs", [1000, 100000])
+def test_songs_list_refresh(request, app_folder, songs):
+    add_songs(songs)
+    headless.refresh_library()
+    add_songs(100, "New song")
+    listed, seconds = run_timed(request, headless.refresh_library)
+    assert listed == songs + 100
+    assert seconds < BUDGETS["songs_list_refresh_s"]
+
+
+def test_songs_list_memory(app_folder):
+    add_songs(100000)
+    tracemalloc.start()
+    try:
+        headless.refresh_library()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < BUDGETS["songs_list_load_mb"] * 2 ** 20
+
+
+@pytest.mark.parametrize("files", [1000, 10000])
+def test_rescan_without_changes(request, app_folder, files):
+    folder = app_folder / "Music"
+    folder.mkdir()
+    for index in range(files):
+        (folder / f"song {index}.mp3").write_bytes(b"")
+    folder_path = os.path.normcase(os.path.abspath(folder))
+    file_operations.get_library().update_manifest(folder_path, folder_scan.scan(folder_path), ())
+
+    songs, seconds = run_timed(request, headless.import_folder, str(folder))
+    assert songs == 0  # Nothing was imported again
+    assert file_operations.import_job is None
+    assert seconds < BUDGETS["rescan_s"][files]
+
+
+@pytest.mark.parametrize("preset", ["Flat", "Loudness"])
+def test_playback_cpu(app_folder, preset):
+    rate, seconds = 44100, 60
+    song_folder = app_folder / "Audio" / "Noise"
+    song_folder.mkdir(parents=True)
+    samples = np.random.default_rng(1).integers(-8000, 8000, (rate * seconds, 2), dtype=np.int16)
+    with wave.open(str(song_folder / "Noise.wav"), "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.tobytes())
+    song = dict.fromkeys(song_library.COLUMNS)
+    song.update(name="Noise", duration=seconds, sample_rate=rate, channels=2, sample_width=2, loudness=-20.0,
+                peak=0.25)
+    library = file_operations.get_library()
+    library.add_songs([tuple(song[column] for column in song_library.COLUMNS)])
+    library.set_setting("equalizer", preset)
+    library.set_setting("normalize", "1")
+
+    result = headless.render("Noise")
+    assert result["frames"] == rate * seconds
+    assert result["cpu_seconds"] / result["seconds"] * 3600 < BUDGETS["playback_cpu_s_per_h"]
+
+
+def has_ffmpeg():
+    try:
+        subprocess.run([audio_conversion.FFMPEG_PATH, "-version"], capture_output=True, check=True,
+                       creationflags=audio_conversion.CREATION_FLAGS)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+def make_sources(folder, files):
+    """
+    Writes `files` synthetic source files per format of `SOURCE_FORMATS`, of every length of `SOURCE_SECONDS` in
+    turn. Every file has its own tone, so no file is a duplicate of another.
+    """
+    for format_index, (name, (extension, codec)) in enumerate(SOURCE_FORMATS.items()):
+        for index in range(files):
+            frequency = 110 + format_index * files + index
+            subprocess.run([audio_conversion.FFMPEG_PATH, "-v", "error", "-y",
+                            "-f", "lavfi", "-i",
+                            f"sine=frequency={frequency}:sample_rate=44100:"
+                            f"duration={SOURCE_SECONDS[index % len(SOURCE_SECONDS)]}",
+                            "-ac", "2", *codec, str(folder / f"{name} {index}.{extension}")],
+                           check=True, creationflags=audio_conversion.CREATION_FLAGS)
+
+
+@pytest.mark.skipif(not has_ffmpeg(), reason="ffmpeg next to the app cannot run here")
+@pytest.mark.parametrize("storage_format", audio_conversion.STORAGE_FORMATS)
+def test_import_throughput(request, app_folder, storage_format):
+    files = 3
+    folder = app_folder / "Music"
+    folder.mkdir()
+    make_sources(folder, files)
+    file_operations.set_storage_format(storage_format)
+    try:
+        songs, seconds = run_timed(request, headless.import_folder, str(folder))
+        assert songs == files * len(SOURCE_FORMATS)
+        assert songs / seconds > BUDGETS["import_files_per_s"]
+        assert headless.import_folder(str(folder)) == songs  # A rescan imports nothing again
+    finally:
+        if file_operations.executor is not None:
+            file_operations.executor.shutdown()
+            file_operations.executor = None
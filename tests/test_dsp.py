@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import dsp
+
+RATE = 44100
+
+
+def process_in_blocks(equalizer, samples, sizes, bands_at=None):
+    """Processes samples in blocks of the given sizes, setting bands before the blocks in `bands_at`."""
+    bands_at = bands_at or {}
+    blocks = []
+    start = 0
+    for index, size in enumerate(sizes):
+        if index in bands_at:
+            equalizer.set_bands(bands_at[index])
+        blocks.append(equalizer.process(samples[start:start + size], RATE))
+        start += size
+    return np.concatenate(blocks)
+
+
+def delay(samples, frames):
+    return np.concatenate((np.zeros((frames, samples.shape[1]), dtype=np.float32), samples[:-frames]))
+
+
+@pytest.mark.parametrize("size", [64, 1000, 1024, 5000])
+def test_history_keeps_the_last_frames(size):
+    rng = np.random.default_rng(1)
+    samples = rng.uniform(-1, 1, (20000, 2)).astype(np.float32)
+    history = dsp.History(2047, 2)
+    for start in range(0, len(samples), size):
+        history.write(samples[start:start + size])
+        end = min(start + size, len(samples))
+        expected = samples[max(0, end - 2047):end]
+        np.testing.assert_array_equal(history.read(2047)[2047 - len(expected):], expected)
+        np.testing.assert_array_equal(history.read(100)[100 - min(100, end):], expected[-100:])
+
+
+def test_flat_equalizer_adds_no_latency():
+    rng = np.random.default_rng(2)
+    samples = rng.uniform(-0.5, 0.5, (RATE, 2)).astype(np.float32)
+    sizes = [512] * (len(samples) // 512)
+    expected = delay(samples, dsp.EQ_TAPS // 2)[:512 * len(sizes)]
+
+    np.testing.assert_array_equal(process_in_blocks(dsp.Equalizer(), samples, sizes), samples[:512 * len(sizes)])
+
+    # A filter that barely changes the audio gives the same audio, `taps // 2` frames late
+    quiet_peak = [("peak", 1000, 0.01, 1.0)]
+    filtered = process_in_blocks(dsp.Equalizer(), samples, sizes, {1: quiet_peak})
+    np.testing.assert_allclose(filtered[1024:], expected[1024:], atol=2e-3)
+
+
+def test_turning_the_equalizer_off_keeps_the_timeline():
+    rng = np.random.default_rng(3)
+    samples = rng.uniform(-0.5, 0.5, (RATE, 2)).astype(np.float32)
+    sizes = [441] * (len(samples) // 441)
+    expected = delay(samples, dsp.EQ_TAPS // 2)[:441 * len(sizes)]
+    equalizer = dsp.Equalizer()
+
+    output = process_in_blocks(equalizer, samples, sizes,
+                               {10: dsp.EQ_PRESETS["Bass Boost"], 40: dsp.EQ_PRESETS["Flat"]})
+
+    np.testing.assert_array_equal(output[:441 * 10], samples[:441 * 10])
+    assert not np.allclose(output[441 * 11:441 * 40], expected[441 * 11:441 * 40], atol=1e-2)
+    np.testing.assert_allclose(output[441 * 41:], expected[441 * 41:], atol=1e-6)
+    assert equalizer.delaying
+
+    equalizer.reset()
+    assert not equalizer.delaying
+    np.testing.assert_array_equal(equalizer.process(samples[:441], RATE), samples[:441])
+
+
+def test_chain_latency_and_reset():
+    chain = dsp.DspChain()
+    loud = np.full(4096 * 2, 20000, dtype=np.int16).tobytes()
+    assert chain.process(loud, 2, 2, RATE) == loud
+    assert chain.get_latency(RATE) == 0.0
+
+    chain.equalizer.set_bands(dsp.EQ_PRESETS["Bass Boost"])
+    chain.process(loud, 2, 2, RATE)
+    assert chain.get_latency(RATE) == dsp.EQ_TAPS // 2 / RATE
+
+    chain.equalizer.set_bands(dsp.EQ_PRESETS["Flat"])
+    chain.process(loud, 2, 2, RATE)
+    chain.reset()
+    silence = bytes(4096 * 2 * 2)
+    assert chain.process(silence, 2, 2, RATE) == silence
+    assert chain.get_latency(RATE) == 0.0
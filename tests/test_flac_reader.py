@@ -0,0 +1,154 @@
+import subprocess
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+import audio_conversion
+import flac_reader
+
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+RATE = 44100
+
+# Stands in for ffmpeg: decodes `<name>.flac` by writing the PCM data of `<name>.wav` from the requested position,
+# and records every start in `<name>.starts`
+FAKE_DECODER = """
+import os
+import sys
+import wave
+
+arguments = sys.argv[1:]
+start = float(arguments[arguments.index("-ss") + 1]) if "-ss" in arguments else 0.0
+path = os.path.splitext(arguments[arguments.index("-i") + 1])[0]
+with open(path + ".starts", "a") as starts:
+    starts.write(f"{start}\\n")
+with wave.open(path + ".wav", "rb") as wav_file:
+    wav_file.setpos(round(start * wav_file.getframerate()))
+    try:
+        while True:
+            data = wav_file.readframes(4096)
+            if not data:
+                break
+            sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    except (BrokenPipeError, OSError):  # The reader stopped the decoder
+        pass
+"""
+
+
+def has_ffmpeg():
+    try:
+        subprocess.run([audio_conversion.FFMPEG_PATH, "-version"], capture_output=True, check=True,
+                       creationflags=audio_conversion.CREATION_FLAGS)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+def make_header(framerate, channels, bits, nframes):
+    """Returns the signature and the STREAMINFO block of a FLAC file."""
+    fields = framerate << 44 | (channels - 1) << 41 | (bits - 1) << 36 | nframes
+    streaminfo = bytes(10) + fields.to_bytes(8, "big") + bytes(16)
+    return b"fLaC" + bytes([0]) + len(streaminfo).to_bytes(3, "big") + streaminfo
+
+
+def write_wav(path, nframes):
+    """Writes a song in which every frame holds its own number, so any misplaced frame shows."""
+    samples = np.repeat(np.arange(nframes, dtype=np.int64) % 65536 - 32768, CHANNELS).astype(np.int16)
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(RATE)
+        wav_file.writeframes(samples.tobytes())
+    return samples.tobytes()
+
+
+@pytest.fixture
+def fake_flac(tmp_path, monkeypatch):
+    """Writes a FLAC header for a WAV song and decodes it with `FAKE_DECODER` instead of ffmpeg."""
+    decoder = tmp_path / "decoder.py"
+    decoder.write_text(FAKE_DECODER)
+    popen = subprocess.Popen
+    monkeypatch.setattr(flac_reader.subprocess, "Popen",
+                        lambda command, **kwargs: popen([sys.executable, str(decoder)] + command[1:], **kwargs))
+
+    def make(nframes):
+        pcm_data = write_wav(tmp_path / "song.wav", nframes)
+        (tmp_path / "song.flac").write_bytes(make_header(RATE, CHANNELS, 16, nframes))
+        return str(tmp_path / "song.flac"), pcm_data, lambda: (tmp_path / "song.starts").read_text().split()
+
+    return make
+
+
+def test_streaminfo_gives_the_format_and_length(tmp_path):
+    path = tmp_path / "song.flac"
+    path.write_bytes(make_header(96000, 6, 24, 2 ** 35 + 5))
+    reader = flac_reader.open(str(path))
+    assert (reader.getframerate(), reader.getnchannels(), reader.getsampwidth()) == (96000, 6, 3)
+    assert reader.getnframes() == 2 ** 35 + 5
+    reader.close()  # No decoder was started
+
+
+@pytest.mark.parametrize("header", [b"RIFF" + bytes(38), b"fLaC" + bytes(10), make_header(0, 2, 16, 100)])
+def test_invalid_files_are_rejected(tmp_path, header):
+    path = tmp_path / "song.flac"
+    path.write_bytes(header)
+    with pytest.raises(wave.Error):
+        flac_reader.open(str(path))
+
+
+def test_reads_the_frames_of_the_wav(fake_flac):
+    path, pcm_data, get_starts = fake_flac(50000)
+    reader = flac_reader.open(path)
+    try:
+        blocks = []
+        while True:
+            data = reader.readframes(4097)  # Blocks that do not end on the chunks of the decoder
+            if not data:
+                break
+            assert len(data) % (CHANNELS * SAMPLE_WIDTH) == 0
+            blocks.append(data)
+        assert b"".join(blocks) == pcm_data
+        assert reader.tell() == reader.getnframes() == 50000
+        assert get_starts() == ["0.0"]
+    finally:
+        reader.close()
+
+
+def test_going_back_after_prefetching_keeps_the_decoder(fake_flac):
+    path, pcm_data, get_starts = fake_flac(50000)
+    frame_size = CHANNELS * SAMPLE_WIDTH
+    reader = flac_reader.open(path)
+    try:
+        assert reader.readframes(1000) == pcm_data[:1000 * frame_size]
+        reader.rewind()  # Like the engine does for the queued song
+        assert reader.readframes(3000) == pcm_data[:3000 * frame_size]
+        reader.setpos(3000)
+        assert reader.readframes(10) == pcm_data[3000 * frame_size:3010 * frame_size]
+        assert get_starts() == ["0.0"]
+
+        reader.setpos(40000)  # Not decoded yet, so the decoder is started again at the new position
+        assert reader.readframes(20000) == pcm_data[40000 * frame_size:]
+        assert len(get_starts()) == 2
+        with pytest.raises(wave.Error):
+            reader.setpos(50001)
+    finally:
+        reader.close()
+
+
+@pytest.mark.skipif(not has_ffmpeg(), reason="ffmpeg next to the app cannot run here")
+def test_decodes_a_flac_like_the_wav_it_was_encoded_from(tmp_path):
+    pcm_data = write_wav(tmp_path / "song.wav", 44100 * 3 + 17)
+    audio_conversion.write_flac([pcm_data], str(tmp_path / "song.flac"), SAMPLE_WIDTH, CHANNELS, RATE)
+    reader = flac_reader.open(str(tmp_path / "song.flac"))
+    try:
+        assert reader.getnframes() == 44100 * 3 + 17
+        data = reader.readframes(reader.getnframes() + 1000)
+        assert data == pcm_data
+        reader.setpos(44100)
+        frame_size = CHANNELS * SAMPLE_WIDTH
+        assert reader.readframes(100) == pcm_data[44100 * frame_size:44200 * frame_size]
+    finally:
+        reader.close()
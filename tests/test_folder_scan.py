@@ -0,0 +1,39 @@
+import os
+
+import folder_scan
+
+
+def test_compare():
+    manifest = {"a": (1, 1.0, 1), "b": (2, 2.0, 2), "c": (3, 3.0, 3)}
+    files = {"a": (1, 1.0, 1), "b": (2, 2.5, 2), "d": (4, 4.0, 4)}
+    assert folder_scan.compare(manifest, files) == (["d"], ["b"], ["c"])
+
+
+def test_compare_accepts_rows_from_the_library():
+    # The library returns the metadata as lists or tuples, either compares equal to the scan
+    assert folder_scan.compare({"a": [1, 1.0, 1]}, {"a": (1, 1.0, 1)}) == ([], [], [])
+
+
+def test_compare_first_scan():
+    assert folder_scan.compare({}, {"a": (1, 1.0, 1)}) == (["a"], [], [])
+
+
+def test_scan_finds_files_in_subfolders(tmp_path):
+    (tmp_path / "album" / "disc 2").mkdir(parents=True)
+    paths = [tmp_path / "single.mp3", tmp_path / "album" / "one.flac", tmp_path / "album" / "disc 2" / "two.wav"]
+    for index, path in enumerate(paths):
+        path.write_bytes(b"x" * index)
+
+    files = folder_scan.scan(str(tmp_path))
+    assert sorted(files) == sorted(str(path) for path in paths)
+    for path in paths:
+        stat = os.stat(path)
+        assert files[str(path)][:2] == (stat.st_size, stat.st_mtime)
+
+
+def test_is_audio_file():
+    assert folder_scan.is_audio_file("/music/album/01 Intro.MP3")
+    assert folder_scan.is_audio_file("song.flac")
+    assert not folder_scan.is_audio_file("/music/album/cover.jpg")
+    assert not folder_scan.is_audio_file("/music/album/album.cue")
+    assert not folder_scan.is_audio_file("/music/album/README")
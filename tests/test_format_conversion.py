@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+import format_conversion
+import pcm
+
+
+def resample_at_once(samples, input_rate, output_rate):
+    resampler = format_conversion.Resampler(input_rate, output_rate, samples.shape[1])
+    return np.concatenate((resampler.process(samples), resampler.flush()))
+
+
+@pytest.mark.parametrize("input_rate, output_rate", [(44100, 48000), (48000, 44100), (96000, 44100), (22050, 48000)])
+def test_streaming_matches_whole_song(input_rate, output_rate):
+    rng = np.random.default_rng(1)
+    samples = rng.uniform(-0.5, 0.5, (input_rate // 3, 2)).astype(np.float32)
+    expected = resample_at_once(samples, input_rate, output_rate)
+
+    resampler = format_conversion.Resampler(input_rate, output_rate, 2)
+    blocks = []
+    start = 0
+    while start < len(samples):
+        size = int(rng.integers(1, 3000))
+        blocks.append(resampler.process(samples[start:start + size]))
+        start += size
+    blocks.append(resampler.flush())
+
+    assert len(expected) == -(-len(samples) * output_rate // input_rate)
+    np.testing.assert_allclose(np.concatenate(blocks), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("input_rate, output_rate", [(44100, 48000), (48000, 44100)])
+def test_sine_keeps_its_frequency_and_level(input_rate, output_rate):
+    frequency = 1000
+    samples = 0.5 * np.sin(2 * np.pi * frequency * np.arange(input_rate) / input_rate)[:, None].astype(np.float32)
+    output = resample_at_once(samples, input_rate, output_rate)[1000:-1000, 0]
+
+    times = (np.arange(len(output)) + 1000) / output_rate
+    expected = 0.5 * np.sin(2 * np.pi * frequency * times)
+    noise = np.mean((output - expected) ** 2)
+    assert 10 * np.log10(np.mean(expected ** 2) / noise) > 70
+
+
+def test_channel_matrix():
+    assert format_conversion.get_channel_matrix(2, 2) is None
+    np.testing.assert_allclose(format_conversion.get_channel_matrix(1, 2), [[1.0, 1.0]])
+    np.testing.assert_allclose(format_conversion.get_channel_matrix(2, 1), [[0.5], [0.5]])
+    # Every 5.1 channel at full scale and in phase does not clip the stereo mix
+    assert np.ones(6) @ format_conversion.get_channel_matrix(6, 2) == pytest.approx([1.0, 1.0], abs=1e-6)
+
+
+class FakeSong:
+    """A song in memory with the interface of `wav_reader.MappedWave`."""
+
+    def __init__(self, samples, rate):
+        self.data = pcm.from_float(samples, 2)
+        self.channels = samples.shape[1]
+        self.rate = rate
+        self.position = 0
+
+    def getsampwidth(self):
+        return 2
+
+    def getnchannels(self):
+        return self.channels
+
+    def getframerate(self):
+        return self.rate
+
+    def getnstems(self):
+        return 1
+
+    def getnframes(self):
+        return len(self.data) // (2 * self.channels)
+
+    def setpos(self, pos):
+        self.position = pos
+
+    def readframes(self, nframes):
+        frame_size = 2 * self.channels
+        data = self.data[self.position * frame_size:(self.position + nframes) * frame_size]
+        self.position += len(data) // frame_size
+        return data
+
+    def close(self):
+        pass
+
+
+def test_converted_song_reads_every_frame():
+    source = FakeSong(np.full((44100, 1), 0.25, dtype=np.float32), 44100)
+    song = format_conversion.to_format(source, 2, 2, 48000)
+    assert song.getnframes() == 48000
+
+    data = b"".join(iter(lambda: song.readframes(1000), b""))
+    samples = pcm.to_float(data, 2).reshape(-1, 2)
+    assert len(samples) == song.getnframes() == song.tell()
+    np.testing.assert_allclose(samples[100:-100], 0.25, atol=1e-3)
+
+    song.setpos(24000)
+    assert len(song.readframes(48000)) == 24000 * 4
+
+
+def test_same_format_is_not_converted():
+    source = FakeSong(np.zeros((10, 2), dtype=np.float32), 48000)
+    assert format_conversion.to_format(source, 2, 2, 48000) is source
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import loudness
+import pcm
+
+RATE = 48000
+
+
+def measure(samples):
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    meter = loudness.LoudnessMeter(2, samples.shape[1], RATE)
+    data = pcm.from_float(samples, 2)
+    for start in range(0, len(data), 12345 * 2 * samples.shape[1]):  # Blocks that do not end on segments
+        meter.add(data[start:start + 12345 * 2 * samples.shape[1]])
+    return meter
+
+
+def sine(amplitude, seconds, frequency=1000):
+    return amplitude * np.sin(2 * np.pi * frequency * np.arange(int(seconds * RATE)) / RATE)
+
+
+def test_sine_reads_its_reference_level():
+    # A 1 kHz sine in one channel reads 3.01 dB below its peak level in dBFS
+    assert measure(sine(0.1, 5)).get_loudness() == pytest.approx(-23.01, abs=0.1)
+    stereo = np.stack((sine(0.1, 5), sine(0.1, 5)), axis=1)
+    assert measure(stereo).get_loudness() == pytest.approx(-20.0, abs=0.1)
+
+
+def test_silence_has_no_loudness():
+    assert measure(np.zeros(RATE)).get_loudness() is None
+    assert measure(np.zeros(0)).get_loudness() is None
+
+
+# The gating blocks that overlap the end of a tone are partly quiet, so the gating tests use tones long enough for
+# those few blocks not to matter
+def test_absolute_gate_ignores_silence():
+    tone = sine(0.1, 30)
+    assert measure(np.concatenate((tone, np.zeros(10 * RATE)))).get_loudness() == \
+        pytest.approx(measure(tone).get_loudness(), abs=0.05)
+
+
+def test_relative_gate_ignores_quiet_passages():
+    loud = sine(0.1, 30)
+    much_quieter = sine(0.1 * 10 ** (-30 / 20), 30)
+    slightly_quieter = sine(0.1 * 10 ** (-5 / 20), 30)
+    reference = measure(loud).get_loudness()
+    assert measure(np.concatenate((loud, much_quieter))).get_loudness() == pytest.approx(reference, abs=0.1)
+    assert measure(np.concatenate((loud, slightly_quieter))).get_loudness() < reference - 1
+
+
+def test_peak():
+    assert measure(sine(0.5, 1)).peak == pytest.approx(0.5, abs=1e-3)
+
+
+def test_gain_does_not_clip():
+    assert loudness.get_gain(None, 0.5) == 1.0
+    assert loudness.get_gain(loudness.TARGET_LOUDNESS - 6, 0.1) == pytest.approx(10 ** (6 / 20))
+    assert loudness.get_gain(loudness.TARGET_LOUDNESS - 20, 0.5) == pytest.approx(2.0)
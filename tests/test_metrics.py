@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+
+import pytest
+
+import metrics
+
+
+def read_log(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_spans_are_logged_and_summed(tmp_path):
+    path = tmp_path / "Logs" / "metrics.jsonl"
+    log = metrics.Metrics(str(path))
+    with log.span("track.load", song="a") as fields:
+        fields["frames"] = 10
+    log.record("playback.click_to_audio", 0.25, song="a")
+    log.add("playback.decode", 0.5, 30.0)
+    log.add("playback.decode", 1.5, 90.0)
+    log.count("import.songs", 3)
+    log.add_gauge("engine.underruns", lambda: 2)
+    log.add_gauge("broken", lambda: 1 / 0)
+
+    summary = log.get_summary()
+    assert summary["timings"]["playback.decode"] == {"count": 2, "total_ms": 2000.0, "mean_ms": 1000.0,
+                                                      "max_ms": 1500.0, "amount": 120.0, "per_second": 60.0}
+    assert summary["timings"]["playback.click_to_audio"]["max_ms"] == 250.0
+    assert summary["counters"] == {"import.songs": 3}
+    assert summary["gauges"]["engine.underruns"] == 2
+    assert summary["gauges"]["broken"].startswith("error:")
+    log.close()
+
+    events = read_log(path)
+    assert [event["event"] for event in events] == ["span", "span", "summary"]  # Timings from `add` are not logged
+    assert events[0]["name"] == "track.load" and events[0]["song"] == "a" and events[0]["frames"] == 10
+    assert events[1] == {"time": events[1]["time"], "event": "span", "name": "playback.click_to_audio", "ms": 250.0,
+                         "song": "a"}
+    assert events[2]["counters"] == {"import.songs": 3}
+
+
+def test_span_is_recorded_when_the_block_fails():
+    log = metrics.Metrics(None)
+    with pytest.raises(ValueError):
+        with log.span("track.load"):
+            raise ValueError
+    assert log.get_summary()["timings"]["track.load"]["count"] == 1
+    log.close()  # Nothing is written without a path
+    assert log.writer is None
+
+
+def test_a_large_log_is_moved_aside(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "LOG_LIMIT", 10)
+    path = tmp_path / "metrics.jsonl"
+    path.write_text('{"event": "old"}\n' * 2)
+    log = metrics.Metrics(str(path))
+    log.log("started")
+    log.close()
+    assert read_log(str(path) + ".1") == [{"event": "old"}] * 2
+    assert [event["event"] for event in read_log(path)] == ["started", "summary"]
+
+
+def test_sampler_collects_the_stacks_of_a_thread(tmp_path):
+    stop = threading.Event()
+
+    def busy_waiting():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=busy_waiting)
+    thread.start()
+    sampler = metrics.Sampler(thread.ident, interval=0.001)
+    sampler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while sampler.samples < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        sampler.stop()
+        stop.set()
+        thread.join()
+
+    assert sampler.samples >= 20
+    sampler.save(str(tmp_path / "profile.txt"))
+    lines = (tmp_path / "profile.txt").read_text().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == sampler.samples
+    assert all(":busy_waiting:" in line for line in lines)
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+import play_order
+
+
+@pytest.mark.parametrize("size", [1, 2, 10, 1000])
+def test_lazy_permutation_is_a_permutation(size):
+    permutation = play_order.LazyPermutation(size, random.Random(size), first=size - 1)
+    values = [permutation[position] for position in range(size)]
+    assert values[0] == size - 1
+    assert sorted(values) == list(range(size))
+
+
+def test_lazy_permutation_does_not_change_drawn_positions():
+    permutation = play_order.LazyPermutation(100, random.Random(0))
+    ahead = permutation[10]
+    assert [permutation[position] for position in range(11)][10] == ahead
+
+
+def make_order(names, shuffle=False, repeat="off"):
+    order = play_order.PlayOrder(seed=0)
+    order.set_queue(names)
+    order.set_shuffle(shuffle)
+    order.set_repeat(repeat)
+    return order
+
+
+def test_in_order_stops_at_the_end():
+    order = make_order(["a", "b", "c"])
+    order.jump("a")
+    assert [order.advance(), order.advance(), order.advance()] == ["b", "c", None]
+    assert order.current == "c"
+    assert order.go_back() == "b"
+
+
+def test_repeat_all_starts_again():
+    order = make_order(["a", "b"], repeat="all")
+    order.jump("b")
+    assert order.advance() == "a"
+    assert order.go_back() == "b"
+
+
+def test_repeat_one_repeats_only_finished_songs():
+    order = make_order(["a", "b"], repeat="one")
+    order.jump("a")
+    assert order.advance(finished=True) == "a"
+    assert order.advance() == "b"
+
+
+def test_shuffle_plays_every_song_once_per_round():
+    names = [f"song{index}" for index in range(50)]
+    order = make_order(names, shuffle=True, repeat="all")
+    order.jump(names[0])
+    played = [order.current] + [order.advance(finished=True) for _ in range(3 * len(names) - 1)]
+    for start in range(0, len(played), len(names)):
+        assert sorted(played[start:start + len(names)]) == sorted(names)
+    assert all(first != second for first, second in zip(played, played[1:]))
+
+
+def test_shuffle_peek_matches_advance():
+    order = make_order([str(index) for index in range(20)], shuffle=True, repeat="all")
+    order.jump("0")
+    for _ in range(45):
+        assert order.peek_next() == order.advance()
+
+
+def test_shuffle_goes_back_through_the_history_and_forward_again():
+    order = make_order([str(index) for index in range(20)], shuffle=True)
+    order.jump("0")
+    played = ["0"] + [order.advance() for _ in range(5)]
+    assert [order.go_back() for _ in range(3)] == played[-2:-5:-1]
+    assert [order.advance() for _ in range(3)] == played[-3:]
+
+
+def test_shuffle_without_repeat_ends_after_one_round():
+    order = make_order(["a", "b", "c"], shuffle=True)
+    order.jump("b")
+    assert sorted(["b", order.advance(), order.advance()]) == ["a", "b", "c"]
+    assert order.advance() is None
+
+
+def test_unknown_repeat_mode():
+    with pytest.raises(ValueError):
+        play_order.PlayOrder().set_repeat("twice")
@@ -0,0 +1,259 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("pyaudio")
+pytest.importorskip("PIL")  # Imported through file_operations
+
+import metrics
+import music_controls
+
+
+class FakeSong:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def getframerate(self):
+        return 44100
+
+    def getnframes(self):
+        return 44100 * 10
+
+    def readframes(self, frames):
+        return b""
+
+    def rewind(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEngine:
+    """Stands in for `AudioEngine`: records the calls of the player and lets a test fire the engine callbacks."""
+
+    def __init__(self, output, on_finished=None, on_track_changed=None, on_first_audio=None, **kwargs):
+        self.on_finished = on_finished
+        self.on_track_changed = on_track_changed
+        self.on_first_audio = on_first_audio
+        self.underruns = 0
+        self.calls = []
+        self.loaded = None
+        self.queued = None
+        self.accepts_queued = True  # False to act like a queued song of another format
+
+    def load(self, source, gain=1.0):
+        self.calls.append(("load", source.name))
+        self.loaded = source
+        self.queued = None
+
+    def queue_next(self, source, gain=1.0):
+        if source is not None and not self.accepts_queued:
+            return False
+        self.queued = source
+        return True
+
+    def is_reading(self, source):
+        return source is self.loaded
+
+    def play(self):
+        self.calls.append(("play",))
+
+    def pause(self):
+        self.calls.append(("pause",))
+
+    def seek(self, frame):
+        self.calls.append(("seek", frame))
+
+    def stop(self):
+        self.calls.append(("stop",))
+
+
+class FakeOutput:
+    def __init__(self, pyaudio_instance):
+        pass
+
+    def get_device_format(self, sample_width):
+        return None  # Songs are played in their own format
+
+
+class FakePyAudio:
+    def terminate(self):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def songs(monkeypatch):
+    """Opens fake songs instead of song files. Opening a song named in `blocked` waits until it is released."""
+    opened = {}
+    blocked = {}
+
+    def open_song(name):
+        if name in blocked:
+            blocked[name].wait(5)
+        if name == "broken":
+            raise OSError("unreadable")
+        song = FakeSong(name)
+        opened.setdefault(name, []).append(song)
+        return song
+
+    monkeypatch.setattr(music_controls, "open_song", open_song)
+    monkeypatch.setattr(music_controls, "get_song_gain", lambda name: 1.0)
+    return opened, blocked
+
+
+@pytest.fixture
+def player(monkeypatch, songs):
+    monkeypatch.setattr(music_controls.pyaudio, "PyAudio", FakePyAudio)
+    monkeypatch.setattr(music_controls, "PyAudioOutput", FakeOutput)
+    monkeypatch.setattr(music_controls, "AudioEngine", FakeEngine)
+    monkeypatch.setattr(metrics.metrics, "path", None)
+    player = music_controls.Player(mixer=None, dsp_chain=None)
+    player.set_queue(["a", "b", "c"])
+    player.start()
+    wait_for(lambda: player.engine is not None)
+    yield player
+    player.close()
+
+
+def get_statuses(player):
+    statuses = []
+    while not player.events.empty():
+        statuses.append(player.events.get()[0])
+    return statuses
+
+
+def test_transitions_lead_to_known_statuses():
+    for status, targets in music_controls.TRANSITIONS.items():
+        assert status not in targets
+        assert set(targets) <= set(music_controls.TRANSITIONS)
+    assert music_controls.TRANSITIONS["empty"] == ("loading",)
+
+
+def test_load_and_play(player):
+    player.load("a")
+    wait_for(lambda: player.status == "paused")
+    assert player.song_name == "a"
+    assert player.engine.calls == [("load", "a")]
+
+    player.play()
+    wait_for(lambda: player.status == "playing")
+    player.seek(2.0)
+    player.toggle()
+    wait_for(lambda: player.status == "paused")
+    assert player.engine.calls[1:] == [("play",), ("seek", 88200), ("pause",)]
+
+    statuses = ["empty"] + get_statuses(player)
+    assert statuses == ["empty", "loading", "paused", "playing", "paused"]
+    for previous, status in zip(statuses, statuses[1:]):
+        assert status in music_controls.TRANSITIONS[previous]
+
+
+def test_play_during_load_starts_the_song(player):
+    player.load("a")
+    player.play()
+    wait_for(lambda: player.status == "playing")
+    assert player.engine.calls == [("load", "a"), ("play",)]
+
+
+def test_stale_load_is_dropped(player, songs):
+    opened, blocked = songs
+    blocked["a"] = threading.Event()
+    player.load("a")
+    wait_for(lambda: player.status == "loading")
+    player.load("b")
+    wait_for(lambda: player.song_name == "b")
+    blocked["a"].set()
+    wait_for(lambda: "a" in opened and opened["a"][0].closed)  # Closed by its loader thread
+    assert player.song_name == "b"
+    assert ("load", "a") not in player.engine.calls
+
+
+def test_failed_load_keeps_the_song(player):
+    player.load("a")
+    wait_for(lambda: player.status == "paused")
+    get_statuses(player)
+    player.load("broken")
+    statuses = []
+    wait_for(lambda: statuses.extend(get_statuses(player)) or statuses[-1:] == ["paused"])
+    assert statuses == ["loading", "paused"]
+    assert player.song_name == "a"
+    assert player.engine.calls == [("load", "a")]
+
+
+def test_next_song_is_prefetched_and_played_gaplessly(player, songs):
+    opened, _ = songs
+    player.load("a")
+    player.play()
+    wait_for(lambda: player.engine.queued is not None)
+    assert player.engine.queued.name == "b"
+
+    song_a, song_b = player.song, player.engine.queued
+    player.engine.loaded = song_b  # The feeder moved on to the queued song
+    player.engine.on_track_changed(song_b)
+    wait_for(lambda: player.song_name == "b")
+    assert player.song is song_b
+    assert player.status == "playing"
+    wait_for(lambda: song_a.closed)
+    wait_for(lambda: player.engine.queued is not None and player.engine.queued.name == "c")
+    assert ("load", "b") not in player.engine.calls  # Played from the queue, not loaded again
+
+
+def test_next_uses_the_prefetched_song(player, songs):
+    opened, _ = songs
+    player.load("a")
+    wait_for(lambda: player.engine.queued is not None)
+    player.next()
+    wait_for(lambda: player.song_name == "b")
+    assert opened["b"] == [player.song]  # Not opened a second time
+
+
+def test_finished_queue_pauses(player):
+    player.set_queue(["a"])
+    player.load("a")
+    player.play()
+    wait_for(lambda: player.status == "playing")
+    player.engine.on_finished()
+    wait_for(lambda: player.status == "paused")
+    assert player.song_name == "a"
+
+
+def test_finished_loads_a_song_that_could_not_be_queued(player):
+    player.engine.accepts_queued = False
+    player.load("a")
+    player.play()
+    wait_for(lambda: player.status == "playing" and player.prefetched is not None)
+    player.engine.on_finished()
+    wait_for(lambda: player.song_name == "b" and player.status == "playing")
+    assert player.engine.calls[-2:] == [("load", "b"), ("play",)]
+
+
+def test_unload_closes_every_song(player):
+    player.load("a")
+    player.play()
+    wait_for(lambda: player.prefetched is not None)
+    song, prefetched = player.song, player.prefetched[0]
+    player.unload()
+    assert player.status == "empty"
+    assert song.closed and prefetched.closed
+    assert player.song is None and player.prefetched is None
+
+
+def test_click_to_audio_is_recorded(player, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(metrics, "record", lambda name, seconds, *args, **fields: recorded.append((name, fields)))
+    player.load("a")
+    player.play()
+    wait_for(lambda: player.status == "playing")
+    player.engine.on_first_audio()
+    wait_for(lambda: recorded)
+    assert recorded == [("playback.click_to_audio", {"song": "a"})]
@@ -0,0 +1,66 @@
+import sqlite3
+
+import song_library
+
+
+def make_song(name, duration):
+    song = dict.fromkeys(song_library.COLUMNS)
+    song.update(name=name, duration=duration)
+    return tuple(song[column] for column in song_library.COLUMNS)
+
+
+def test_update_song_list_reads_only_new_songs(tmp_path):
+    library = song_library.SongLibrary(str(tmp_path / "library.db"))
+    names, durations = [], {}
+    assert song_library.update_song_list(library, names, durations, 0) == (0, [], False)
+
+    library.add_songs([make_song("a", 1.0), make_song("b", 2.0)])
+    last_song_id, new_names, reloaded = song_library.update_song_list(library, names, durations, 0)
+    assert (new_names, reloaded) == (["a", "b"], False)
+    library.add_songs([make_song("c", None)])
+    last_song_id, new_names, reloaded = song_library.update_song_list(library, names, durations, last_song_id)
+    assert (new_names, reloaded) == (["c"], False)
+    assert names == ["a", "b", "c"]
+    assert durations == {"a": 1.0, "b": 2.0, "c": None}
+    library.close()
+
+
+def test_update_song_list_reloads_when_songs_were_removed(tmp_path):
+    names, durations = ["old", "older"], {"old": 1.0, "older": 2.0}
+    library = song_library.SongLibrary(str(tmp_path / "library.db"))
+    library.add_songs([make_song("new", 3.0)])
+    last_song_id, new_names, reloaded = song_library.update_song_list(library, names, durations, 7)
+    assert (new_names, reloaded) == (["new"], True)
+    assert (names, durations) == (["new"], {"new": 3.0})
+    library.close()
+
+
+def test_lookups_in_batches(tmp_path):
+    library = song_library.SongLibrary(str(tmp_path / "library.db"))
+    songs = [make_song(f"song{index}", 1.0) for index in range(song_library.QUERY_CHUNK + 10)]
+    library.add_songs(songs)
+    names = [f"song{index}" for index in range(song_library.QUERY_CHUNK + 10)]
+    assert library.find_unfingerprinted(names + ["missing"]) == set(names)
+
+    library.cache_file_hashes([("/a", 1, 1.0, "fa", None), ("/b", 2, 2.0, "fb", "hb")])
+    assert library.get_file_hashes([("/a", 1, 1.0), ("/b", 2, 3.0), ("/c", 1, 1.0)]) == {"/a": ("fa", None)}
+    library.close()
+
+
+def test_old_database_loses_the_content_hash(tmp_path):
+    path = str(tmp_path / "library.db")
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE songs (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, source_path TEXT, duration REAL,
+                            sample_rate INTEGER, channels INTEGER, content_hash TEXT, imported_at REAL NOT NULL);
+        CREATE INDEX songs_content_hash ON songs (content_hash);
+        INSERT INTO songs (name, duration, content_hash, imported_at) VALUES ('old', 1.0, 'abc', 0);
+    """)
+    connection.close()
+
+    library = song_library.SongLibrary(path)
+    library.add_songs([make_song("new", 2.0)])
+    assert library.get_names() == ["old", "new"]
+    if sqlite3.sqlite_version_info >= (3, 35):
+        assert "content_hash" not in library.get_song("old")
+    library.close()
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+import song_search
+
+WORDS = ["love", "night", "the", "a", "of", "blue", "moon", "dance", "remix", "live", "2019", "feat", "lo-fi"]
+
+
+def find_slowly(texts, query):
+    """What `SearchIndex.search` finds, by comparing the query with every text."""
+    texts = [" ".join(text.lower().split()) for text in texts]
+    query = " ".join(query.lower().split())
+    return [position for position, text in enumerate(texts) if query in text]
+
+
+@pytest.fixture
+def texts():
+    rng = random.Random(0)
+    return [" ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 5))) for _ in range(2000)]
+
+
+@pytest.mark.parametrize("query", ["", "lo", "l", "oo", "9", "-", "moon", "OON", "blue moon", "e mo", "night of the",
+                                   "remix 2019", "  Dance   Live ", "xyz", "lo-fi", "ove nig"])
+def test_search_matches_a_linear_scan(texts, query):
+    index = song_search.SearchIndex()
+    index.add(texts[:500])
+    index.add(texts[500:])  # Added in two parts like the imports of a songs list
+    assert index.search(query) == find_slowly(texts, query)
+
+
+def test_empty_index():
+    index = song_search.SearchIndex()
+    assert len(index) == 0
+    assert index.search("love") == []
+    assert index.search("") == []
@@ -0,0 +1,95 @@
+import wave
+
+import numpy as np
+import pytest
+
+import stem_mixer
+
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+
+
+def write_stem(path, samples):
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(44100)
+        wav_file.writeframes(np.repeat(np.asarray(samples, dtype=np.int16), CHANNELS).tobytes())
+
+
+@pytest.fixture
+def song_folder(tmp_path, monkeypatch):
+    """Runs the test from an app folder, so the stems of the song "song" are found in `../Audio/song`."""
+    (tmp_path / "MPS").mkdir()
+    folder = tmp_path / "Audio" / "song"
+    folder.mkdir(parents=True)
+    monkeypatch.chdir(tmp_path / "MPS")
+    return folder
+
+
+def mix(mixer, frames):
+    """Mixes constant stems, 1000 for the first stem, 2000 for the second and so on, and returns one channel."""
+    stems = np.arange(1, len(stem_mixer.STEMS) + 1, dtype=np.int16) * 1000
+    data = np.repeat(np.tile(stems, (frames, 1)), CHANNELS, axis=1).tobytes()
+    mixed = np.frombuffer(mixer.mix(data, SAMPLE_WIDTH, CHANNELS), dtype=np.int16).reshape(-1, CHANNELS)
+    assert (mixed[:, 0] == mixed[:, 1]).all()
+    return mixed[:, 0]
+
+
+def test_stems_are_read_interleaved_up_to_the_shortest(song_folder):
+    lengths = [1000, 1003, 1001, 1002]  # Stems may differ by a few padding frames
+    for index, (stem, length) in enumerate(zip(stem_mixer.STEMS, lengths)):
+        write_stem(song_folder / f"{stem}.wav", np.full(length, index + 1))
+    assert stem_mixer.has_stems("song")
+
+    song = stem_mixer.StemSong("song")
+    try:
+        assert song.getnframes() == 1000
+        assert song.getnstems() == len(stem_mixer.STEMS)
+        song.setpos(990)
+        frames = np.frombuffer(song.readframes(100), dtype=np.int16).reshape(-1, len(stem_mixer.STEMS), CHANNELS)
+        assert len(frames) == 10
+        assert (frames[:, :, 0] == [1, 2, 3, 4]).all()
+        assert len(song.readframes(100)) == 0
+    finally:
+        song.close()
+
+
+def test_stems_of_different_formats_are_rejected(song_folder):
+    for stem in stem_mixer.STEMS:
+        write_stem(song_folder / f"{stem}.wav", np.zeros(10))
+    with wave.open(str(song_folder / "vocals.wav"), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(44100)
+        wav_file.writeframes(bytes(20))
+    with pytest.raises(wave.Error):
+        stem_mixer.StemSong("song")
+
+
+def test_missing_stem():
+    assert not stem_mixer.has_stems("no song")
+
+
+def test_mix_applies_the_gains_and_mutes():
+    mixer = stem_mixer.StemMixer()
+    assert (mix(mixer, 256) == 10000).all()  # 1000 + 2000 + 3000 + 4000
+
+    mixer.set_gain("drums", 0.5)
+    mixer.set_muted("other", True)
+    assert mixer.is_muted("other")
+    mix(mixer, 256)  # The change is ramped over this block
+    assert (mix(mixer, 300) == 1000 + 1000 + 3000).all()
+    assert len(mix(mixer, 7)) == 7
+
+
+def test_gain_changes_are_ramped_over_one_block():
+    mixer = stem_mixer.StemMixer()
+    mixer.set_muted("bass", True)
+    mixer.set_muted("drums", True)
+    mixer.set_muted("vocals", True)
+    mixer.set_gain("other", 0.0)
+    mixed = mix(mixer, 101)
+    assert mixed[0] == 10000 and mixed[-1] == 0
+    assert (np.diff(mixed) < 0).all()  # No jump that would click
+    assert (mix(mixer, 10) == 0).all()
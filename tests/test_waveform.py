@@ -0,0 +1,96 @@
+import wave
+
+import numpy as np
+import pytest
+
+import pcm
+import waveform
+
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+
+
+def make_song(nframes):
+    """A sine that rises in level over the song, in the right channel only, so every bucket has its own peaks."""
+    position = np.arange(nframes)
+    samples = np.zeros((nframes, CHANNELS), dtype=np.float32)
+    samples[:, 1] = 0.9 * position / nframes * np.sin(position * 0.05)
+    return samples
+
+
+def build_peaks(path, samples, block_frames):
+    builder = waveform.PeakBuilder(SAMPLE_WIDTH, CHANNELS)
+    data = pcm.from_float(samples, SAMPLE_WIDTH)
+    block_size = block_frames * CHANNELS * SAMPLE_WIDTH
+    for start in range(0, len(data), block_size):
+        builder.add(data[start:start + block_size])
+    builder.save(str(path), 44100)
+    return waveform.Peaks(str(path))
+
+
+def test_peaks_do_not_depend_on_the_blocks(tmp_path):
+    samples = make_song(waveform.BUCKET_FRAMES * 3000 + 100)
+    peaks = build_peaks(tmp_path / "a.peaks", samples, 4096)
+    other = build_peaks(tmp_path / "b.peaks", samples, 1000)  # Blocks that end inside buckets
+    assert peaks.frames == len(samples) and peaks.sample_rate == 44100
+    assert len(peaks.levels) == len(other.levels) == 3  # 3001, 376 and 47 buckets
+    for (mins, maxs), (other_mins, other_maxs) in zip(peaks.levels, other.levels):
+        np.testing.assert_array_equal(mins, other_mins)
+        np.testing.assert_array_equal(maxs, other_maxs)
+
+
+def test_peaks_match_the_samples(tmp_path):
+    samples = make_song(waveform.BUCKET_FRAMES * 300 + 100)
+    mins, maxs = build_peaks(tmp_path / "song.peaks", samples, 65536).levels[0]
+    assert len(mins) == 301  # The unfinished last bucket has its own peaks
+    buckets = np.array_split(samples, range(waveform.BUCKET_FRAMES, len(samples), waveform.BUCKET_FRAMES))
+    np.testing.assert_allclose(mins, [np.rint(bucket.min() * 127) for bucket in buckets], atol=1)
+    np.testing.assert_allclose(maxs, [np.rint(bucket.max() * 127) for bucket in buckets], atol=1)
+
+    coarse_mins, coarse_maxs = waveform.Peaks(str(tmp_path / "song.peaks")).levels[1]
+    assert len(coarse_mins) == 38
+    assert coarse_mins[0] == mins[:waveform.LEVEL_FACTOR].min()
+    assert coarse_maxs[-1] == maxs[-5:].max()  # The last group holds the last 5 buckets
+
+
+@pytest.mark.parametrize("width", [1, 100, 301, 1000])
+def test_columns_cover_the_song(tmp_path, width):
+    samples = make_song(waveform.BUCKET_FRAMES * 300 + 100)
+    peaks = build_peaks(tmp_path / "song.peaks", samples, 65536)
+    mins, maxs = peaks.get_columns(width)
+    assert len(mins) == len(maxs) == width
+    assert (mins <= 0).all() and (maxs >= 0).all()
+    assert maxs.max() == pytest.approx(samples.max(), abs=1 / 127)
+    assert np.argmax(maxs) >= (width - 1) * 0.9  # The song is loudest at its end
+    assert -1 <= mins.min() and maxs.max() <= 1
+
+
+def test_empty_song(tmp_path):
+    peaks = build_peaks(tmp_path / "song.peaks", np.zeros((0, CHANNELS), dtype=np.float32), 4096)
+    assert peaks.frames == 0
+    mins, maxs = peaks.get_columns(50)
+    assert not mins.any() and not maxs.any()
+
+
+def test_load_and_build(tmp_path):
+    song_path = tmp_path / "song.wav"
+    samples = make_song(100000)
+    with wave.open(str(song_path), "wb") as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(48000)
+        wav_file.writeframes(pcm.from_float(samples, SAMPLE_WIDTH))
+    assert waveform.load(str(song_path)) is None
+
+    built = waveform.build(str(song_path))
+    assert waveform.get_peaks_path(str(song_path)) == str(tmp_path / "song.peaks")
+    loaded = waveform.load(str(song_path))
+    assert (loaded.frames, loaded.sample_rate) == (100000, 48000)
+    np.testing.assert_array_equal(loaded.levels[0][1], built.levels[0][1])
+    np.testing.assert_array_equal(loaded.levels[0][1], build_peaks(tmp_path / "other.peaks", samples, 777).levels[0][1])
+
+
+def test_invalid_peak_file(tmp_path):
+    (tmp_path / "song.peaks").write_bytes(b"not a peak file")
+    with pytest.raises(ValueError):
+        waveform.load(str(tmp_path / "song.wav"))